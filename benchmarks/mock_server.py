@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# A local stand-in for the Instagram API endpoints 'User' calls. Run it on
+#   its own with 'python benchmarks/mock_server.py --port 8080', or let the
+#   benchmark harness start it. Responses carry rate limit headers and can
+#   be delayed, paginated and made to fail at random.
+
+import argparse
+import asyncio
+import collections
+import random
+
+from aiohttp import web
+
+
+class MockConfig:
+    """Behaviour of the mock API.
+
+    Parameters
+    -----------
+    latency : float (optional: 0.0)
+        Seconds every response is delayed by.
+    jitter : float (optional: 0.0)
+        Up to this many extra seconds are added to the delay at random.
+    page_size : int (optional: 20)
+        Items per page of paginated endpoints.
+    pages : int (optional: 10)
+        Pages in every paginated endpoint.
+    error_429 : float (optional: 0.0)
+        The fraction of requests answered with 429.
+    error_502 : float (optional: 0.0)
+        The fraction of requests answered with 502.
+    retry_after : float (optional: 0.01)
+        The Retry-After of 429 responses, in seconds.
+    rate_limit : int (optional: 1000000)
+        The hourly limit reported per token.
+    seed : int (optional: None)
+        Seeds the choice of failing requests.
+    """
+
+    def __init__(self, *, latency=0.0, jitter=0.0, page_size=20, pages=10,
+                 error_429=0.0, error_502=0.0, retry_after=0.01,
+                 rate_limit=1000000, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.pages = pages
+        self.error_429 = error_429
+        self.error_502 = error_502
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.seed = seed
+
+
+def _user(user_id):
+    return {
+        'id': str(user_id),
+        'username': 'user{}'.format(user_id),
+        'full_name': 'User {}'.format(user_id),
+        'profile_picture': 'https://example.com/{}.jpg'.format(user_id),
+        'bio': 'Benchmark user',
+        'website': '',
+        'is_business': False,
+        'counts': {'media': 100, 'follows': 200, 'followed_by': 300},
+    }
+
+
+def _image(size):
+    return {'url': 'https://example.com/{0}x{0}.jpg'.format(size),
+            'width': size, 'height': size}
+
+
+def _media(media_id):
+    return {
+        'id': str(media_id),
+        'type': 'image',
+        'created_time': '1500000000',
+        'link': 'https://example.com/p/{}/'.format(media_id),
+        'filter': 'Normal',
+        'tags': ['benchmark', 'mock'],
+        'comments': {'count': 5},
+        'likes': {'count': 50},
+        'user_has_liked': False,
+        'images': {'thumbnail': _image(150), 'low_resolution': _image(320),
+                   'standard_resolution': _image(640)},
+        'caption': {'id': 'c{}'.format(media_id), 'text': 'A caption',
+                    'created_time': '1500000000', 'from': _user(1)},
+        'user': _user(1),
+        'location': {'id': '1', 'name': 'Somewhere', 'latitude': 1.0,
+                     'longitude': 2.0},
+    }
+
+
+def _comment(comment_id):
+    return {'id': str(comment_id), 'text': 'A comment',
+            'created_time': '1500000000', 'from': _user(comment_id)}
+
+
+class MockAPI:
+    def __init__(self, config):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.sent = collections.Counter()
+
+    def _headers(self, request):
+        token = request.query.get('access_token', '')
+        self.sent[token] += 1
+        remaining = max(0, self.config.rate_limit - self.sent[token])
+        return {'X-Ratelimit-Limit': str(self.config.rate_limit),
+                'X-Ratelimit-Remaining': str(remaining)}
+
+    async def _respond(self, request, body):
+        config = self.config
+        delay = config.latency
+        if config.jitter:
+            delay += self.random.uniform(0, config.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        headers = self._headers(request)
+        roll = self.random.random()
+        if roll < config.error_429:
+            headers['Retry-After'] = str(config.retry_after)
+            meta = {'code': 429, 'error_type': 'OAuthRateLimitException',
+                    'error_message': 'Rate limited'}
+            return web.json_response({'meta': meta}, status=429,
+                                     headers=headers)
+        if roll < config.error_429 + config.error_502:
+            return web.json_response({'meta': {'code': 502}}, status=502,
+                                     headers=headers)
+
+        body['meta'] = {'code': 200}
+        return web.json_response(body, headers=headers)
+
+    def _page(self, request, make):
+        config = self.config
+        page = int(request.query.get('cursor', 0))
+        start = page * config.page_size
+        body = {'data': [make(i) for i in range(start,
+                                                start + config.page_size)]}
+        if page + 1 < config.pages:
+            # the token is stripped from 'next_url' by the client
+            next_url = request.url.update_query(cursor=page + 1)
+            body['pagination'] = {'next_url': str(next_url)}
+        else:
+            body['pagination'] = {}
+        return body
+
+    async def user(self, request):
+        user_id = request.match_info.get('user_id', '1')
+        return await self._respond(request, {'data': _user(user_id)})
+
+    async def users(self, request):
+        return await self._respond(request, self._page(request, _user))
+
+    async def media(self, request):
+        return await self._respond(request,
+                                   {'data': _media(request.match_info['id'])})
+
+    async def media_page(self, request):
+        return await self._respond(request, self._page(request, _media))
+
+    async def comments(self, request):
+        return await self._respond(request, self._page(request, _comment))
+
+    async def tag(self, request):
+        name = request.match_info['name']
+        return await self._respond(request, {'data': {'name': name,
+                                                      'media_count': 1000}})
+
+    async def location(self, request):
+        return await self._respond(request, {'data': {
+                'id': request.match_info['id'], 'name': 'Somewhere',
+                'latitude': 1.0, 'longitude': 2.0}})
+
+
+def create_app(config=None):
+    """Return the mock API as an 'aiohttp.web.Application' serving
+    ``/v1``.
+    """
+    api = MockAPI(MockConfig() if config is None else config)
+    app = web.Application()
+    app['api'] = api
+    routes = [
+        ('/v1/users/self', api.user),
+        ('/v1/users/self/media/recent', api.media_page),
+        ('/v1/users/self/media/liked', api.media_page),
+        ('/v1/users/self/follows', api.users),
+        ('/v1/users/self/followed-by', api.users),
+        ('/v1/users/self/requested-by', api.users),
+        ('/v1/users/search', api.users),
+        ('/v1/users/{user_id}', api.user),
+        ('/v1/users/{user_id}/media/recent', api.media_page),
+        ('/v1/media/search', api.media_page),
+        ('/v1/media/{id}', api.media),
+        ('/v1/media/{id}/comments', api.comments),
+        ('/v1/media/{id}/likes', api.users),
+        ('/v1/tags/search', api.users),
+        ('/v1/tags/{name}', api.tag),
+        ('/v1/tags/{name}/media/recent', api.media_page),
+        ('/v1/locations/search', api.users),
+        ('/v1/locations/{id}', api.location),
+        ('/v1/locations/{id}/media/recent', api.media_page),
+    ]
+    for path, handler in routes:
+        app.router.add_get(path, handler)
+    return app
+
+
+def serve(config, host='127.0.0.1', port=8080):
+    """Serve the mock API until interrupted."""
+    web.run_app(create_app(config), host=host, port=port, print=None,
+                access_log=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a mock API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--error-429', type=float, default=0.0)
+    parser.add_argument('--error-502', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=1000000)
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter,
+                        page_size=args.page_size, pages=args.pages,
+                        error_429=args.error_429, error_502=args.error_502,
+                        rate_limit=args.rate_limit)
+    serve(config, args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
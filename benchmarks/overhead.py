@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# Measures the bookkeeping done by the client on every call, without any
+#   I/O: resolving the bucket and URL of an endpoint, and a whole request
+#   answered from memory. The first rows time the way buckets and URLs
+#   used to be resolved (a frame lookup and string concatenation), for
+#   comparison.
+#
+#       python benchmarks/overhead.py
+
+import argparse
+import asyncio
+import inspect
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__))))
+
+import instagram  # noqa: E402
+from instagram import endpoints as ep  # noqa: E402
+from instagram.http import HTTPClient  # noqa: E402
+from instagram.transport import RecordedResponse  # noqa: E402
+
+BODY = b'{"meta": {"code": 200}, "data": {"id": "1", "username": "u"}}'
+
+
+class MemoryTransport:
+    """Answers every request with the same response."""
+
+    def request(self, method, url, **kwargs):
+        return RecordedResponse(method, url, 200, 'OK',
+                                {'Content-Type': 'application/json'}, BODY)
+
+    async def close(self):
+        pass
+
+
+def frame_bucket():
+    return inspect.currentframe().f_back.f_code.co_name
+
+
+def get_user_by_frame(client, user_id):
+    return client.USERS + '/{}'.format(user_id), frame_bucket()
+
+
+def get_user_by_table(client, user_id):
+    return client.url(ep.GET_USER, user_id), ep.GET_USER.bucket
+
+
+async def requests(user, count):
+    started = time.perf_counter()
+    for index in range(count):
+        await user.get_user(index)
+    return (time.perf_counter() - started) / count
+
+
+async def measure_requests(count, **kwargs):
+    limiter = instagram.RateLimiter(requests_per_hour=10 ** 9)
+    client = instagram.Client(rate_limiter=limiter,
+                              transport=MemoryTransport(), **kwargs)
+    user = await client.get_user(token='token')
+    await requests(user, count // 10)
+    result = await requests(user, count)
+    await client.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-call '
+                                                 'overhead.')
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    client = HTTPClient()
+    rows = [
+        ('resolve by frame + concat',
+         timeit.timeit(lambda: get_user_by_frame(client, 123),
+                       number=args.number) / args.number),
+        ('resolve by endpoint table',
+         timeit.timeit(lambda: get_user_by_table(client, 123),
+                       number=args.number) / args.number),
+        ('request from memory',
+         asyncio.run(measure_requests(args.requests))),
+        ('request, instrumented',
+         asyncio.run(measure_requests(args.requests,
+                                      instruments=[instagram.Metrics()]))),
+    ]
+    for name, seconds in rows:
+        print('{:<28}{:>10.2f} us/call'.format(name, seconds * 1e6))
+
+
+if __name__ == '__main__':
+    main()
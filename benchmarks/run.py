@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# Benchmarks the client against the mock API in 'mock_server.py', which is
+#   served from a separate process so it does not compete for the event
+#   loop. Results are appended to 'results.jsonl' with the library version,
+#   so runs of different versions can be compared:
+#
+#       python benchmarks/run.py --label before
+#       python benchmarks/run.py --label after --compare before
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import aiohttp  # noqa: E402
+
+import instagram  # noqa: E402
+from instagram import http  # noqa: E402
+from mock_server import MockConfig, serve  # noqa: E402
+
+
+class LatencyRecorder(instagram.Instrument):
+    """Keeps the duration of every request."""
+
+    def __init__(self):
+        self.latencies = []
+
+    def request_finished(self, info, exc):
+        self.latencies.append(info.total)
+
+
+def point_at(user, base):
+    """Send the requests of ``user`` to the mock API at ``base``."""
+    user.client.base = base
+
+
+async def make_client(args, base, recorder, tokens=1):
+    concurrency = max(args.concurrency, 1)
+    limiter = instagram.RateLimiter(requests_per_hour=10 ** 9,
+                                    token_concurrency=concurrency,
+                                    bucket_concurrency=concurrency)
+    policy = instagram.RetryPolicy(base_delay=0.01, max_delay=0.1)
+    transport = None
+    if args.record is not None:
+        transport = instagram.RecordingTransport(args.record)
+    elif args.replay is not None:
+        transport = instagram.ReplayTransport(args.replay,
+                                              latency=args.replay_latency)
+    client = instagram.Client(rate_limiter=limiter, retry_policy=policy,
+                              instruments=[recorder], transport=transport)
+    for index in range(tokens):
+        user = await client.get_user()
+        point_at(user, base)
+        await user.set_token('token{}'.format(index))
+        client.users['token{}'.format(index)] = user
+    return client
+
+
+async def gather_limited(calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*[run(call) for call in calls])
+
+
+async def single(client, args):
+    user = next(iter(client.users.values()))
+    for index in range(args.requests):
+        await user.get_user(index)
+    return args.requests
+
+
+async def concurrent(client, args):
+    user = next(iter(client.users.values()))
+    await gather_limited([lambda i=i: user.get_user(i)
+                          for i in range(args.requests)], args.concurrency)
+    return args.requests
+
+
+async def paginate(client, args):
+    user = next(iter(client.users.values()))
+    items = await user.iter_self_followed_by(prefetch=2).flatten()
+    return len(items)
+
+
+async def bulk(client, args):
+    user = next(iter(client.users.values()))
+    results = await user.get_users_many(range(args.requests),
+                                        concurrency=args.concurrency)
+    return len(results)
+
+
+async def multi_token(client, args):
+    await gather_limited([lambda i=i: client.pool.get_user(i)
+                          for i in range(args.requests)],
+                         args.concurrency * len(client.users))
+    return args.requests
+
+
+WORKLOADS = {
+    'single': (single, 1),
+    'concurrent': (concurrent, 1),
+    'paginate': (paginate, 1),
+    'bulk': (bulk, 1),
+    'multi_token': (multi_token, 4),
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def measure(name, args, base):
+    workload, tokens = WORKLOADS[name]
+    recorder = LatencyRecorder()
+    client = await make_client(args, base, recorder, tokens)
+    try:
+        # warm up the connection pool, then only count the workload
+        await workload(client, args)
+        recorder.latencies.clear()
+
+        started = time.perf_counter()
+        items = await workload(client, args)
+        elapsed = time.perf_counter() - started
+        latencies = list(recorder.latencies)
+
+        peak = None
+        if args.memory:
+            tracemalloc.start()
+            await workload(client, args)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        await client.close()
+
+    return {
+        'items': items,
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'items_per_second': items / elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_kib': None if peak is None else peak / 1024,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(config):
+    port = free_port()
+    server = multiprocessing.Process(target=serve, daemon=True,
+                                     args=(config, '127.0.0.1', port))
+    server.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.1).close()
+            return server, 'http://127.0.0.1:{}'.format(port)
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError('The mock API did not start')
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short',
+                                        'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_runs(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report(run, baseline=None):
+    columns = ('items/s', 'req/s', 'p50 ms', 'p99 ms', 'peak KiB')
+    print('{:<12}'.format('workload')
+          + ''.join('{:>12}'.format(c) for c in columns))
+    for name, result in run['results'].items():
+        values = (result['items_per_second'], result['requests_per_second'],
+                  result['p50_ms'], result['p99_ms'], result['peak_kib'])
+        line = '{:<12}'.format(name) + ''.join(
+                '{:>12}'.format('-' if v is None else '{:.1f}'.format(v))
+                for v in values)
+        previous = (baseline or {}).get('results', {}).get(name)
+        if previous:
+            change = (result['items_per_second']
+                      / previous['items_per_second'] - 1) * 100
+            line += '  {:+.1f}% vs {}'.format(change, baseline['label'])
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the client '
+                                                 'against a mock API.')
+    parser.add_argument('workloads', nargs='*',
+                        help='any of {} (default: all)'.format(
+                                ', '.join(WORKLOADS)))
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--error-429', type=float, default=0.0)
+    parser.add_argument('--error-502', type=float, default=0.0)
+    parser.add_argument('--memory', action='store_true',
+                        help='also measure peak memory, in an extra pass')
+    parser.add_argument('--uvloop', action='store_true')
+    parser.add_argument('--record', default=None, metavar='CASSETTE',
+                        help='record the exchanges with the mock API')
+    parser.add_argument('--replay', default=None, metavar='CASSETTE',
+                        help='answer requests from a recording instead, '
+                             'measuring the overhead of the client alone')
+    parser.add_argument('--replay-latency', default=None,
+                        type=lambda v: v if v == 'recorded' else float(v),
+                        help="seconds, or 'recorded' (default: none)")
+    parser.add_argument('--label', default=None,
+                        help='the name of this run (default: the version)')
+    parser.add_argument('--compare', default=None,
+                        help='the label of a previous run to compare to')
+    parser.add_argument('--results', default=os.path.join(HERE,
+                                                          'results.jsonl'))
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error('Unknown workload {!r}'.format(name))
+    workloads = args.workloads or list(WORKLOADS)
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter,
+                        page_size=args.page_size, pages=args.pages,
+                        error_429=args.error_429, error_502=args.error_502,
+                        seed=0)
+    if args.uvloop and not instagram.use_uvloop():
+        parser.error("'uvloop' is not installed")
+
+    server, base = start_server(config)
+    try:
+        results = {name: asyncio.run(measure(name, args, base))
+                   for name in workloads}
+    finally:
+        server.terminate()
+        server.join()
+
+    commit = git_commit()
+    run = {
+        'label': args.label or '{}+{}'.format(instagram.__version__, commit),
+        'version': instagram.__version__,
+        'commit': commit,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'aiohttp': aiohttp.__version__,
+        'json': getattr(http.json_loads, '__module__', None),
+        'uvloop': args.uvloop,
+        'replay': args.replay is not None,
+        'maxrss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'config': vars(config),
+        'options': {'requests': args.requests,
+                    'concurrency': args.concurrency},
+        'results': results,
+    }
+
+    baseline = None
+    if args.compare is not None:
+        matches = [r for r in load_runs(args.results)
+                   if r['label'] == args.compare]
+        if not matches:
+            parser.error('No run labelled {!r}'.format(args.compare))
+        baseline = matches[-1]
+
+    report(run, baseline)
+    if not args.no_save:
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+
+
+if __name__ == '__main__':
+    main()
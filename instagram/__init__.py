@@ -16,8 +16,23 @@ __copyright__ = 'Copyright 2016-2017 Lucien Gaitskell'
 __version__ = '0.4.1'
 
 from collections import namedtuple
-from .client import Client
+from .client import Client, use_uvloop
+from .sync import SyncClient, SyncUser, SyncIterator
 from .user import User
+from .http import ConnectionConfig
+from .ratelimit import RateLimiter, MemoryStore, FileStore, RedisStore
+from .pool import TokenPool
+from .retry import RetryPolicy, RetryBudget
+from .breaker import CircuitBreaker
+from .metrics import Instrument, Metrics, Histogram, TracingInstrument
+from .models import Media, UserProfile, Comment, Tag, Location
+from .poller import FeedPoller
+from .crawler import Crawler
+from .cache import ResponseCache, MemoryBackend, SQLiteBackend
+from .identity import IdentityCache
+from .writes import WriteQueue
+from .graph import GraphCollector, GraphSnapshot, UsernameTable
+from .transport import RecordingTransport, ReplayTransport
 from .errors import *
 
 VersionInfo = namedtuple('VersionInfo',
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import collections
+import time
+from urllib.parse import urlsplit
+
+from .errors import CircuitOpen
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = CLOSED
+        self.outcomes = collections.deque()
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+
+class CircuitBreaker:
+    """Fails requests fast while an endpoint family is failing.
+
+    A circuit is kept for every bucket and host. It opens once at least
+    ``min_requests`` requests were made within ``window`` seconds and
+    ``failure_rate`` of them failed. While open, requests raise
+    :exc:`CircuitOpen` without being sent. After ``reset_timeout`` seconds
+    the circuit is half-open and lets ``probes`` requests through; it closes
+    if they succeed and opens again if one fails.
+
+    Server errors, rate limiting and connection failures count as failures.
+    Other client errors such as :exc:`NotFound` do not. A request retried
+    several times counts once, with the outcome of its last attempt.
+
+    Parameters
+    -----------
+    failure_rate : float (optional: 0.5)
+        The fraction of failed requests which opens a circuit.
+    min_requests : int (optional: 20)
+        The requests needed within ``window`` before a circuit can open.
+    window : float (optional: 30)
+        Seconds of history considered.
+    reset_timeout : float (optional: 30)
+        Seconds a circuit stays open before probing.
+    probes : int (optional: 1)
+        The requests let through while half-open.
+    """
+
+    def __init__(self, *, failure_rate=0.5, min_requests=20, window=30.0,
+                 reset_timeout=30.0, probes=1):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self._circuits = {}
+
+    @staticmethod
+    def key(bucket, url):
+        return (bucket, urlsplit(url).netloc)
+
+    def _circuit(self, key):
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = self._circuits[key] = _Circuit()
+        return circuit
+
+    def _trim(self, circuit, now):
+        while circuit.outcomes and circuit.outcomes[0][0] < now - self.window:
+            _, failed = circuit.outcomes.popleft()
+            circuit.failures -= failed
+
+    def check(self, key):
+        """Raise :exc:`CircuitOpen` if a request for ``key`` would be
+        refused by :meth:`before`, without letting one through.
+        """
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit.state == CLOSED:
+            return
+
+        if circuit.state == OPEN:
+            now = time.monotonic()
+            retry_in = circuit.opened_at + self.reset_timeout - now
+            if retry_in > 0:
+                raise CircuitOpen(key, retry_in)
+        elif circuit.probes >= self.probes:
+            raise CircuitOpen(key, 0.0)
+
+    def before(self, key):
+        """Raise :exc:`CircuitOpen` if a request for ``key`` may not be sent
+        right now.
+        """
+        circuit = self._circuit(key)
+        if circuit.state == CLOSED:
+            return
+
+        now = time.monotonic()
+        if circuit.state == OPEN:
+            retry_in = circuit.opened_at + self.reset_timeout - now
+            if retry_in > 0:
+                raise CircuitOpen(key, retry_in)
+            circuit.state = HALF_OPEN
+            circuit.probes = 0
+
+        if circuit.probes >= self.probes:
+            raise CircuitOpen(key, 0.0)
+        circuit.probes += 1
+
+    def record(self, key, failed):
+        """Record the outcome of a request made for ``key``.
+
+        ``failed`` is ``None`` for a request which ended without an outcome,
+        e.g. because it was cancelled.
+        """
+        circuit = self._circuit(key)
+        now = time.monotonic()
+
+        if circuit.state == HALF_OPEN:
+            circuit.probes = max(0, circuit.probes - 1)
+            if failed is None:
+                return
+            if failed:
+                self._open(circuit, now)
+            else:
+                circuit.state = CLOSED
+                circuit.outcomes.clear()
+                circuit.failures = 0
+            return
+
+        if failed is None:
+            return
+        circuit.outcomes.append((now, failed))
+        circuit.failures += failed
+        self._trim(circuit, now)
+
+        total = len(circuit.outcomes)
+        if (circuit.state == CLOSED and total >= self.min_requests
+                and circuit.failures >= total * self.failure_rate):
+            self._open(circuit, now)
+
+    def _open(self, circuit, now):
+        circuit.state = OPEN
+        circuit.opened_at = now
+        circuit.probes = 0
+
+    def state(self, key):
+        """Return the state of the circuit for ``key``: ``'closed'``,
+        ``'open'`` or ``'half-open'``.
+        """
+        circuit = self._circuit(key)
+        if (circuit.state == OPEN and time.monotonic()
+                >= circuit.opened_at + self.reset_timeout):
+            return HALF_OPEN
+        return circuit.state
+
+    def states(self):
+        """Return the state of every circuit, keyed by (bucket, host)."""
+        return {key: self.state(key) for key in self._circuits}
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import collections
+import hashlib
+import json
+import sqlite3
+import time
+
+CacheEntry = collections.namedtuple('CacheEntry', 'body etag expires')
+
+# Time to live, in seconds, of the read-only endpoints cached by default.
+DEFAULT_TTLS = {
+    'get_user': 300,
+    'get_media': 60,
+    'get_tag': 300,
+    'get_location': 3600,
+}
+
+
+def token_scope(token):
+    """Return a digest identifying ``token`` without revealing it."""
+    if token is None:
+        return None
+    return hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+
+def request_key(method, url, params, token):
+    """Return the key identifying a request.
+
+    The ``access_token`` parameter is left out in favour of a digest of
+    ``token``, so keys are safe to write to disk.
+    """
+    params = sorted((k, str(v)) for k, v in params.items()
+                    if k != 'access_token')
+    return json.dumps([method, url, params, token_scope(token)])
+
+
+class MemoryBackend:
+    """In-process least recently used cache storage.
+
+    Responses are kept encoded as JSON and decoded on every hit, so callers
+    modifying a response they were given do not change the cached one.
+
+    Parameters
+    -----------
+    max_entries : int (optional: 1024)
+        The maximum number of responses kept.
+    max_bytes : int (optional: 16 MiB)
+        The maximum size of the kept responses, measured as encoded JSON.
+    """
+
+    def __init__(self, *, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        try:
+            entry = self._entries.pop(key)
+        except KeyError:
+            return None
+        self._entries[key] = entry
+        body, etag, expires = entry
+        return CacheEntry(json.loads(body), etag, expires)
+
+    def set(self, key, entry):
+        self.delete(key)
+        body = json.dumps(entry.body, separators=(',', ':'))
+        if len(body) > self.max_bytes:
+            return
+
+        self._entries[key] = CacheEntry(body, entry.etag, entry.expires)
+        self.size += len(body)
+        while (len(self._entries) > self.max_entries
+               or self.size > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+    def delete(self, key):
+        try:
+            entry = self._entries.pop(key)
+        except KeyError:
+            return
+        self.size -= len(entry.body)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class SQLiteBackend:
+    """On-disk cache storage which several processes can share.
+
+    Parameters
+    -----------
+    path : str
+        The path of the SQLite database file.
+    max_entries : int (optional: 100000)
+        The maximum number of responses kept. The least recently used
+        responses are removed first.
+    """
+
+    def __init__(self, path, *, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, timeout=30,
+                                     isolation_level=None)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                           'key TEXT PRIMARY KEY, body TEXT, etag TEXT, '
+                           'expires REAL, accessed REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                           'ON responses (accessed)')
+        self._writes = 0
+
+    def get(self, key):
+        row = self._conn.execute('SELECT body, etag, expires FROM responses '
+                                 'WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?',
+                           (time.time(), key))
+        return CacheEntry(json.loads(row[0]), row[1], row[2])
+
+    def set(self, key, entry):
+        self._conn.execute('INSERT OR REPLACE INTO responses VALUES '
+                           '(?, ?, ?, ?, ?)',
+                           (key, json.dumps(entry.body), entry.etag,
+                            entry.expires, time.time()))
+
+        # trimming is amortized over many writes
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._conn.execute('DELETE FROM responses WHERE key NOT IN '
+                               '(SELECT key FROM responses '
+                               'ORDER BY accessed DESC LIMIT ?)',
+                               (self.max_entries,))
+
+    def delete(self, key):
+        self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+
+    def clear(self):
+        self._conn.execute('DELETE FROM responses')
+
+    def close(self):
+        self._conn.close()
+
+
+class ResponseCache:
+    """Opt-in cache for responses of read-only endpoints.
+
+    Only ``GET`` requests made under a bucket with a time to live are cached.
+    Responses are keyed by method, URL, parameters and token. Once an entry
+    expires it is revalidated with ``If-None-Match`` if the server sent an
+    ``ETag`` for it.
+
+    Parameters
+    -----------
+    backend : object (optional: MemoryBackend())
+        The storage for responses, e.g. :class:`MemoryBackend` or
+        :class:`SQLiteBackend`.
+    ttls : dict (optional: DEFAULT_TTLS)
+        Time to live, in seconds, keyed by bucket.
+    default_ttl : float (optional: None)
+        Time to live for buckets missing from ``ttls``. If ``None`` those
+        buckets are not cached.
+
+    Attributes
+    -----------
+    hits : int
+        Requests served from the cache.
+    misses : int
+        Requests which had to be sent.
+    revalidations : int
+        Expired entries confirmed unchanged by the server.
+    """
+
+    def __init__(self, backend=None, *, ttls=None, default_ttl=None):
+        self.backend = MemoryBackend() if backend is None else backend
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'revalidations': self.revalidations}
+
+    def ttl(self, method, bucket):
+        """Return the time to live for a request, or ``None`` if the request
+        should not be cached.
+        """
+        if method != 'GET':
+            return None
+        return self.ttls.get(bucket, self.default_ttl)
+
+    def get(self, key):
+        """Return the entry stored for ``key``, fresh or not."""
+        return self.backend.get(key)
+
+    def set(self, key, body, etag, ttl):
+        self.backend.set(key, CacheEntry(body, etag, time.time() + ttl))
+
+    def clear(self):
+        self.backend.clear()
@@ -25,31 +25,89 @@ DEALINGS IN THE SOFTWARE.
 """
 
 import asyncio
-from .http import create_client_session
+from .http import create_client_session, pool_stats, ConnectionConfig
+from .iterators import BulkIterator
+from .pool import TokenPool
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
 from .user import User
 
 
-class Client:
-    """Allows for usage and handling of multiple 'User' objects."""
+def use_uvloop():
+    """Run new event loops on 'uvloop', if it is installed.
+
+    Call this before the event loop is started, e.g. before
+    ``asyncio.run``. Returns whether 'uvloop' is used.
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return False
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
 
-    def __init__(self, *, loop=None, client_id=None, client_secret=None,
-                 redirect_uri=None):
+
+class Client:
+    """Allows for usage and handling of multiple 'User' objects.
+
+    With an ``identity_cache`` (an :class:`IdentityCache`), tokens validated
+    within its time to live are not validated again, so restarting with
+    many tokens does not send a request for each of them.
+    """
+
+    def __init__(self, *, client_id=None, client_secret=None,
+                 redirect_uri=None, rate_limiter=None, cache=None,
+                 connection_config=None, retry_policy=None,
+                 circuit_breaker=None, instruments=(), transport=None,
+                 identity_cache=None):
         self.users = {}
-        self.loop = asyncio.get_event_loop() if loop is None else loop
-        self.session = create_client_session()
+        self.identity_cache = identity_cache
+        self._resolving = {}
+        if connection_config is None:
+            connection_config = ConnectionConfig()
+        self.connection_config = connection_config
+        # created with the first user unless a transport is given, as
+        #   sessions need a running event loop
+        self.session = transport
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.instruments = tuple(instruments)
 
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
 
-    @asyncio.coroutine
-    def get_user(self, *args, token=None, code=None, **kwargs):
+        # spreads read requests over 'users'
+        self.pool = TokenPool(self)
+
+    async def get_user(self, *args, token=None, code=None, lazy=False,
+                       **kwargs):
         """Add a 'User' object to the 'Client' object.
 
         If a token is passed as a keyword argument, the token of the 'User'
-        object is checked and set.
+        object is checked and set. It is not checked if the identity cache
+        knows it, or if ``lazy`` is true; the user's id is then unknown until
+        :meth:`resolve_user` is called, which the token pool does on first
+        use.
         """
-        user = User(self.session, *args, loop=self.loop, **kwargs)
+        kwargs.setdefault('rate_limiter', self.rate_limiter)
+        kwargs.setdefault('cache', self.cache)
+        kwargs.setdefault('connection_config', self.connection_config)
+        kwargs.setdefault('retry_policy', self.retry_policy)
+        kwargs.setdefault('circuit_breaker', self.circuit_breaker)
+        kwargs.setdefault('instruments', self.instruments)
+        if self.session is None:
+            self.session = create_client_session(
+                    config=self.connection_config,
+                    trace=bool(self.instruments))
+        user = User(self.session, *args, **kwargs)
 
         if code is not None:
             if (None in [self.client_id, self.client_secret,
@@ -58,28 +116,125 @@ class Client:
                                  + "'client_id', 'client_secret', and"
                                  + "'redirect_uri' have been set.")
 
-            token = yield from user.set_token_from_code(self.client_id,
-                                                        self.client_secret,
-                                                        self.redirect_uri,
-                                                        code)
+            token = await user.set_token_from_code(self.client_id,
+                                                   self.client_secret,
+                                                   self.redirect_uri,
+                                                   code)
+
+            self._remember(user)
 
         elif token is not None:
-            yield from user.set_token(token)
+            identity = None
+            if self.identity_cache is not None:
+                identity = self.identity_cache.get(token)
+
+            if identity is not None or lazy:
+                await user.set_token(token, validate=False)
+                if identity is not None:
+                    user._id, user._username = identity
+            else:
+                await user.set_token(token)
+                self._remember(user)
 
         return user
 
-    @asyncio.coroutine
-    def add_user(self, *args, **kwargs):
-        user = yield from self.get_user(*args, **kwargs)
-        if user._id is None:
+    def _remember(self, user):
+        if self.identity_cache is not None:
+            self.identity_cache.set(user.token, user._id, user._username)
+
+    def _register(self, user):
+        if user.token is None:
             raise ValueError(
                     "Please supply either a 'token' or 'code' argument")
 
-        self.users[user._id] = user
+        self.users[user.key] = user
+
+    async def add_user(self, *args, **kwargs):
+        user = await self.get_user(*args, **kwargs)
+        self._register(user)
+        if self.identity_cache is not None:
+            self.identity_cache.save()
 
         return user
 
-    @asyncio.coroutine
-    def close(self):
+    async def add_users(self, tokens, *, concurrency=10, lazy=False,
+                        **kwargs):
+        """Add a user for each of ``tokens``, validating at most
+        ``concurrency`` tokens at once.
+
+        Returns a dict of the :class:`User` added for each token, or the
+        exception it failed with, e.g. :exc:`LoginFailure`.
+        """
+        async def add(token):
+            try:
+                user = await self.get_user(token=token, lazy=lazy, **kwargs)
+            except Exception as e:
+                # one token failing must not fail the others
+                return e
+            self._register(user)
+            return user
+
+        try:
+            results = await BulkIterator(add, tokens,
+                                         concurrency=concurrency).results()
+        finally:
+            if self.identity_cache is not None:
+                self.identity_cache.save()
+
+        return results
+
+    async def resolve_user(self, user):
+        """Validate the token of a user added without validation, filling in
+        its id and username.
+
+        Raises :exc:`LoginFailure` if the token is rejected.
+        """
+        if user._id is not None:
+            return user
+
+        key = user.key
+        task = self._resolving.get(key)
+        if task is None:
+            task = self._resolving[key] = asyncio.ensure_future(
+                    self._resolve(user, key))
+
+            # only the task itself ends the validation its callers share
+            def done(task):
+                if self._resolving.get(key) is task:
+                    del self._resolving[key]
+                # the error is raised to the callers, if any are left
+                if not task.cancelled():
+                    task.exception()
+            task.add_done_callback(done)
+
+        # a cancelled caller must not cancel the validation for the others
+        await asyncio.shield(task)
+        return user
+
+    async def _resolve(self, user, key):
+        await user.set_token(user.token)
+
+        if self.users.get(key) is user:
+            del self.users[key]
+            self.users[user._id] = user
+        self._remember(user)
+        if self.identity_cache is not None:
+            self.identity_cache.save()
+
+    def forget_token(self, token):
+        """Drop ``token`` from the identity cache, e.g. once it is revoked."""
+        if self.identity_cache is not None:
+            self.identity_cache.delete(token)
+            self.identity_cache.save()
+
+    def pool_stats(self):
+        """Return the connection pool statistics of the shared session."""
+        return pool_stats(self.session)
+
+    async def close(self):
         """Close the 'aiohttp.ClientSession' object."""
-        yield from self.session.close()
+        for user in self.users.values():
+            if user.writes is not None:
+                await user.writes.close()
+        if self.session is not None:
+            await self.session.close()
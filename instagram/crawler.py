@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.managers
+import os
+import queue
+import threading
+import zlib
+
+from .client import Client
+from .errors import (ClientException, CrawlError, HTTPException,
+                     InvalidArgument)
+from .pool import READ_METHODS
+from .ratelimit import MemoryStore, RateLimiter
+
+log = logging.getLogger(__name__)
+
+_store = None
+
+
+def _shared_store():
+    global _store
+    if _store is None:
+        _store = MemoryStore()
+    return _store
+
+
+class _QuotaManager(multiprocessing.managers.BaseManager):
+    """Serves one :class:`MemoryStore` to every worker over a local
+    socket.
+    """
+
+
+_QuotaManager.register('store', callable=_shared_store,
+                       exposed=('draw', 'pause', 'update'))
+
+
+def _shard(key, shards):
+    # stable across processes, unlike hash()
+    return zlib.crc32(str(key).encode('utf-8')) % shards
+
+
+def _crawl_error(key, exc):
+    if isinstance(exc, HTTPException):
+        return CrawlError(key, type(exc).__name__, exc.text,
+                          exc.response.status, exc.error_type)
+    return CrawlError(key, type(exc).__name__, str(exc))
+
+
+def _positional(func, key):
+    return func(key)
+
+
+# How methods whose key is not their first positional argument are called.
+_CALLS = {
+    'get_media': lambda func, key: func(media_id=key),
+    'search_media': lambda func, key: func(lat=key[0], lng=key[1]),
+}
+
+
+def _run_worker(*args):
+    asyncio.run(_worker(*args))
+
+
+async def _worker(index, address, store_factory, tokens, method,
+                  concurrency, requests_per_hour, client_kwargs, keys,
+                  results):
+    loop = asyncio.get_running_loop()
+    client = None
+    # keys taken from the inbox which have no result yet
+    taken = []
+    reading = None
+    ended = False
+
+    async def read():
+        nonlocal reading, ended
+        while True:
+            reading = loop.run_in_executor(None, keys.get)
+            # a key being read must not be lost if the worker fails
+            key = await asyncio.shield(reading)
+            reading = None
+            if key is None:
+                ended = True
+            else:
+                taken.append(key)
+            await pending.put(key)
+            if key is None:
+                return
+
+    async def call():
+        while True:
+            key = await pending.get()
+            if key is None:
+                # let the other callers see the end too
+                await pending.put(key)
+                return
+            try:
+                result = await invoke(func, key)
+            except Exception as e:
+                result = _crawl_error(key, e)
+            results.put((key, result))
+            taken.remove(key)
+
+    tasks = []
+    try:
+        if store_factory is None:
+            manager = _QuotaManager(address=address)
+            manager.connect()
+            store = manager.store()
+        else:
+            store = store_factory()
+        limiter = RateLimiter(requests_per_hour=requests_per_hour,
+                              store=store)
+        client = Client(rate_limiter=limiter, **client_kwargs)
+        added = await client.add_users(tokens)
+        for result in added.values():
+            if isinstance(result, Exception):
+                log.warning('Worker %d could not use a token: %s', index,
+                            result)
+
+        func = getattr(client.pool, method)
+        invoke = _CALLS.get(method, _positional)
+        pending = asyncio.Queue(concurrency)
+        tasks = [asyncio.ensure_future(read())]
+        tasks += [asyncio.ensure_future(call()) for _ in range(concurrency)]
+        await asyncio.gather(*tasks)
+    except Exception as e:
+        log.exception('Crawler worker %d failed', index)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # every key of the shard which has no result fails with the error
+        if reading is not None:
+            key = await reading
+            if key is None:
+                ended = True
+            else:
+                taken.append(key)
+        for key in taken:
+            results.put((key, _crawl_error(key, e)))
+        while not ended:
+            key = await loop.run_in_executor(None, keys.get)
+            if key is None:
+                break
+            results.put((key, _crawl_error(key, e)))
+    finally:
+        if client is not None:
+            await client.close()
+        results.put(index)
+
+
+class Crawler:
+    """Spreads a crawl over several worker processes.
+
+    Keys are sharded over ``processes`` workers, each running its own event
+    loop and :class:`Client` with every token in its :class:`TokenPool`, so
+    decoding and bookkeeping use every core. The budgets of the tokens are
+    kept in one :class:`MemoryStore` served to the workers over a local
+    socket, so together they stay within the rate limit of each token.
+    Crawlers on several hosts share budgets through ``store_factory``
+    instead, e.g. one creating a :class:`RedisStore`.
+
+    Results stream back as they complete::
+
+        with Crawler(tokens, processes=8) as crawler:
+            for user_id, profile in crawler.crawl('get_user', user_ids):
+                ...
+
+    A call which fails has a :exc:`CrawlError` as its result instead of
+    ending the crawl.
+
+    Parameters
+    -----------
+    tokens : list
+        The access tokens to crawl with.
+    processes : int (optional: os.cpu_count())
+        The number of worker processes.
+    concurrency : int (optional: 10)
+        The maximum number of calls in flight per worker.
+    requests_per_hour : int (optional: 5000)
+        The budget of each token, shared by every worker.
+    queue_size : int (optional: 1000)
+        The keys queued per worker before the producer blocks.
+    store_factory : callable (optional: None)
+        Called without arguments in each worker to create the store the
+        budgets are kept in, e.g. ``functools.partial(FileStore, path)``.
+        It must be picklable.
+
+    Other keyword arguments are passed to the :class:`Client` of each
+    worker, and must be picklable.
+    """
+
+    def __init__(self, tokens, *, processes=None, concurrency=10,
+                 requests_per_hour=5000, queue_size=1000, store_factory=None,
+                 **kwargs):
+        if not tokens:
+            raise InvalidArgument("'tokens' must not be empty")
+
+        self.tokens = list(tokens)
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.requests_per_hour = requests_per_hour
+        self.queue_size = queue_size
+        self.store_factory = store_factory
+        self.client_kwargs = kwargs
+        self._manager = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        """Start serving the token budgets. Called by :meth:`crawl`."""
+        if self._manager is None and self.store_factory is None:
+            self._manager = _QuotaManager()
+            self._manager.start()
+
+    def close(self):
+        """Stop serving the token budgets."""
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def crawl(self, method, keys):
+        """Call the :class:`User` method ``method`` once for every key and
+        yield ``(key, result)`` pairs in the order they complete.
+
+        ``method`` has to be one of the methods offered by
+        :class:`TokenPool`, e.g. ``'get_user'`` or ``'get_media'``. Keys
+        are passed as the first argument, except for ``'get_media'``, whose
+        keys are media ids, and ``'search_media'``, whose keys are
+        ``(lat, lng)`` pairs. ``keys`` is consumed as the workers make
+        progress, so it may be a generator.
+
+        If a worker fails, every key sent to it which has no result yet has
+        a :exc:`CrawlError` as its result.
+        """
+        if method not in READ_METHODS:
+            raise InvalidArgument('{!r} cannot be crawled'.format(method))
+
+        self.start()
+        address = None if self._manager is None else self._manager.address
+        inputs = [multiprocessing.Queue(self.queue_size)
+                  for _ in range(self.processes)]
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(
+                target=_run_worker, daemon=True,
+                args=(index, address, self.store_factory, self.tokens,
+                      method, self.concurrency, self.requests_per_hour,
+                      self.client_kwargs, inputs[index], results))
+                   for index in range(self.processes)]
+        for worker in workers:
+            worker.start()
+
+        stop = threading.Event()
+        failure = []
+        feeder = threading.Thread(target=self._feed, daemon=True,
+                                  args=(keys, inputs, stop, failure))
+        feeder.start()
+
+        finished = set()
+        try:
+            while len(finished) < len(workers):
+                # a worker killed outright never reports its keys
+                for index, worker in enumerate(workers):
+                    if index not in finished and worker.exitcode not in (
+                            None, 0):
+                        raise ClientException(
+                                'Crawler worker {} exited with code {}'
+                                .format(index, worker.exitcode))
+                try:
+                    item = results.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+
+                if isinstance(item, int):
+                    finished.add(item)
+                else:
+                    yield item
+        finally:
+            stop.set()
+            for index, worker in enumerate(workers):
+                if index not in finished:
+                    worker.terminate()
+                worker.join()
+            feeder.join()
+
+        if failure:
+            raise failure[0]
+
+    @staticmethod
+    def _feed(keys, inputs, stop, failure):
+        def put(inbox, key):
+            while not stop.is_set():
+                try:
+                    inbox.put(key, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        try:
+            for key in keys:
+                put(inputs[_shard(key, len(inputs))], key)
+        except Exception as e:
+            # raised by crawl() once the keys already queued are done
+            failure.append(e)
+        finally:
+            for inbox in inputs:
+                put(inbox, None)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# The API endpoints 'User' calls, declared once. Buckets, which name the
+#   rate limiting and caching group of a request, are fixed here rather than
+#   looked up on every call.
+
+
+class Endpoint:
+    """An API endpoint.
+
+    Attributes
+    -----------
+    bucket : str
+        The bucket requests to the endpoint are made under, named after the
+        :class:`User` method calling it.
+    method : str
+        The HTTP method.
+    path : str
+        The path below :attr:`HTTPClient.base`, with ``{}`` for each
+        argument.
+    """
+
+    __slots__ = ('bucket', 'method', 'path')
+
+    def __init__(self, bucket, method, path):
+        self.bucket = bucket
+        self.method = method
+        self.path = path
+
+    def __repr__(self):
+        return '<Endpoint {0.method} {0.path}>'.format(self)
+
+
+# Login:
+SELF = Endpoint(None, 'GET', '/v1/users/self')
+ACCESS_TOKEN = Endpoint('set_token_from_code', 'POST', '/oauth/access_token')
+
+# Users:
+GET_USER = Endpoint('get_user', 'GET', '/v1/users/{}')
+GET_USER_RECENT_MEDIA = Endpoint('get_user_recent_media', 'GET',
+                                 '/v1/users/{}/media/recent')
+GET_SELF_LIKED_MEDIA = Endpoint('get_self_liked_media', 'GET',
+                                '/v1/users/self/media/liked')
+SEARCH_USERS = Endpoint('search_users', 'GET', '/v1/users/search')
+
+# Relationships:
+GET_SELF_FOLLOWS = Endpoint('get_self_follows', 'GET',
+                            '/v1/users/self/follows')
+GET_SELF_FOLLOWED_BY = Endpoint('get_self_followed_by', 'GET',
+                                '/v1/users/self/followed-by')
+GET_SELF_REQUESTED_BY = Endpoint('get_self_requested_by', 'GET',
+                                 '/v1/users/self/requested-by')
+GET_USER_RELATIONSHIP = Endpoint('get_user_relationship', 'GET',
+                                 '/v1/users/{}/relationship')
+SET_USER_RELATIONSHIP = Endpoint('set_user_relationship', 'POST',
+                                 '/v1/users/{}/relationship')
+
+# Media:
+GET_MEDIA = Endpoint('get_media', 'GET', '/v1/media/{}')
+GET_MEDIA_BY_SHORTCODE = Endpoint('get_media', 'GET',
+                                  '/v1/media/shortcode/{}')
+SEARCH_MEDIA = Endpoint('search_media', 'GET', '/v1/media/search')
+
+# Comments:
+GET_COMMENTS = Endpoint('get_comments', 'GET', '/v1/media/{}/comments')
+ADD_COMMENT = Endpoint('add_comment', 'POST', '/v1/media/{}/comments')
+DEL_COMMENT = Endpoint('del_comment', 'DELETE', '/v1/media/{}/comments/{}')
+
+# Likes:
+GET_LIKES = Endpoint('get_likes', 'GET', '/v1/media/{}/likes')
+ADD_LIKE = Endpoint('add_like', 'POST', '/v1/media/{}/likes')
+DEL_LIKE = Endpoint('del_like', 'DELETE', '/v1/media/{}/likes')
+
+# Tags:
+GET_TAG = Endpoint('get_tag', 'GET', '/v1/tags/{}')
+GET_TAGGED_MEDIA = Endpoint('get_tagged_media', 'GET',
+                            '/v1/tags/{}/media/recent')
+SEARCH_TAGS = Endpoint('search_tags', 'GET', '/v1/tags/search')
+
+# Locations:
+GET_LOCATION = Endpoint('get_location', 'GET', '/v1/locations/{}')
+GET_LOCATION_MEDIA = Endpoint('get_location_media', 'GET',
+                              '/v1/locations/{}/media/recent')
+SEARCH_LOCATIONS = Endpoint('search_locations', 'GET',
+                            '/v1/locations/search')
+
+ENDPOINTS = tuple(value for value in list(globals().values())
+                  if isinstance(value, Endpoint))
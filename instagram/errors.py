@@ -55,15 +55,22 @@ class HTTPException(InstagramException):
     .. attribute:: text
 
         The text of the error. Could be an empty string.
+
+    .. attribute:: error_type
+
+        The type of the error reported by the API, e.g.
+        ``'OAuthAccessTokenException'``. Could be an empty string.
     """
 
     def __init__(self, response, message):
         self.response = response
+        self.error_type = ''
         if type(message) is dict:
             # Take 'meta' value, if it exists
             message = message.get('meta', message)
             self.text = message.get('error_message', '')
             self.code = message.get('code', 0)
+            self.error_type = message.get('error_type', '')
         else:
             self.text = message
 
@@ -90,6 +97,62 @@ class NotFound(HTTPException):
     pass
 
 
+class CircuitOpen(InstagramException):
+    """Exception that's thrown when a request is refused without being sent
+    because its endpoint is failing.
+
+    .. attribute:: key
+
+        The (bucket, host) pair of the open circuit.
+
+    .. attribute:: retry_in
+
+        Seconds until the circuit lets a request through again.
+    """
+
+    def __init__(self, key, retry_in):
+        self.key = key
+        self.retry_in = retry_in
+        fmt = 'Circuit for bucket "{0[0]}" on {0[1]} is open'
+        super().__init__(fmt.format(key))
+
+
+class CrawlError(InstagramException):
+    """Exception that's returned by :class:`Crawler` for a key whose call
+    failed in a worker process.
+
+    .. attribute:: key
+
+        The key the call was made for.
+
+    .. attribute:: error
+
+        The name of the exception raised by the call, e.g. ``'NotFound'``.
+
+    .. attribute:: status
+
+        The status code of the response, if the call failed with an
+        :exc:`HTTPException`.
+
+    .. attribute:: error_type
+
+        The type of the error reported by the API. Could be an empty string.
+    """
+
+    def __init__(self, key, error, message, status=None, error_type=''):
+        self.key = key
+        self.error = error
+        self.message = message
+        self.status = status
+        self.error_type = error_type
+        super().__init__('{}: {}'.format(error, message))
+
+    def __reduce__(self):
+        # sent between processes, unlike the exceptions it stands for
+        return (type(self), (self.key, self.error, self.message, self.status,
+                             self.error_type))
+
+
 class InvalidArgument(ClientException):
     """Exception that's thrown when an argument to a function
     is invalid some way (e.g. wrong value or wrong type).
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import bz2
+import gzip
+import json
+import lzma
+import os
+
+from .errors import ClientException, InvalidArgument
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+_COMPRESSORS = {
+    None: None,
+    'gzip': lambda f: gzip.GzipFile(fileobj=f, mode='wb'),
+    'bz2': lambda f: bz2.BZ2File(f, mode='wb'),
+    'xz': lambda f: lzma.LZMAFile(f, mode='wb'),
+}
+
+_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+
+def _dump(item):
+    return json.dumps(item, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+class NDJSONWriter:
+    """Writes items as newline delimited JSON, optionally compressed.
+
+    Each commit ends a compressed stream and returns the file size, which is
+    where writing resumes after a crash. Concatenated gzip, bz2 and xz
+    streams read back as a single file.
+    """
+
+    def __init__(self, path, compression=None):
+        if compression not in _COMPRESSORS:
+            raise InvalidArgument('Unknown compression {!r}'
+                                  .format(compression))
+        self.path = path
+        self.compression = compression
+        self._file = None
+        self._stream = None
+
+    def open(self, position):
+        exists = os.path.exists(self.path)
+        size = os.path.getsize(self.path) if exists else 0
+        if size < (position or 0):
+            # truncating would pad the file with zeros
+            raise ClientException('{!r} is shorter than its checkpoint '
+                                  'says, so the export cannot be resumed'
+                                  .format(self.path))
+        self._file = open(self.path, 'r+b' if exists else 'wb')
+        # anything past the last commit was written after the checkpoint
+        self._file.truncate(position or 0)
+        self._file.seek(0, os.SEEK_END)
+
+    def write(self, items):
+        if self._stream is None:
+            compressor = _COMPRESSORS[self.compression]
+            self._stream = (self._file if compressor is None
+                            else compressor(self._file))
+        self._stream.write(b''.join(_dump(item) for item in items))
+
+    def commit(self):
+        if self._stream is not None and self._stream is not self._file:
+            self._stream.close()
+        self._stream = None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        if self._file is not None:
+            self.commit()
+            self._file.close()
+            self._file = None
+
+
+class ParquetWriter:
+    """Writes items to a directory of Parquet files, one per commit.
+
+    The columns are taken from the first items written. Requires
+    ``pyarrow``.
+    """
+
+    def __init__(self, path):
+        if pyarrow is None:
+            raise InvalidArgument("Parquet output requires 'pyarrow'")
+        self.path = path
+        self._part = 0
+        self._schema = None
+        self._writer = None
+
+    def open(self, position):
+        os.makedirs(self.path, exist_ok=True)
+        self._part = position or 0
+
+    def write(self, items):
+        if not items:
+            return
+        table = pyarrow.Table.from_pylist(items, schema=self._schema)
+        if self._writer is None:
+            self._schema = table.schema
+            name = 'part-{:05d}.parquet'.format(self._part)
+            self._writer = pyarrow.parquet.ParquetWriter(
+                    os.path.join(self.path, name), self._schema)
+        self._writer.write_table(table)
+
+    def commit(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._part += 1
+        return self._part
+
+    def close(self):
+        self.commit()
+
+
+class Exporter:
+    """Streams every item of a paginated endpoint to disk.
+
+    Items are written page by page as they arrive, so memory use does not
+    grow with the size of the endpoint. Every ``checkpoint_every`` pages the
+    output is committed and the pagination cursor saved to ``checkpoint``;
+    running an exporter with the same paths again resumes from there::
+
+        exporter = Exporter(user.iter_self_followed_by, 'followers.ndjson.gz',
+                            checkpoint='followers.checkpoint')
+        count = await exporter.run()
+
+    Parameters
+    -----------
+    paginate : callable
+        Returns a :class:`PageIterator`, e.g. ``user.iter_tagged_media``.
+        It is called with ``args`` and ``kwargs`` and, when resuming, a
+        ``cursor`` keyword argument.
+    path : str
+        The file to write, or the directory for Parquet output.
+    format : str (optional: 'ndjson')
+        Either 'ndjson' or 'parquet'.
+    compression : str (optional: None)
+        'gzip', 'bz2' or 'xz' for NDJSON output. Taken from the suffix of
+        ``path`` if not given.
+    checkpoint : str (optional: None)
+        The file the progress is saved to. Without it an export cannot be
+        resumed.
+    checkpoint_every : int (optional: 10)
+        The number of pages between checkpoints.
+    """
+
+    def __init__(self, paginate, path, *args, format='ndjson',
+                 compression=None, checkpoint=None, checkpoint_every=10,
+                 **kwargs):
+        if format == 'ndjson':
+            if compression is None:
+                compression = _SUFFIXES.get(os.path.splitext(path)[1])
+            self.writer = NDJSONWriter(path, compression)
+        elif format == 'parquet':
+            self.writer = ParquetWriter(path)
+        else:
+            raise InvalidArgument('Unknown format {!r}'.format(format))
+
+        self.paginate = paginate
+        self.args = args
+        self.kwargs = kwargs
+        self.path = path
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+
+    def load_checkpoint(self):
+        """Return the saved progress, or ``None`` if there is none."""
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return None
+        with open(self.checkpoint) as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, state):
+        if self.checkpoint is None:
+            return
+        # replace the old checkpoint atomically
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint)
+
+    async def run(self):
+        """Export every remaining item, returning the total exported."""
+        state = self.load_checkpoint() or {'cursor': None, 'items': 0,
+                                            'position': None, 'done': False}
+        if state['done']:
+            return state['items']
+
+        writer = self.writer
+        writer.open(state['position'])
+
+        kwargs = dict(self.kwargs)
+        if state['cursor'] is not None:
+            kwargs['cursor'] = state['cursor']
+        pages = self.paginate(*self.args, **kwargs)
+        uncommitted = 0
+        try:
+            while True:
+                page = await pages.next_page()
+                if page is None:
+                    break
+
+                writer.write(page)
+                state['items'] += len(page)
+                uncommitted += 1
+                if uncommitted >= self.checkpoint_every:
+                    state['position'] = writer.commit()
+                    state['cursor'] = pages.cursor
+                    self._save_checkpoint(state)
+                    uncommitted = 0
+
+            state['position'] = writer.commit()
+            state['cursor'] = pages.cursor
+            state['done'] = pages.cursor is None
+            self._save_checkpoint(state)
+        finally:
+            pages.close()
+            writer.close()
+
+        return state['items']
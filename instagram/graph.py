@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import array
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+import time
+
+from .errors import InvalidArgument
+
+# 'User' methods paging through the lists a graph can be built from.
+KINDS = ('follows', 'followed_by', 'requested_by')
+
+_BYTEORDER = b'<' if sys.byteorder == 'little' else b'>'
+
+# magic, byte order, kind, creation time, rows, edges
+_GRAPH_HEADER = struct.Struct('=8scB6xdQQ')
+_GRAPH_MAGIC = b'IGGRAPH1'
+
+# magic, byte order, entries, size of the names
+_NAMES_HEADER = struct.Struct('=8sc7xQQ')
+_NAMES_MAGIC = b'IGNAMES1'
+
+
+def _user_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidArgument('User ids must be numeric, got {!r}'
+                              .format(value)) from None
+
+
+def _ids(values=()):
+    return array.array('q', values)
+
+
+def _unique(items, key=None):
+    """Skip items whose key equals the one of the item before."""
+    last = object()
+    for item in items:
+        k = item if key is None else key(item)
+        if k != last:
+            yield item
+            last = k
+
+
+def _difference(a, b):
+    """Return the ids of sorted ``a`` which are not in sorted ``b``."""
+    result = _ids()
+    j, size = 0, len(b)
+    for value in a:
+        while j < size and b[j] < value:
+            j += 1
+        if j == size or b[j] != value:
+            result.append(value)
+    return result
+
+
+def _copy(view):
+    # memoryviews of a mapped file must not outlive it
+    ids = _ids()
+    ids.frombytes(view.tobytes())
+    return ids
+
+
+def _write(path, header, *buffers):
+    # a mapped snapshot may be replaced while open, but not truncated
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        for buffer in buffers:
+            f.write(buffer)
+    os.replace(tmp, path)
+
+
+class _Mapped:
+    """A file mapped into memory, handing out typed views of it."""
+
+    def __init__(self, path, header, magic):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._views = []
+        self.fields = header.unpack_from(self._mmap)
+        self.offset = header.size
+
+        if self.fields[0] != magic:
+            self.close()
+            raise InvalidArgument('{!r} is not a snapshot'.format(path))
+        if self.fields[1] != _BYTEORDER:
+            self.close()
+            raise InvalidArgument('{!r} was written on a machine of another '
+                                  'byte order'.format(path))
+
+    def take(self, count, fmt='q'):
+        view = self._view[self.offset:self.offset + count * 8].cast(fmt)
+        self.offset += count * 8
+        self._views.append(view)
+        return view
+
+    def take_bytes(self, size):
+        view = self._view[self.offset:self.offset + size]
+        self.offset += size
+        self._views.append(view)
+        return view
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._view.release()
+        self._mmap.close()
+
+
+class _Run:
+    """Sorted ids with their usernames packed into one buffer."""
+
+    __slots__ = ('ids', 'offsets', 'names', 'level')
+
+    def __init__(self, pairs=(), level=0):
+        ids = _ids()
+        offsets = array.array('Q', [0])
+        names = bytearray()
+        for user_id, name in pairs:
+            ids.append(user_id)
+            names += name
+            offsets.append(len(names))
+        self.ids, self.offsets, self.names = ids, offsets, bytes(names)
+        self.level = level
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        ids, offsets, names = self.ids, self.offsets, self.names
+        for i in range(len(ids)):
+            yield ids[i], bytes(names[offsets[i]:offsets[i + 1]])
+
+
+def _merge_runs(runs, level):
+    # newer runs first, so their usernames win
+    return _Run(_unique(heapq.merge(*reversed(runs), key=lambda pair: pair[0]),
+                        key=lambda pair: pair[0]), level)
+
+
+class UsernameTable:
+    """Maps numeric user ids to usernames, stored apart from the graph.
+
+    Ids are kept sorted in a typed array next to the offsets of their
+    usernames in a single UTF-8 buffer, so a table costs about 16 bytes per
+    user plus the usernames themselves. Added pages are packed the same way
+    and merged with each other as they pile up, then into the table on the
+    next lookup or save; a later username replaces an earlier one.
+    """
+
+    # pages of the same level merged at once
+    FANOUT = 8
+
+    def __init__(self):
+        self._runs = []
+        self._mapped = None
+
+    def __len__(self):
+        return len(self._merge())
+
+    def add(self, users):
+        """Add the ``(user_id, username)`` pairs of ``users``."""
+        pairs = sorted(((_user_id(user_id), (username or '').encode('utf-8'))
+                        for user_id, username in users),
+                       key=lambda pair: pair[0])
+        if not pairs:
+            return
+
+        runs = self._runs
+        runs.append(_Run(_unique(pairs, key=lambda pair: pair[0])))
+        # fold runs of similar size, so only a few are pending at any time
+        while (len(runs) >= self.FANOUT and
+               len({run.level for run in runs[-self.FANOUT:]}) == 1):
+            level = runs[-1].level + 1
+            runs[-self.FANOUT:] = [_merge_runs(runs[-self.FANOUT:], level)]
+
+    def _merge(self):
+        if len(self._runs) > 1:
+            # the whole table never takes part in folding added pages
+            merged = _merge_runs(self._runs, sys.maxsize)
+            self._close_mapped()
+            self._runs = [merged]
+        return self._runs[0] if self._runs else _Run()
+
+    def get(self, user_id, default=None):
+        """Return the username of ``user_id``."""
+        table = self._merge()
+        user_id = _user_id(user_id)
+        i = bisect.bisect_left(table.ids, user_id)
+        if i == len(table.ids) or table.ids[i] != user_id:
+            return default
+        start, end = table.offsets[i], table.offsets[i + 1]
+        return bytes(table.names[start:end]).decode('utf-8')
+
+    def save(self, path):
+        """Write the table to ``path``, replacing it atomically."""
+        table = self._merge()
+        _write(path, _NAMES_HEADER.pack(_NAMES_MAGIC, _BYTEORDER,
+                                        len(table.ids), len(table.names)),
+               table.ids, table.offsets, table.names)
+
+    @classmethod
+    def load(cls, path):
+        """Map a table saved with :meth:`save` into memory."""
+        mapped = _Mapped(path, _NAMES_HEADER, _NAMES_MAGIC)
+        count, size = mapped.fields[2:]
+        run = _Run(level=sys.maxsize)
+        run.ids = mapped.take(count)
+        run.offsets = mapped.take(count + 1, 'Q')
+        run.names = mapped.take_bytes(size)
+        table = cls()
+        table._mapped = mapped
+        table._runs = [run]
+        return table
+
+    def _close_mapped(self):
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def close(self):
+        """Unmap the file the table was loaded from, if any, dropping the
+        usernames read from it.
+        """
+        if self._mapped is not None:
+            # the mapped table is merged away before any other run
+            del self._runs[0]
+            self._close_mapped()
+
+
+class GraphSnapshot:
+    """Who follows whom, as compressed sparse rows of numeric user ids.
+
+    Each row is an account the graph was collected for, holding the sorted
+    ids of the users it follows (or is followed by, or requested by, see
+    ``kind``). All rows share one typed array of ids, so an edge costs 8
+    bytes. Snapshots loaded with :meth:`load` are mapped from disk rather
+    than read into memory.
+
+    Attributes
+    -----------
+    kind : str
+        'follows', 'followed_by' or 'requested_by'.
+    created_at : float
+        When the snapshot was taken, as a Unix timestamp.
+    rows : sequence
+        The sorted ids of the accounts collected.
+    indptr : sequence
+        Where the ids of each row start in ``indices``, followed by the
+        number of edges.
+    indices : sequence
+        The ids of every row, one after another.
+    """
+
+    def __init__(self, kind, rows, indptr, indices, *, created_at=None):
+        if kind not in KINDS:
+            raise InvalidArgument('Unknown kind {!r}'.format(kind))
+        self.kind = kind
+        self.created_at = time.time() if created_at is None else created_at
+        self.rows = rows
+        self.indptr = indptr
+        self.indices = indices
+        self._mapped = None
+
+    def __repr__(self):
+        return ('<GraphSnapshot kind={0.kind!r} rows={1} edges={0.edges}>'
+                .format(self, len(self)))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, user_id):
+        return self._row(user_id) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def edges(self):
+        return len(self.indices)
+
+    def _row(self, user_id):
+        user_id = _user_id(user_id)
+        i = bisect.bisect_left(self.rows, user_id)
+        if i == len(self.rows) or self.rows[i] != user_id:
+            return None
+        return i
+
+    def neighbours(self, user_id):
+        """Return the sorted ids in the row of ``user_id`` as an
+        'array.array'.
+        """
+        i = self._row(user_id)
+        if i is None:
+            raise KeyError(user_id)
+        view = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        return _copy(view) if isinstance(view, memoryview) else view
+
+    def diff(self, newer, user_id):
+        """Return the ids added to and removed from the row of ``user_id``
+        between this snapshot and ``newer``, e.g. the new and the lost
+        followers.
+
+        A row missing from either snapshot counts as empty.
+        """
+        old = self.neighbours(user_id) if user_id in self else _ids()
+        new = newer.neighbours(user_id) if user_id in newer else _ids()
+        return _difference(new, old), _difference(old, new)
+
+    def save(self, path):
+        """Write the snapshot to ``path``, replacing it atomically."""
+        _write(path, _GRAPH_HEADER.pack(_GRAPH_MAGIC, _BYTEORDER,
+                                        KINDS.index(self.kind),
+                                        self.created_at, len(self.rows),
+                                        len(self.indices)),
+               self.rows, self.indptr, self.indices)
+
+    @classmethod
+    def load(cls, path):
+        """Map a snapshot saved with :meth:`save` into memory."""
+        mapped = _Mapped(path, _GRAPH_HEADER, _GRAPH_MAGIC)
+        kind, created_at, rows, edges = mapped.fields[2:]
+        snapshot = cls(KINDS[kind], mapped.take(rows),
+                       mapped.take(rows + 1), mapped.take(edges),
+                       created_at=created_at)
+        snapshot._mapped = mapped
+        return snapshot
+
+    def close(self):
+        """Unmap the file the snapshot was loaded from, if any."""
+        if self._mapped is not None:
+            self.rows = self.indptr = self.indices = _ids()
+            self._mapped.close()
+            self._mapped = None
+
+
+class GraphCollector:
+    """Pages through the follows, followers or follow requests of users and
+    keeps only their numeric ids.
+
+    Each page is sorted into a compact run of ids as it arrives and the
+    user dicts are dropped, so collecting an account with millions of
+    followers takes little more memory than the ids themselves::
+
+        names = UsernameTable()
+        collector = GraphCollector('followed_by', usernames=names)
+        await collector.collect(user)
+        snapshot = collector.snapshot()
+        snapshot.save('followers.graph')
+
+    Parameters
+    -----------
+    kind : str (optional: 'followed_by')
+        'follows', 'followed_by' or 'requested_by'.
+    usernames : UsernameTable (optional: None)
+        The table the usernames met are added to.
+    """
+
+    def __init__(self, kind='followed_by', *, usernames=None):
+        if kind not in KINDS:
+            raise InvalidArgument('Unknown kind {!r}'.format(kind))
+        self.kind = kind
+        self.usernames = usernames
+        self._rows = {}
+
+    async def collect(self, user, **kwargs):
+        """Collect the row of ``user``, replacing any collected before.
+
+        ``kwargs`` are passed on to the :class:`PageIterator`. Returns the
+        number of ids collected.
+        """
+        if user._id is None:
+            await user.update_user_info()
+
+        pages = getattr(user, 'iter_self_' + self.kind)(**kwargs)
+        runs = []
+        try:
+            while True:
+                page = await pages.next_page()
+                if page is None:
+                    break
+                runs.append(_ids(sorted(_user_id(item['id'])
+                                        for item in page)))
+                if self.usernames is not None:
+                    self.usernames.add((item['id'], item.get('username'))
+                                       for item in page)
+        finally:
+            pages.close()
+
+        row = _ids(_unique(heapq.merge(*runs)))
+        self._rows[_user_id(user._id)] = row
+        return len(row)
+
+    def snapshot(self):
+        """Return a :class:`GraphSnapshot` of the rows collected so far."""
+        rows = _ids(sorted(self._rows))
+        indptr = _ids([0])
+        indices = _ids()
+        for row in rows:
+            indices.extend(self._rows[row])
+            indptr.append(len(indices))
+        return GraphSnapshot(self.kind, rows, indptr, indices)
@@ -26,31 +26,184 @@ DEALINGS IN THE SOFTWARE.
 
 import aiohttp
 import asyncio
+import email.utils
 import json
 import sys
 import logging
-import weakref
+import time
 
 from .errors import HTTPException, Forbidden, NotFound, LoginFailure
+from .cache import request_key
+from .endpoints import ENDPOINTS
+from .metrics import RequestInfo, create_trace_config
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
 from . import __version__
 
 log = logging.getLogger(__name__)
 
+# Decode JSON straight from the response bytes, with the fastest parser
+#   available.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+if orjson is not None:
+    json_loads = orjson.loads
+elif ujson is not None:
+    json_loads = ujson.loads
+else:
+    json_loads = json.loads
+
+
+class ConnectionConfig:
+    """Connection pool and timeout settings for HTTP sessions.
+
+    Parameters
+    -----------
+    limit : int (optional: 100)
+        The maximum number of open connections. ``0`` means no limit.
+    limit_per_host : int (optional: 0)
+        The maximum number of open connections to a single host. ``0`` means
+        no limit.
+    dns_cache_ttl : float (optional: 10)
+        Seconds to cache resolved host names for. ``None`` caches them
+        forever, ``0`` disables the cache.
+    keepalive_timeout : float (optional: 30)
+        Seconds an idle connection is kept open for reuse.
+    connect_timeout : float (optional: None)
+        Seconds allowed for acquiring a connection.
+    read_timeout : float (optional: None)
+        Seconds allowed for reading a response body.
+    total_timeout : float (optional: 300)
+        Seconds allowed for a whole request, from connecting to reading the
+        body.
+    """
+
+    def __init__(self, *, limit=100, limit_per_host=0, dns_cache_ttl=10,
+                 keepalive_timeout=30, connect_timeout=None,
+                 read_timeout=None, total_timeout=300):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+
+    def create_connector(self):
+        return aiohttp.TCPConnector(limit=self.limit,
+                                    limit_per_host=self.limit_per_host,
+                                    use_dns_cache=self.dns_cache_ttl != 0,
+                                    ttl_dns_cache=self.dns_cache_ttl or None,
+                                    keepalive_timeout=self.keepalive_timeout)
+
+    def create_timeout(self):
+        return aiohttp.ClientTimeout(total=self.total_timeout,
+                                     connect=self.connect_timeout,
+                                     sock_read=self.read_timeout)
+
+
+def create_client_session(connector=None, *, config=None, trace=False):
+    """Create the 'aiohttp.ClientSession' requests are sent through.
+
+    With ``trace``, acquired connections are reported to instruments. This
+    has to be called from a coroutine.
+    """
+    trace_configs = [create_trace_config()] if trace else None
+    if config is None:
+        return aiohttp.ClientSession(connector=connector,
+                                     trace_configs=trace_configs)
+
+    if connector is None:
+        connector = config.create_connector()
+    return aiohttp.ClientSession(connector=connector,
+                                 timeout=config.create_timeout(),
+                                 trace_configs=trace_configs)
+
+
+def pool_stats(session):
+    """Return the number of connections of ``session`` in use and idle, and
+    the number of requests waiting for a connection.
+    """
+    # transports other than 'aiohttp.ClientSession' have no connector
+    connector = getattr(session, 'connector', None)
+    acquired = getattr(connector, '_acquired', ())
+    conns = getattr(connector, '_conns', {})
+    waiters = getattr(connector, '_waiters', {})
+    return {
+        'in_use': len(acquired),
+        'idle': sum(len(c) for c in conns.values()),
+        'waiters': sum(len(w) for w in waiters.values()),
+        'limit': getattr(connector, 'limit', None),
+    }
+
+
+def rate_limit_headers(response):
+    """Return the limit and remaining requests reported by ``response``.
+
+    Either value is ``None`` if the API did not report it.
+    """
+    values = []
+    for name in ('X-Ratelimit-Limit', 'X-Ratelimit-Remaining'):
+        try:
+            values.append(int(response.headers[name]))
+        except (KeyError, ValueError):
+            values.append(None)
+    return values
+
+
+def retry_after(response, data):
+    """Return the seconds ``response`` asks to wait before retrying, or
+    ``None`` if it does not say.
+    """
+    value = response.headers.get('Retry-After')
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            pass
+        else:
+            return max(0.0, date.timestamp() - time.time())
+
+    # older responses carry the delay in the body, in milliseconds
+    if isinstance(data, dict) and 'retry_after' in data:
+        return data['retry_after'] / 1000.0
+    return None
+
 
-def create_client_session(connector=None, *, loop=None):
-    return aiohttp.ClientSession(connector=connector, loop=loop)
+def unwrap_data(body):
+    """Return the ``data`` of a response body, or the body if it has none."""
+    # error pages served by proxies are text, not JSON
+    if isinstance(body, dict) and 'data' in body:
+        return body['data']
+    return body
 
 
-@asyncio.coroutine
-def json_or_text(response):
-    text = yield from response.text(encoding='utf-8')
-    if 'application/json' in response.headers['Content-Type']:
-        return json.loads(text)
-    return text
+async def json_or_text(response, loads=json_loads):
+    body = await response.read()
+    if 'application/json' in response.headers.get('Content-Type', ''):
+        return loads(body)
+    return body.decode('utf-8')
 
 
 class HTTPClient:
-    """Represents an HTTP client sending HTTP requests to the Discord API."""
+    """Represents an HTTP client sending HTTP requests to the Discord API.
+
+    Requests are sent through ``session``, an 'aiohttp.ClientSession' or any
+    transport whose ``request`` and ``close`` behave the same way, such as
+    :class:`RecordingTransport` or :class:`ReplayTransport`.
+    """
 
     BASE          = 'https://api.instagram.com'
     API_BASE      = BASE     + '/v1'
@@ -62,82 +215,281 @@ class HTTPClient:
     TAGS          = API_BASE + '/tags'
     LOCATIONS     = API_BASE + '/locations'
 
-    SUCCESS_LOG = '{method} {url} has received {text}'
-    REQUEST_LOG = '{method} {url} with {data} has returned {status}'
+    # formatted by logging, only when the record is emitted
+    SUCCESS_LOG = '%(method)s %(url)s has received %(text)s'
+    REQUEST_LOG = '%(method)s %(url)s with %(data)s has returned %(status)s'
+    RETRY_LOG = ('%(method)s %(url)s failed with %(reason)s, retrying in '
+                 '%(delay).2fs')
 
-    def __init__(self, session=None, *, connector=None, loop=None):
-        self.loop = asyncio.get_event_loop() if loop is None else loop
+    def __init__(self, session=None, *, connector=None, rate_limiter=None,
+                 cache=None, coalesce=True, connection_config=None,
+                 retry_policy=None, circuit_breaker=None,
+                 json_loads=json_loads, instruments=()):
         self.connector = connector
-        if session is None:
-            self.session = create_client_session(connector=connector,
-                                                 loop=self.loop)
-        else:
-            self.session = session
-        self._locks = weakref.WeakValueDictionary()
-        self.token = None
+        if connection_config is None:
+            connection_config = ConnectionConfig()
+        self.connection_config = connection_config
+        # created on the first request if not given, as sessions need a
+        #   running event loop
+        self.session = session
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.coalesce = coalesce
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.json_loads = json_loads
+        # 'Instrument' objects notified of each request's progress
+        self.instruments = tuple(instruments)
+        # coalesced requests and how many callers wait for each
+        self._inflight = {}
+        self._waiters = {}
+        self.base = self.BASE
+        self._token(None)
 
         user_agent = ('InstagramBot (<URL> {0})'
                       ' Python/{1[0]}.{1[1]} aiohttp/{2}')
         self.user_agent = user_agent.format(__version__, sys.version_info,
                                             aiohttp.__version__)
+        # sent with every request, never modified
+        self._headers = {'User-Agent': self.user_agent}
+
+    @property
+    def base(self):
+        """The URL the paths of endpoints are relative to."""
+        return self._base
+
+    @base.setter
+    def base(self, base):
+        self._base = base
+        # the URL templates are built once, not on every call
+        self.urls = {endpoint: base + endpoint.path
+                     for endpoint in ENDPOINTS}
+
+    def url(self, endpoint, *args):
+        """Return the URL of ``endpoint`` with ``args`` filled in."""
+        url = self.urls[endpoint]
+        return url.format(*args) if args else url
+
+    def call(self, endpoint, *args, **kwargs):
+        """Send a request to ``endpoint``, an :class:`Endpoint`, with
+        ``args`` filled into its path. Keyword arguments are passed to
+        :meth:`request`.
+        """
+        url = self.urls[endpoint]
+        if args:
+            url = url.format(*args)
+        return self.request(endpoint.method, url, bucket=endpoint.bucket,
+                            **kwargs)
+
+    async def request(self, method, url, *, bucket=None, return_data=True,
+                      pass_token=True, retry=None, **kwargs):
+        """Send a request to the API.
+
+        Failed requests are retried according to ``retry``, a
+        :class:`RetryPolicy`, or the client's ``retry_policy`` if not given.
+
+        Identical ``GET`` requests made while one is already in flight share
+        its response, or its exception, instead of being sent again. The
+        shared response should be treated as read-only. The request is only
+        cancelled once every caller waiting for it has been.
+        """
+        if (not self.coalesce or method != 'GET'
+                or len(kwargs) > ('params' in kwargs)):
+            return await self._request(method, url, bucket=bucket,
+                                       return_data=return_data,
+                                       pass_token=pass_token, retry=retry,
+                                       **kwargs)
+
+        token = self.token if pass_token else None
+        key = (request_key(method, url, kwargs.get('params', {}), token),
+               return_data)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                    self._request(method, url, bucket=bucket,
+                                  return_data=return_data,
+                                  pass_token=pass_token, retry=retry,
+                                  **kwargs))
+            self._inflight[key] = task
+            self._waiters[key] = 0
+
+            def done(task):
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+                    del self._waiters[key]
+            task.add_done_callback(done)
+
+        self._waiters[key] += 1
+        try:
+            # a cancelled waiter must not cancel the request for the others
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if not self._waiters[key]:
+                    # nobody is left to wait for the request
+                    del self._inflight[key]
+                    del self._waiters[key]
+                    task.cancel()
+
+    async def _request(self, method, url, *, bucket=None, return_data=True,
+                       pass_token=True, retry=None, **kwargs):
+        limiter = self.rate_limiter
+        token = self.token
+
+        headers = self._headers
+        request_data = kwargs.pop('params', None) or {}
+
+        # serve read-only endpoints from the cache when possible
+        cache = self.cache
+        ttl = None if cache is None else cache.ttl(method, bucket)
+        entry = None
+        if ttl is not None:
+            key = request_key(method, url, request_data, token)
+            entry = cache.get(key)
+            if entry is not None and entry.expires > time.time():
+                cache.hits += 1
+                body = entry.body
+                return unwrap_data(body) if return_data else body
+
+            cache.misses += 1
+            if entry is not None and entry.etag is not None:
+                headers = dict(headers)
+                headers['If-None-Match'] = entry.etag
+
+        if (token is not None) and pass_token:
+            # the caller's params are left untouched
+            if request_data:
+                request_data = dict(request_data, access_token=token)
+            else:
+                request_data = self._token_params
 
-    @asyncio.coroutine
-    def request(self, method, url, *, bucket=None, return_data=True,
-                pass_token=True, **kwargs):
-        lock = self._locks.get(bucket)
-        if lock is None:
-            lock = asyncio.Lock(loop=self.loop)
-            if bucket is not None:
-                self._locks[bucket] = lock
+        kwargs['params'] = request_data
+        kwargs['headers'] = headers
+        policy = self.retry_policy if retry is None else retry
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            circuit = breaker.key(bucket, url)
+        if self.session is None:
+            self.recreate()
+        info = None
+        if self.instruments:
+            info = RequestInfo(method, url, bucket, self.instruments)
+            info.emit('request_queued')
+            kwargs['trace_request_ctx'] = info
+        started = time.monotonic()
+        attempt = 0
+        exc = None
+        # the circuit is told the outcome of the request once, however many
+        #   attempts it took
+        admitted = False
+        failed = None
+        try:
+            if breaker is not None:
+                # fail fast while the endpoint is failing, rather than
+                #   queueing behind the requests retrying against it
+                breaker.check(circuit)
+            async with limiter.acquire(token, bucket):
+                if breaker is not None:
+                    # the circuit may have opened while waiting
+                    breaker.before(circuit)
+                    admitted = True
+                while True:
+                    await limiter.throttle(token)
+                    policy.sent()
+                    attempt += 1
+                    if info is not None:
+                        info.attempt = attempt
+                        info.emit('request_acquired')
+                    try:
+                        async with self.session.request(method, url,
+                                                        **kwargs) as r:
+                            if info is not None:
+                                info.status = r.status
+                                info.emit('first_byte')
+                            # even errors have text involved in them so this
+                            #   is safe to call, unless the response has no
+                            #   body
+                            data = ''
+                            if r.status != 304:
+                                data = await json_or_text(r, self.json_loads)
+                            if info is not None:
+                                info.bytes = len(await r.read())
+                                info.emit('response_decoded')
+                    except BaseException as e:
+                        failed = isinstance(e, policy.exceptions) or None
+                        if not policy.retries_exception(method, e):
+                            raise
+                        delay = policy.delay(attempt,
+                                             time.monotonic() - started)
+                        if delay is None:
+                            raise
+                        log.info(self.RETRY_LOG, {'method': method,
+                                                  'url': url,
+                                                  'reason': repr(e),
+                                                  'delay': delay})
+                        if info is not None:
+                            info.emit('request_retried', e, delay)
+                        await asyncio.sleep(delay)
+                        continue
 
-        # header creation
-        headers = {
-            'User-Agent': self.user_agent,
-        }
+                    log.debug(self.REQUEST_LOG, {'method': method, 'url': url,
+                                                 'status': r.status,
+                                                 'data': request_data})
 
-        request_data = kwargs.pop('params', {})
+                    limit, remaining = rate_limit_headers(r)
+                    if remaining is not None:
+                        await limiter.update(token, bucket, limit, remaining)
 
-        if (self.token is not None) and pass_token:
-            request_data['access_token'] = self.token
+                    failed = r.status >= 500 or r.status == 429
 
-        kwargs['params'] = request_data
-        kwargs['headers'] = headers
-        with (yield from lock):
-            for tries in range(5):
-                r = yield from self.session.request(method, url, **kwargs)
-                log.debug(self.REQUEST_LOG.format(method=method, url=url,
-                                                  status=r.status,
-                                                  data=request_data))
-                try:
-                    # even errors have text involved in them so this is safe to
-                    #   call
-                    data = yield from json_or_text(r)
-
-                    # Take data value of response (if it exists and is wanted):
-                    if return_data and ('data' in data):
-                        data = data['data']
-
-                    # the request was successful so just return the text/json
-                    if 300 > r.status >= 200:
-                        log.debug(self.SUCCESS_LOG.format(method=method,
-                                  url=url, text=data))
-                        return data
+                    # the cached response is still current
+                    if r.status == 304 and entry is not None:
+                        cache.revalidations += 1
+                        cache.set(key, entry.body, entry.etag, ttl)
+                        data = entry.body
+                        return unwrap_data(data) if return_data else data
 
-                    # we are being rate limited
-                    if r.status == 429:
-                        fmt = ('We are being rate limited. Retrying in {:.2}'
-                               'seconds. Handled under the bucket "{}"')
+                    if ttl is not None and 300 > r.status >= 200:
+                        cache.set(key, data, r.headers.get('ETag'), ttl)
 
-                        # sleep a bit
-                        retry_after = data['retry_after'] / 1000.0
-                        log.info(fmt.format(retry_after, bucket))
-                        yield from asyncio.sleep(retry_after)
-                        continue
+                    # Take data value of response (if it exists and is
+                    #   wanted):
+                    if return_data:
+                        data = unwrap_data(data)
 
-                    # we've received a 502, unconditional retry
-                    if r.status == 502 and tries <= 5:
-                        yield from asyncio.sleep(1 + tries * 2)
-                        continue
+                    # the request was successful so just return the
+                    #   text/json
+                    if 300 > r.status >= 200:
+                        log.debug(self.SUCCESS_LOG, {'method': method,
+                                                     'url': url, 'text': data})
+                        return data
+
+                    if policy.retries_status(method, r.status):
+                        delay = policy.delay(attempt,
+                                             time.monotonic() - started,
+                                             retry_after(r, data))
+                        if delay is not None:
+                            if info is not None:
+                                info.emit('request_retried', r.status, delay)
+                            if r.status == 429:
+                                # we are being rate limited, hold back every
+                                #   request on this token; the retry waits
+                                #   in throttle()
+                                log.info('We are being rate limited. Retrying '
+                                         'in %.2f seconds. Handled under the '
+                                         'bucket "%s"', delay, bucket)
+                                await limiter.pause(token, delay)
+                            else:
+                                log.info(self.RETRY_LOG, {
+                                        'method': method, 'url': url,
+                                        'reason': r.status, 'delay': delay})
+                                await asyncio.sleep(delay)
+                            continue
 
                     # the usual error cases
                     if r.status == 403:
@@ -146,9 +498,14 @@ class HTTPClient:
                         raise NotFound(r, data)
                     else:
                         raise HTTPException(r, data)
-                finally:
-                    # clean-up just in case
-                    yield from r.release()
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            if admitted:
+                breaker.record(circuit, failed)
+            if info is not None:
+                info.emit('request_finished', exc)
 
     def get(self, *args, **kwargs):
         return self.request('GET', *args, **kwargs)
@@ -167,13 +524,22 @@ class HTTPClient:
 
     # state management
 
-    @asyncio.coroutine
-    def close(self):
-        yield from self.session.close()
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
 
     def recreate(self):
-        self.session = aiohttp.ClientSession(connector=self.connector,
-                                             loop=self.loop)
+        self.session = create_client_session(self.connector,
+                                             config=self.connection_config,
+                                             trace=bool(self.instruments))
+
+    def pool_stats(self):
+        return pool_stats(self.session)
+
+    def rate_limit_status(self):
+        """Return the rate limit budget of the current token."""
+        return self.rate_limiter.status(self.token)
 
     def _token(self, token):
         self.token = token
+        self._token_params = {'access_token': token}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import os
+import time
+
+from .cache import token_scope
+
+
+class IdentityCache:
+    """Remembers the user each token was validated as.
+
+    Entries map a digest of the token to the user's id and username and the
+    time it was validated, so tokens themselves are never written to disk.
+    :meth:`Client.add_user` uses them instead of asking the API while they
+    are younger than ``ttl``.
+
+    Parameters
+    -----------
+    path : str (optional: None)
+        The JSON file entries are saved to. Without it they are only kept in
+        memory.
+    ttl : float (optional: 86400)
+        Seconds a validation is trusted for.
+    """
+
+    def __init__(self, path=None, *, ttl=86400.0):
+        self.path = path
+        self.ttl = ttl
+        self._entries = {}
+        self._dirty = False
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, token):
+        """Return the ``(id, username)`` ``token`` was validated as, or
+        ``None`` if it was not validated within ``ttl``.
+        """
+        entry = self._entries.get(token_scope(token))
+        if entry is None or entry['validated_at'] + self.ttl < time.time():
+            return None
+        return entry['id'], entry['username']
+
+    def set(self, token, user_id, username):
+        self._entries[token_scope(token)] = {
+                'id': user_id,
+                'username': username,
+                'validated_at': time.time(),
+        }
+        self._dirty = True
+
+    def delete(self, token):
+        if self._entries.pop(token_scope(token), None) is not None:
+            self._dirty = True
+
+    def save(self):
+        """Write the entries to ``path`` if they changed, dropping expired
+        ones.
+        """
+        if self.path is None or not self._dirty:
+            return
+
+        expired = time.time() - self.ttl
+        self._entries = {key: entry for key, entry in self._entries.items()
+                         if entry['validated_at'] >= expired}
+        # replace the old file atomically
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
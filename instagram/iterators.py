@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import collections
+import weakref
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+
+from .errors import HTTPException, InvalidArgument
+
+# Pagination keys which can stand in for 'next_url', mapped to the query
+#   parameter they are sent back as.
+_CURSOR_KEYS = (
+    ('next_max_id', 'max_id'),
+    ('next_max_tag_id', 'max_tag_id'),
+    ('next_cursor', 'cursor'),
+)
+
+_EXHAUSTED = object()
+
+
+def _without_token(url):
+    """Return ``url`` without its 'access_token' query parameter."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k != 'access_token']
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class PageIterator:
+    """Asynchronous iterator over every item of a paginated endpoint.
+
+    Pages are fetched by a background task which runs ahead of the caller,
+    so the next page is usually ready by the time the current one has been
+    processed::
+
+        followers = user.iter_self_followed_by(limit=1000)
+        async for follower in followers:
+            ...
+
+    An iterator left before it is exhausted stops fetching once it is
+    garbage collected. Use it as an async context manager, or call
+    :meth:`close`, to stop it right away::
+
+        async with user.iter_self_followed_by() as followers:
+            async for follower in followers:
+                if done(follower):
+                    break
+
+    Parameters
+    -----------
+    client : HTTPClient
+        The client to send requests through.
+    url : str
+        The URL of the first page.
+    bucket : str (optional: None)
+        The rate limiting bucket the requests are handled under.
+    params : dict (optional: None)
+        Query parameters sent with the first page.
+    prefetch : int (optional: 1)
+        The number of pages buffered ahead of the caller.
+    limit : int (optional: None)
+        The maximum number of items to return.
+    page_limit : int (optional: None)
+        The maximum number of pages to fetch.
+    model : type (optional: None)
+        A class from :mod:`instagram.models`, e.g. :class:`Media`, to build
+        from each item instead of returning the raw dict.
+    cursor : str (optional: None)
+        A :attr:`cursor` saved from an earlier iterator over the same
+        endpoint, to resume from instead of starting at the first page.
+
+    Attributes
+    -----------
+    cursor : str
+        The URL of the page after the last one handed to the caller, without
+        the access token. This is ``None`` once the endpoint is exhausted.
+    """
+
+    def __init__(self, client, url, *, bucket=None, params=None, prefetch=1,
+                 limit=None, page_limit=None, model=None, cursor=None):
+        if prefetch < 1:
+            raise InvalidArgument("'prefetch' must be at least 1")
+
+        self.client = client
+        self.url = url
+        self.bucket = bucket
+        self.params = {} if params is None else params
+        self.limit = limit
+        self.page_limit = page_limit
+        self.model = model
+        self.cursor = cursor
+
+        self._queue = asyncio.Queue(maxsize=prefetch)
+        self._items = collections.deque()
+        self._task = None
+        self._count = 0
+        self._exhausted = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.limit is not None and self._count >= self.limit:
+            raise StopAsyncIteration
+
+        while not self._items:
+            page = await self.next_page()
+            if page is None:
+                raise StopAsyncIteration
+
+            self._items.extend(page)
+
+        self._count += 1
+        if self.limit is not None and self._count >= self.limit:
+            self.close()
+
+        item = self._items.popleft()
+        if self.model is not None:
+            item = self.model(item)
+        return item
+
+    async def next_page(self):
+        """Return the next page of items, or ``None`` once exhausted."""
+        if self._exhausted:
+            return None
+
+        if self._task is None:
+            self._start()
+
+        page, cursor = await self._queue.get()
+        if isinstance(page, Exception):
+            self._exhausted = True
+            raise page
+
+        self.cursor = cursor
+        if page is _EXHAUSTED:
+            self._exhausted = True
+            return None
+        return page
+
+    async def flatten(self):
+        """Return every remaining item as a list."""
+        items = []
+        while True:
+            try:
+                item = await self.__anext__()
+            except StopAsyncIteration:
+                return items
+            items.append(item)
+
+    def close(self):
+        """Stop fetching pages in the background."""
+        self._exhausted = True
+        if self._task is not None:
+            self._task.cancel()
+
+    async def aclose(self):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def _next_url(self, pagination):
+        """Return the URL of the page after the one ``pagination`` is from."""
+        return _next_url(self.url, self.params, pagination)
+
+    def _start(self):
+        if self.cursor is None:
+            url, params = self.url, dict(self.params)
+        else:
+            url, params = self.cursor, {}
+        # the task does not refer to the iterator, so an iterator dropped
+        #   without being closed, e.g. after a 'break', stops it when
+        #   collected
+        self._task = asyncio.ensure_future(_fill(
+                self.client, url, params, self.bucket, self.page_limit,
+                self._queue, self.url, dict(self.params)))
+        weakref.finalize(self, self._task.cancel)
+
+
+def _next_url(url, params, pagination):
+    next_url = pagination.get('next_url')
+    if next_url is not None:
+        # the token is passed again with each request
+        return _without_token(next_url)
+
+    for key, param in _CURSOR_KEYS:
+        value = pagination.get(key)
+        if value is not None:
+            params = dict(params)
+            params[param] = value
+            return '{}?{}'.format(url, urlencode(params))
+
+    return None
+
+
+async def _fill(client, url, params, bucket, page_limit, queue, first_url,
+                first_params):
+    pages = 0
+    try:
+        while url is not None:
+            if page_limit is not None and pages >= page_limit:
+                break
+
+            response = await client.get(url, params=params, bucket=bucket,
+                                        return_data=False)
+            pages += 1
+
+            pagination = response.get('pagination') or {}
+            url, params = _next_url(first_url, first_params, pagination), {}
+            await queue.put((response.get('data', []), url))
+    except Exception as e:
+        await queue.put((e, None))
+        return
+
+    await queue.put((_EXHAUSTED, url))
+
+
+class BulkIterator:
+    """Asynchronous iterator over the results of a call made for many keys.
+
+    ``func`` is called once for every distinct key, with at most
+    ``concurrency`` calls in flight. ``(key, result)`` pairs are returned in
+    the order the calls complete. A call failing with :exc:`HTTPException`
+    (e.g. :exc:`NotFound` or :exc:`Forbidden`) has the exception as its
+    result instead of failing the whole batch.
+
+    Parameters
+    -----------
+    func : coroutine function
+        The call to make, taking a key as its only argument.
+    keys : iterable
+        The keys to call ``func`` with. Duplicates are only called once.
+    concurrency : int (optional: 10)
+        The maximum number of calls in flight.
+    """
+
+    def __init__(self, func, keys, *, concurrency=10):
+        if concurrency < 1:
+            raise InvalidArgument("'concurrency' must be at least 1")
+
+        self.func = func
+        self.keys = list(collections.OrderedDict.fromkeys(keys))
+        self.concurrency = concurrency
+
+        self._pending = collections.deque(self.keys)
+        self._remaining = len(self.keys)
+        self._queue = asyncio.Queue()
+        self._workers = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._remaining == 0:
+            raise StopAsyncIteration
+
+        if self._workers is None:
+            self._workers = [asyncio.ensure_future(self._work())
+                             for _ in range(min(self.concurrency,
+                                                len(self.keys)))]
+
+        key, result, failed = await self._queue.get()
+        if failed:
+            self.close()
+            raise result
+
+        self._remaining -= 1
+        return key, result
+
+    async def results(self):
+        """Return a dict of every remaining result, keyed by key."""
+        results = {}
+        while True:
+            try:
+                key, result = await self.__anext__()
+            except StopAsyncIteration:
+                return results
+            results[key] = result
+
+    def close(self):
+        """Cancel the calls which have not completed yet."""
+        self._remaining = 0
+        self._pending.clear()
+        for worker in self._workers or ():
+            worker.cancel()
+
+    async def _work(self):
+        while self._pending:
+            key = self._pending.popleft()
+            failed = False
+            try:
+                result = await self.func(key)
+            except HTTPException as e:
+                result = e
+            except Exception as e:
+                result, failed = e, True
+            await self._queue.put((key, result, failed))
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import bisect
+import collections
+import time
+
+import aiohttp
+
+from .errors import InvalidArgument
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+class RequestInfo:
+    """The progress of one request through :meth:`HTTPClient.request`,
+    passed to every :class:`Instrument` hook.
+
+    Attributes
+    -----------
+    method : str
+        The HTTP method.
+    url : str
+        The URL requested, without its query string.
+    bucket : str
+        The bucket the request is made under.
+    attempt : int
+        The number of attempts sent so far.
+    status : int
+        The status of the last response, if any.
+    bytes : int
+        The size of the last response body, if any.
+    started : float
+        When the request was queued, from :func:`time.monotonic`.
+    elapsed : float
+        Seconds between the last two events.
+    extra : dict
+        Room for instruments to keep their own state, e.g. a span.
+    """
+
+    __slots__ = ('method', 'url', 'bucket', 'attempt', 'status', 'bytes',
+                 'started', 'elapsed', 'extra', '_last', '_instruments')
+
+    def __init__(self, method, url, bucket, instruments):
+        self.method = method
+        self.url = url
+        self.bucket = bucket
+        self.attempt = 0
+        self.status = None
+        self.bytes = None
+        self.started = self._last = time.monotonic()
+        self.elapsed = 0.0
+        self.extra = {}
+        self._instruments = instruments
+
+    def emit(self, event, *args):
+        """Call the ``event`` hook of every instrument."""
+        now = time.monotonic()
+        self.elapsed = now - self._last
+        self._last = now
+        for instrument in self._instruments:
+            getattr(instrument, event)(self, *args)
+
+    @property
+    def total(self):
+        """Seconds since the request was queued."""
+        return time.monotonic() - self.started
+
+
+class Instrument:
+    """Receives the events of every request made by :class:`HTTPClient`.
+
+    Subclasses override the hooks they need. Each is called with the
+    :class:`RequestInfo` of the request, whose ``elapsed`` holds the seconds
+    since the previous event. Hooks are called on the hot path and must not
+    block.
+
+    ``connection_acquired`` is only called for sessions created by this
+    library, which trace their connections.
+    """
+
+    def request_queued(self, info):
+        """The request is waiting for the rate limiter."""
+
+    def request_acquired(self, info):
+        """The rate limiter let the request through."""
+
+    def connection_acquired(self, info):
+        """A connection to send the request on was acquired."""
+
+    def first_byte(self, info):
+        """The response headers were received."""
+
+    def response_decoded(self, info):
+        """The response body was read and decoded."""
+
+    def request_retried(self, info, reason, delay):
+        """The request will be sent again in ``delay`` seconds."""
+
+    def request_finished(self, info, exc):
+        """The request completed, or failed with ``exc``."""
+
+
+class Histogram:
+    """Counts observations in buckets with the given upper bounds.
+
+    Quantiles are estimated from the bucket bounds, so their precision
+    depends on the bounds chosen.
+    """
+
+    # 1ms to about a minute, each bound twice the previous one
+    DEFAULT_BOUNDS = tuple(0.001 * 2 ** i for i in range(17))
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding the ``q`` quantile,
+        or ``None`` if nothing was observed.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+        }
+
+
+class _BucketMetrics:
+    def __init__(self, bounds):
+        self.histograms = collections.defaultdict(lambda: Histogram(bounds))
+        self.counters = collections.Counter()
+
+
+class Metrics(Instrument):
+    """Collects latency histograms and counters per bucket.
+
+    The time of each request is split into stages, so it shows whether
+    latency is spent waiting on the rate limiter (``wait``), connecting
+    (``connect``), waiting for the server (``first_byte``) or reading and
+    decoding the body (``decode``). ``total`` covers the whole request,
+    retries included.
+
+    Parameters
+    -----------
+    bounds : iterable (optional: Histogram.DEFAULT_BOUNDS)
+        The upper bounds of the histogram buckets, in seconds.
+    """
+
+    def __init__(self, bounds=Histogram.DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.buckets = collections.defaultdict(
+                lambda: _BucketMetrics(self.bounds))
+
+    def _observe(self, info, stage, value):
+        self.buckets[info.bucket].histograms[stage].observe(value)
+
+    def _count(self, info, counter, value=1):
+        self.buckets[info.bucket].counters[counter] += value
+
+    def request_queued(self, info):
+        self._count(info, 'requests')
+
+    def request_acquired(self, info):
+        self._observe(info, 'wait', info.elapsed)
+
+    def connection_acquired(self, info):
+        self._observe(info, 'connect', info.elapsed)
+
+    def first_byte(self, info):
+        self._observe(info, 'first_byte', info.elapsed)
+
+    def response_decoded(self, info):
+        self._observe(info, 'decode', info.elapsed)
+        self._count(info, 'bytes', info.bytes or 0)
+
+    def request_retried(self, info, reason, delay):
+        self._count(info, 'retries')
+        if info.status == 429:
+            self._count(info, 'rate_limited')
+
+    def request_finished(self, info, exc):
+        self._observe(info, 'total', info.total)
+        if exc is not None:
+            self._count(info, 'errors')
+        elif info.status is not None:
+            self._count(info, 'status_{}'.format(info.status))
+
+    def snapshot(self):
+        """Return the histograms and counters of every bucket."""
+        return {bucket: {'latency': {stage: histogram.snapshot()
+                                     for stage, histogram
+                                     in metrics.histograms.items()},
+                         'counters': dict(metrics.counters)}
+                for bucket, metrics in self.buckets.items()}
+
+    def reset(self):
+        self.buckets.clear()
+
+
+class TracingInstrument(Instrument):
+    """Records every request as an OpenTelemetry span, with an event for
+    each stage. Requires ``opentelemetry-api``.
+
+    Parameters
+    -----------
+    tracer : opentelemetry.trace.Tracer (optional: None)
+        The tracer to use. By default one is taken from the global tracer
+        provider.
+    """
+
+    def __init__(self, tracer=None):
+        if tracer is None:
+            if otel_trace is None:
+                raise InvalidArgument("Tracing requires 'opentelemetry-api'")
+            tracer = otel_trace.get_tracer(__name__)
+        self.tracer = tracer
+
+    def request_queued(self, info):
+        info.extra[self] = self.tracer.start_span(
+                'instagram {}'.format(info.bucket or info.method),
+                attributes={'http.method': info.method,
+                            'http.url': info.url,
+                            'instagram.bucket': info.bucket or ''})
+
+    def _event(self, info, name, **attributes):
+        span = info.extra.get(self)
+        if span is not None:
+            span.add_event(name, attributes=attributes)
+
+    def request_acquired(self, info):
+        self._event(info, 'acquired', attempt=info.attempt)
+
+    def connection_acquired(self, info):
+        self._event(info, 'connection_acquired')
+
+    def first_byte(self, info):
+        self._event(info, 'first_byte', status=info.status)
+
+    def response_decoded(self, info):
+        self._event(info, 'decoded', bytes=info.bytes or 0)
+
+    def request_retried(self, info, reason, delay):
+        self._event(info, 'retry', reason=str(reason), delay=delay)
+
+    def request_finished(self, info, exc):
+        span = info.extra.pop(self, None)
+        if span is None:
+            return
+        if info.status is not None:
+            span.set_attribute('http.status_code', info.status)
+        if exc is not None:
+            span.record_exception(exc)
+            span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+        span.end()
+
+
+async def _on_connection_acquired(session, context, params):
+    info = context.trace_request_ctx
+    if isinstance(info, RequestInfo):
+        info.emit('connection_acquired')
+
+
+def create_trace_config():
+    """Return an 'aiohttp.TraceConfig' reporting acquired connections to
+    the :class:`RequestInfo` passed as ``trace_request_ctx``.
+    """
+    config = aiohttp.TraceConfig()
+    config.on_connection_reuseconn.append(_on_connection_acquired)
+    config.on_connection_create_end.append(_on_connection_acquired)
+    return config
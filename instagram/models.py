@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import collections
+import json
+import sys
+
+Image = collections.namedtuple('Image', 'url width height')
+Counts = collections.namedtuple('Counts', 'media follows followed_by')
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+def _intern(value):
+    # values such as media types and filters repeat across most items
+    return None if value is None else sys.intern(value)
+
+
+def _pack(value):
+    if value is None:
+        return None
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _packed(name, parse, doc=None):
+    """Return a property building its value from the ``_<name>`` slot, which
+    holds the raw value packed as compact JSON, each time it is read.
+
+    Nested payloads make up most of an item, and packed they take a
+    fraction of the memory of the dicts they were parsed into.
+    """
+    attr = '_' + name
+
+    def getter(self):
+        value = getattr(self, attr)
+        if value is None:
+            return None
+        return parse(json.loads(value))
+
+    return property(getter, doc=doc)
+
+
+class Resolutions(dict):
+    """The :class:`Image` of each resolution, keyed by name, e.g.
+    ``'thumbnail'``.
+    """
+
+    __slots__ = ()
+
+
+def _parse_images(data):
+    return Resolutions((kind, Image(image.get('url'), image.get('width'),
+                                    image.get('height')))
+                       for kind, image in data.items())
+
+
+def _parse_counts(data):
+    if data is None:
+        return None
+    return Counts(data.get('media'), data.get('follows'),
+                  data.get('followed_by'))
+
+
+class _Model:
+    __slots__ = ('_raw',)
+
+    def __init__(self, data, keep_raw):
+        self._raw = data if keep_raw else None
+
+    @property
+    def raw(self):
+        """The payload this object was built from, if it was kept."""
+        return self._raw
+
+    @classmethod
+    def from_list(cls, items, *, keep_raw=False):
+        return [cls(item, keep_raw=keep_raw) for item in items]
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.id == other.id
+
+    def __hash__(self):
+        return hash((type(self), self.id))
+
+    def __repr__(self):
+        return '<{0.__class__.__name__} id={0.id!r}>'.format(self)
+
+
+class UserProfile(_Model):
+    """An Instagram user, as returned by :meth:`User.get_user`.
+
+    Parameters
+    -----------
+    data : dict
+        The user returned by the API.
+    keep_raw (kwarg) : bool (optional: False)
+        Whether to keep ``data`` available as :attr:`raw`.
+    """
+
+    __slots__ = ('id', 'username', 'full_name', 'profile_picture', 'bio',
+                 'website', 'is_business', 'counts')
+
+    def __init__(self, data, *, keep_raw=False):
+        super().__init__(data, keep_raw)
+        self.id = data.get('id')
+        self.username = data.get('username')
+        self.full_name = data.get('full_name')
+        self.profile_picture = data.get('profile_picture')
+        self.bio = data.get('bio')
+        self.website = data.get('website')
+        self.is_business = data.get('is_business')
+        #: The media, follows and followed_by :class:`Counts`, if present.
+        self.counts = _parse_counts(data.get('counts'))
+
+
+class Comment(_Model):
+    """A comment, or a media caption, as returned by
+    :meth:`User.get_comments`.
+    """
+
+    __slots__ = ('id', 'text', 'created_time', '_author')
+
+    def __init__(self, data, *, keep_raw=False):
+        super().__init__(data, keep_raw)
+        self.id = data.get('id')
+        self.text = data.get('text')
+        self.created_time = _int(data.get('created_time'))
+        self._author = _pack(data.get('from'))
+
+    author = _packed('author', UserProfile, 'The :class:`UserProfile` of the '
+                   'author.')
+
+
+class Location(_Model):
+    """A location, as returned by :meth:`User.get_location`."""
+
+    __slots__ = ('id', 'name', 'latitude', 'longitude')
+
+    def __init__(self, data, *, keep_raw=False):
+        super().__init__(data, keep_raw)
+        self.id = data.get('id')
+        self.name = data.get('name')
+        self.latitude = data.get('latitude')
+        self.longitude = data.get('longitude')
+
+
+class Tag(_Model):
+    """A tag, as returned by :meth:`User.get_tag`."""
+
+    __slots__ = ('name', 'media_count')
+
+    def __init__(self, data, *, keep_raw=False):
+        super().__init__(data, keep_raw)
+        self.name = data.get('name')
+        self.media_count = data.get('media_count')
+
+    @property
+    def id(self):
+        # tags are identified by their name
+        return self.name
+
+
+class Media(_Model):
+    """An image, video or carousel, as returned by :meth:`User.get_media`.
+
+    Nested fields (images, videos, caption, user and location) are kept
+    packed and built each time they are read.
+    """
+
+    __slots__ = ('id', 'type', 'created_time', 'link', 'filter', 'tags',
+                 'comment_count', 'like_count', 'user_has_liked',
+                 '_images', '_videos', '_caption', '_user', '_location')
+
+    def __init__(self, data, *, keep_raw=False):
+        super().__init__(data, keep_raw)
+        self.id = data.get('id')
+        self.type = _intern(data.get('type'))
+        self.created_time = _int(data.get('created_time'))
+        self.link = data.get('link')
+        self.filter = _intern(data.get('filter'))
+        self.tags = tuple(map(_intern, data.get('tags') or ()))
+        self.comment_count = (data.get('comments') or {}).get('count')
+        self.like_count = (data.get('likes') or {}).get('count')
+        self.user_has_liked = data.get('user_has_liked')
+        self._images = _pack(data.get('images'))
+        self._videos = _pack(data.get('videos'))
+        self._caption = _pack(data.get('caption'))
+        self._user = _pack(data.get('user'))
+        self._location = _pack(data.get('location'))
+
+    images = _packed('images', _parse_images,
+                     'The :class:`Image` of each resolution, keyed by name.')
+    videos = _packed('videos', _parse_images,
+                     'The :class:`Image` of each video resolution, keyed by '
+                     'name.')
+    caption = _packed('caption', Comment, 'The caption as a '
+                      ':class:`Comment`.')
+    user = _packed('user', UserProfile, 'The :class:`UserProfile` of the '
+                   'owner.')
+    location = _packed('location', Location, 'The :class:`Location`, if '
+                       'any.')
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import collections
+import logging
+
+from . import endpoints as ep
+from .errors import InvalidArgument
+from .iterators import PageIterator, _next_url
+
+log = logging.getLogger(__name__)
+
+
+class SeenIndex:
+    """Set of the most recently added ids, bounded to ``max_size``.
+
+    Once full, the oldest ids are forgotten first.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._ids = collections.OrderedDict()
+
+    def __contains__(self, item_id):
+        return item_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, item_id):
+        self._ids[item_id] = None
+        if len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+
+class Feed:
+    """A media feed watched by :class:`FeedPoller`.
+
+    Attributes
+    -----------
+    kind : str
+        'tag', 'location' or 'user'.
+    key : str
+        The tag name, location id or user id.
+    min_id : str
+        The high-water mark sent with the next poll. Only media newer than
+        it are returned.
+    interval : float
+        Seconds until the next poll.
+    """
+
+    def __init__(self, kind, key, url, bucket, param, interval, seen_size):
+        self.kind = kind
+        self.key = key
+        self.url = url
+        self.bucket = bucket
+        self.param = param
+        self.interval = interval
+        self.min_id = None
+        self.seen = SeenIndex(seen_size)
+        self.task = None
+
+    def __repr__(self):
+        return '<Feed kind={0.kind!r} key={0.key!r}>'.format(self)
+
+
+class FeedPoller:
+    """Watches many tag, location and user feeds for new media.
+
+    Each poll only asks for media newer than the feed's high-water mark
+    (``min_tag_id`` for tags, ``min_id`` otherwise), and media already seen
+    are dropped. Feeds which produce new media are polled more often, down
+    to ``min_interval``; quiet feeds back off up to ``max_interval``. At most
+    ``concurrency`` polls are in flight at once.
+
+    ``callback`` is called with the :class:`Feed` and a list of new media,
+    newest first. It may be a coroutine function. If more than a page of
+    media arrived between two polls, the older pages are fetched too, up to
+    ``max_pages`` pages per poll. The first poll of a feed only fetches
+    the newest page.
+
+    Feeds are watched by tasks on the running event loop, so the ``add_``
+    methods must be called from a coroutine.
+
+    Parameters
+    -----------
+    user : User
+        The user to poll as.
+    callback : callable
+        Called with new media.
+    min_interval : float (optional: 30)
+        The shortest time between two polls of a feed, in seconds.
+    max_interval : float (optional: 900)
+        The longest time between two polls of a feed, in seconds.
+    concurrency : int (optional: 10)
+        The maximum number of polls in flight.
+    seen_size : int (optional: 1000)
+        The number of media ids remembered per feed.
+    max_pages : int (optional: 10)
+        The most pages fetched by one poll.
+    """
+
+    def __init__(self, user, callback, *, min_interval=30.0,
+                 max_interval=900.0, concurrency=10, seen_size=1000,
+                 max_pages=10):
+        if min_interval > max_interval:
+            raise InvalidArgument("'min_interval' must not be greater than "
+                                  "'max_interval'")
+        self.user = user
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.seen_size = seen_size
+        self.max_pages = max_pages
+        self.feeds = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def _add(self, kind, key, endpoint, param):
+        feed = self.feeds.get((kind, key))
+        if feed is not None:
+            return feed
+
+        feed = Feed(kind, key, self.user.client.url(endpoint, key),
+                    endpoint.bucket, param, self.min_interval, self.seen_size)
+        self.feeds[(kind, key)] = feed
+        feed.task = asyncio.ensure_future(self._watch(feed))
+        return feed
+
+    def add_tag(self, tag_name):
+        """Start watching the recent media of a tag."""
+        return self._add('tag', tag_name, ep.GET_TAGGED_MEDIA, 'min_tag_id')
+
+    def add_location(self, location_id):
+        """Start watching the recent media of a location."""
+        return self._add('location', location_id, ep.GET_LOCATION_MEDIA,
+                         'min_id')
+
+    def add_user(self, user_id):
+        """Start watching the recent media of a user."""
+        return self._add('user', user_id, ep.GET_USER_RECENT_MEDIA, 'min_id')
+
+    def remove(self, feed):
+        """Stop watching ``feed``."""
+        self.feeds.pop((feed.kind, feed.key), None)
+        if feed.task is not None:
+            feed.task.cancel()
+
+    def stop(self):
+        """Stop watching every feed."""
+        for feed in list(self.feeds.values()):
+            self.remove(feed)
+
+    async def poll(self, feed):
+        """Poll ``feed`` once, returning the new media."""
+        params = {}
+        if feed.min_id is not None:
+            params[feed.param] = feed.min_id
+
+        response = await self.user.client.get(feed.url, params=params,
+                                              bucket=feed.bucket,
+                                              return_data=False)
+        items = response.get('data') or []
+
+        new = self._unseen(feed, items)
+        pagination = response.get('pagination') or {}
+
+        # more than a page may have arrived since the last poll, so older
+        #   pages are followed back to the media seen before
+        cursor = _next_url(feed.url, params, pagination)
+        if (feed.min_id is not None and cursor is not None and items
+                and len(new) == len(items)):
+            older = PageIterator(self.user.client, feed.url,
+                                 bucket=feed.bucket, params=params,
+                                 page_limit=self.max_pages - 1, cursor=cursor)
+            try:
+                while True:
+                    page = await older.next_page()
+                    if page is None:
+                        break
+                    unseen = self._unseen(feed, page)
+                    new.extend(unseen)
+                    if len(unseen) < len(page):
+                        break
+            finally:
+                older.close()
+
+        # tags report their own high-water mark, other feeds are newest first
+        if feed.param in pagination:
+            feed.min_id = pagination[feed.param]
+        elif items:
+            feed.min_id = items[0].get('id')
+
+        return new
+
+    @staticmethod
+    def _unseen(feed, items):
+        new = [item for item in items if item.get('id') not in feed.seen]
+        for item in new:
+            feed.seen.add(item.get('id'))
+        return new
+
+    async def _watch(self, feed):
+        while True:
+            async with self._semaphore:
+                try:
+                    new = await self.poll(feed)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # keep watching, the feed backs off like a quiet one
+                    log.warning('Polling %s failed: %r', feed, e)
+                    new = None
+
+            if new:
+                feed.interval = max(self.min_interval, feed.interval / 2)
+                try:
+                    result = self.callback(feed, new)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception:
+                    log.exception('Callback for %s failed', feed)
+            else:
+                feed.interval = min(self.max_interval, feed.interval * 1.5)
+
+            await asyncio.sleep(feed.interval)
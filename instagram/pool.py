@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import functools
+
+from .errors import (ClientException, HTTPException, Forbidden,
+                     LoginFailure)
+from .iterators import BulkIterator
+
+# 'User' methods which do not depend on whose token they are called with.
+READ_METHODS = frozenset([
+    'get_user', 'get_user_recent_media', 'search_users', 'get_media',
+    'search_media', 'get_comments', 'get_likes', 'get_tag',
+    'get_tagged_media', 'search_tags', 'get_location', 'get_location_media',
+    'search_locations',
+])
+
+# Iterators stay on the token they were created with, as the pagination
+#   URLs returned by the API carry it.
+ITER_METHODS = frozenset([
+    'iter_user_recent_media', 'iter_comments', 'iter_likes',
+    'iter_tagged_media', 'iter_location_media',
+])
+
+
+class _Health:
+    def __init__(self):
+        self.in_flight = 0
+        self.forbidden = 0
+
+
+class TokenPool:
+    """Spreads read requests over every user of a :class:`Client`.
+
+    The pool offers the read methods of :class:`User` which do not depend on
+    the token used. Each call is sent with the token which has the most
+    budget left, preferring tokens which are not being rate limited and have
+    fewer requests in flight. Tokens rejected by the API, or forbidden from
+    ``forbidden_limit`` requests in a row, are evicted from the pool.
+
+    Parameters
+    -----------
+    client : Client
+        The client whose users are pooled.
+    forbidden_limit : int (optional: 3)
+        Consecutive :exc:`Forbidden` errors after which a token is evicted.
+
+    Attributes
+    -----------
+    evicted : dict
+        The exception each evicted user was evicted for, keyed by
+        :attr:`User.key`.
+    """
+
+    def __init__(self, client, *, forbidden_limit=3):
+        self.client = client
+        self.forbidden_limit = forbidden_limit
+        self.evicted = {}
+        self._health = {}
+
+    def __getattr__(self, name):
+        if name in READ_METHODS:
+            return functools.partial(self._call, name)
+        if name in ITER_METHODS:
+            return getattr(self.choose(), name)
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.users)
+
+    @property
+    def users(self):
+        """The users currently in the pool."""
+        return [user for user_id, user in self.client.users.items()
+                if user_id not in self.evicted]
+
+    def _score(self, user):
+        limiter = user.client.rate_limiter
+        health = self._health.get(user.key)
+        in_flight = 0 if health is None else health.in_flight
+        # requests in flight have not all drawn from the budget yet
+        return (limiter.paused(user.token) > 0,
+                in_flight - limiter.remaining(user.token))
+
+    def choose(self):
+        """Return the user the next request should be sent as."""
+        users = self.users
+        if not users:
+            raise ClientException('No usable tokens in the pool.')
+        return min(users, key=self._score)
+
+    def evict(self, user, exc=None):
+        """Remove ``user`` from the pool."""
+        self.evicted[user.key] = exc
+        self._health.pop(user.key, None)
+
+    def _revoke(self, user, exc):
+        self.evict(user, exc)
+        self.client.forget_token(user.token)
+
+    def restore(self, user_id):
+        """Put an evicted user back into the pool."""
+        self.evicted.pop(user_id, None)
+
+    async def _call(self, name, *args, **kwargs):
+        user = self.choose()
+        if user._id is None:
+            # added without validating its token
+            try:
+                await self.client.resolve_user(user)
+            except LoginFailure as e:
+                self._revoke(user, e)
+                raise
+
+        health = self._health.get(user.key)
+        if health is None:
+            health = self._health[user.key] = _Health()
+
+        health.in_flight += 1
+        try:
+            result = await getattr(user, name)(*args, **kwargs)
+        except LoginFailure as e:
+            self._revoke(user, e)
+            raise
+        except Forbidden as e:
+            health.forbidden += 1
+            if health.forbidden >= self.forbidden_limit:
+                self.evict(user, e)
+            raise
+        except HTTPException as e:
+            if e.error_type == 'OAuthAccessTokenException':
+                self._revoke(user, e)
+            raise
+        finally:
+            health.in_flight -= 1
+
+        health.forbidden = 0
+        return result
+
+    def _bulk(self, func, keys, concurrency):
+        return BulkIterator(func, keys, concurrency=concurrency)
+
+    async def _get_many(self, func, keys, concurrency):
+        keys = list(keys)
+        results = await self._bulk(func, keys, concurrency).results()
+        return [results[key] for key in keys]
+
+    def _get_media_by_id(self, media_id):
+        return self._call('get_media', media_id=media_id)
+
+    def get_users_many(self, user_ids, *, concurrency=10):
+        """Same as :meth:`User.get_users_many`, spread over the pool."""
+        return self._get_many(functools.partial(self._call, 'get_user'),
+                              user_ids, concurrency)
+
+    def iter_users_many(self, user_ids, *, concurrency=10):
+        return self._bulk(functools.partial(self._call, 'get_user'),
+                          user_ids, concurrency)
+
+    def get_media_many(self, media_ids, *, concurrency=10):
+        """Same as :meth:`User.get_media_many`, spread over the pool."""
+        return self._get_many(self._get_media_by_id, media_ids, concurrency)
+
+    def iter_media_many(self, media_ids, *, concurrency=10):
+        return self._bulk(self._get_media_by_id, media_ids, concurrency)
+
+    def get_comments_many(self, media_ids, *, concurrency=10):
+        """Same as :meth:`User.get_comments_many`, spread over the pool."""
+        return self._get_many(functools.partial(self._call, 'get_comments'),
+                              media_ids, concurrency)
+
+    def iter_comments_many(self, media_ids, *, concurrency=10):
+        return self._bulk(functools.partial(self._call, 'get_comments'),
+                          media_ids, concurrency)
@@ -0,0 +1,517 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+
+from .errors import InvalidArgument
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+_FIELDS = ('capacity', 'tokens', 'updated', 'sent', 'paused_until')
+
+
+def new_budget(capacity, now):
+    """Return the state of a full hourly budget of ``capacity`` requests."""
+    return {'capacity': float(capacity), 'tokens': float(capacity),
+            'updated': now, 'sent': 0.0, 'paused_until': 0.0}
+
+
+def refill(budget, now):
+    """Add the requests ``budget`` regained since it was last updated."""
+    # the budget refills over an hour
+    rate = budget['capacity'] / 3600.0
+    budget['tokens'] = min(budget['capacity'],
+                           budget['tokens'] + (now - budget['updated']) * rate)
+    budget['updated'] = now
+
+
+def draw_request(budget, now, pace_below):
+    """Draw one request from ``budget``.
+
+    Returns 0 if the request may be sent, otherwise the seconds to wait
+    before trying again.
+    """
+    if budget['paused_until'] > now:
+        return budget['paused_until'] - now
+
+    refill(budget, now)
+    interval = 3600.0 / budget['capacity']
+    if budget['tokens'] < 1:
+        return (1 - budget['tokens']) * interval
+
+    # close to the limit, send at the rate the budget refills
+    if (budget['tokens'] < budget['capacity'] * pace_below
+            and now - budget['sent'] < interval):
+        return budget['sent'] + interval - now
+
+    budget['tokens'] -= 1
+    budget['sent'] = now
+    return 0.0
+
+
+def report_limits(budget, now, limit, remaining):
+    """Correct ``budget`` with the limit and remaining requests reported by
+    the API.
+
+    A limit which is not positive is ignored, as the budget could never
+    refill.
+    """
+    refill(budget, now)
+    if limit is not None and limit > 0:
+        budget['capacity'] = float(limit)
+    budget['tokens'] = min(budget['capacity'], max(0.0, float(remaining)))
+
+
+class MemoryStore:
+    """Keeps the budget of each token in memory.
+
+    This is the default store. It is shared by the limiters of a single
+    process which are given the same store; :class:`FileStore` and
+    :class:`RedisStore` share budgets between processes and hosts.
+
+    A store keeps a budget, as created by :func:`new_budget`, for every
+    token. Its methods may return their result directly or be coroutines.
+    They all return the budget after the change; ``draw`` returns the
+    seconds to wait along with it.
+    """
+
+    def __init__(self):
+        self._budgets = {}
+
+    def _budget(self, token, capacity, now):
+        budget = self._budgets.get(token)
+        if budget is None:
+            budget = self._budgets[token] = new_budget(capacity, now)
+        return budget
+
+    def draw(self, token, capacity, pace_below):
+        """Draw one request from the budget of ``token``."""
+        now = time.time()
+        budget = self._budget(token, capacity, now)
+        wait = draw_request(budget, now, pace_below)
+        return wait, dict(budget)
+
+    def pause(self, token, capacity, until):
+        """Hold back every request for ``token`` until the time ``until``."""
+        budget = self._budget(token, capacity, time.time())
+        budget['paused_until'] = max(budget['paused_until'], until)
+        return dict(budget)
+
+    def update(self, token, capacity, limit, remaining):
+        """Correct the budget of ``token`` with the reported limits."""
+        now = time.time()
+        budget = self._budget(token, capacity, now)
+        report_limits(budget, now, limit, remaining)
+        return dict(budget)
+
+
+def _token_key(token):
+    # shared stores should not hold the tokens themselves
+    return hashlib.sha256(str(token).encode('utf-8')).hexdigest()[:32]
+
+
+class FileStore:
+    """Keeps the budget of each token in a file shared by the processes of
+    one host.
+
+    Every call takes a lock on ``<path>.lock``, so workers draw from the
+    budgets one at a time, and replaces the file atomically, so a worker
+    killed mid-write cannot corrupt it. Placing the file on a
+    memory-backed filesystem such as ``/dev/shm`` keeps calls from touching
+    the disk. Requires ``fcntl``.
+
+    Calls block while another process holds the lock. It is only held to
+    read and rewrite the small file, but that blocks the event loop too.
+
+    Parameters
+    -----------
+    path : str
+        The file to keep the budgets in. It is created if missing.
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise InvalidArgument("'FileStore' requires 'fcntl'")
+        self.path = path
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            # only possible if the file was written by other means
+            log.warning('Discarding the unreadable budgets in %s', self.path)
+            return {}
+
+    def _change(self, token, capacity, change):
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            budgets = self._read()
+
+            now = time.time()
+            key = _token_key(token)
+            budget = budgets.get(key) or new_budget(capacity, now)
+            result = change(budget, now)
+            budgets[key] = budget
+            # budgets left alone for an hour are full again
+            budgets = {k: b for k, b in budgets.items()
+                       if k == key or now - b['updated'] < 3600
+                       or b['paused_until'] > now}
+
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                f.write(json.dumps(budgets))
+            os.replace(tmp, self.path)
+        return result, budget
+
+    def draw(self, token, capacity, pace_below):
+        """Draw one request from the budget of ``token``."""
+        return self._change(token, capacity, lambda budget, now:
+                            draw_request(budget, now, pace_below))
+
+    def pause(self, token, capacity, until):
+        """Hold back every request for ``token`` until the time ``until``."""
+        def change(budget, now):
+            budget['paused_until'] = max(budget['paused_until'], until)
+        return self._change(token, capacity, change)[1]
+
+    def update(self, token, capacity, limit, remaining):
+        """Correct the budget of ``token`` with the reported limits."""
+        return self._change(token, capacity, lambda budget, now:
+                            report_limits(budget, now, limit, remaining))[1]
+
+
+_LUA_BUDGET = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local f = redis.call('HMGET', key, 'capacity', 'tokens', 'updated', 'sent',
+                     'paused_until')
+local b = {capacity = tonumber(f[1]) or capacity,
+           tokens = tonumber(f[2]) or capacity, updated = tonumber(f[3]) or now,
+           sent = tonumber(f[4]) or 0, paused_until = tonumber(f[5]) or 0}
+
+local function refill()
+    b.tokens = math.min(b.capacity,
+                        b.tokens + (now - b.updated) * b.capacity / 3600)
+    b.updated = now
+end
+
+local function save(wait)
+    redis.call('HMSET', key, 'capacity', tostring(b.capacity),
+               'tokens', tostring(b.tokens), 'updated', tostring(b.updated),
+               'sent', tostring(b.sent),
+               'paused_until', tostring(b.paused_until))
+    redis.call('EXPIRE', key, 7200)
+    -- numbers would be truncated to integers
+    return {tostring(wait), tostring(b.capacity), tostring(b.tokens),
+            tostring(b.updated), tostring(b.sent), tostring(b.paused_until)}
+end
+"""
+
+_LUA_DRAW = _LUA_BUDGET + """
+local pace_below = tonumber(ARGV[3])
+if b.paused_until > now then
+    return save(b.paused_until - now)
+end
+refill()
+local interval = 3600 / b.capacity
+if b.tokens < 1 then
+    return save((1 - b.tokens) * interval)
+end
+if b.tokens < b.capacity * pace_below and now - b.sent < interval then
+    return save(b.sent + interval - now)
+end
+b.tokens = b.tokens - 1
+b.sent = now
+return save(0)
+"""
+
+_LUA_PAUSE = _LUA_BUDGET + """
+b.paused_until = math.max(b.paused_until, tonumber(ARGV[3]))
+return save(0)
+"""
+
+_LUA_UPDATE = _LUA_BUDGET + """
+refill()
+local limit = tonumber(ARGV[3])
+if limit and limit > 0 then
+    b.capacity = limit
+end
+b.tokens = math.min(b.capacity, math.max(0, tonumber(ARGV[4])))
+return save(0)
+"""
+
+
+class RedisStore:
+    """Keeps the budget of each token in Redis, shared by every worker
+    connected to it.
+
+    Each call is a single script run atomically by the server. ``redis``
+    may be any client offering ``register_script`` the way ``redis-py``
+    does, either blocking (``redis.Redis``) or asynchronous
+    (``redis.asyncio.Redis``); ``fakeredis[lua]`` stands in for a server
+    in tests. The clocks of the hosts sharing a store should be synchronised.
+
+    Parameters
+    -----------
+    redis : object
+        The Redis client.
+    prefix : str (optional: 'instagram:ratelimit:')
+        The prefix of the keys the budgets are kept under.
+    """
+
+    def __init__(self, redis, *, prefix='instagram:ratelimit:'):
+        self.redis = redis
+        self.prefix = prefix
+        self._draw = redis.register_script(_LUA_DRAW)
+        self._pause = redis.register_script(_LUA_PAUSE)
+        self._update = redis.register_script(_LUA_UPDATE)
+
+    def _run(self, script, parse, token, capacity, *args):
+        result = script(keys=[self.prefix + _token_key(token)],
+                        args=[repr(time.time()), capacity] + list(args))
+        if inspect.isawaitable(result):
+            return self._parse_later(parse, result)
+        return parse(result)
+
+    @staticmethod
+    async def _parse_later(parse, result):
+        return parse(await result)
+
+    @staticmethod
+    def _parse_draw(result):
+        values = [float(value) for value in result]
+        return values[0], dict(zip(_FIELDS, values[1:]))
+
+    @staticmethod
+    def _parse_budget(result):
+        return dict(zip(_FIELDS, (float(value) for value in result[1:])))
+
+    def draw(self, token, capacity, pace_below):
+        """Draw one request from the budget of ``token``."""
+        return self._run(self._draw, self._parse_draw, token, capacity,
+                         pace_below)
+
+    def pause(self, token, capacity, until):
+        """Hold back every request for ``token`` until the time ``until``."""
+        return self._run(self._pause, self._parse_budget, token, capacity,
+                         repr(until))
+
+    def update(self, token, capacity, limit, remaining):
+        """Correct the budget of ``token`` with the reported limits."""
+        limit = '' if limit is None else limit
+        return self._run(self._update, self._parse_budget, token, capacity,
+                         limit, remaining)
+
+
+async def _resolve(value):
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+class _TokenState:
+    """Concurrency bookkeeping and the last known budget of a single access
+    token.
+    """
+
+    def __init__(self, limiter):
+        self.budget = new_budget(limiter.requests_per_hour, time.time())
+        self.reported = {}
+        self.lock = asyncio.Lock()
+        self.semaphore = asyncio.Semaphore(limiter.token_concurrency)
+
+
+class _Slot:
+    """Async context manager returned by :meth:`RateLimiter.acquire`."""
+
+    def __init__(self, limiter, token, bucket):
+        self._limiter = limiter
+        self._token = token
+        self._bucket = bucket
+        self._token_semaphore = None
+        self._bucket_semaphore = None
+
+    async def __aenter__(self):
+        if self._bucket is not None:
+            self._bucket_semaphore = self._limiter._bucket(self._token,
+                                                           self._bucket)
+            await self._bucket_semaphore.acquire()
+
+        token_semaphore = self._limiter._state(self._token).semaphore
+        try:
+            await token_semaphore.acquire()
+        except BaseException:
+            if self._bucket_semaphore is not None:
+                self._bucket_semaphore.release()
+            raise
+        self._token_semaphore = token_semaphore
+        return self
+
+    async def __aexit__(self, *args):
+        self._token_semaphore.release()
+        if self._bucket_semaphore is not None:
+            self._bucket_semaphore.release()
+
+
+class RateLimiter:
+    """Schedules requests against per-token budgets and concurrency limits.
+
+    Requests are let through in parallel up to ``bucket_concurrency`` per
+    bucket and ``token_concurrency`` per token. Waiters beyond those limits
+    are queued in arrival order. Every request sent also draws from an hourly
+    token-bucket budget kept for each access token.
+
+    The budget is corrected with the limits the API reports on each
+    response. Once less than ``pace_below`` of it is left, requests are
+    spaced out evenly at the refill rate rather than sent in bursts, so the
+    limit is approached smoothly instead of being hit.
+
+    A single limiter may be shared between several :class:`HTTPClient`
+    objects, in which case clients using the same token share its budget.
+    Budgets are kept in ``store``; limiters given a store shared between
+    processes draw from one budget per token. Concurrency limits are always
+    local to the limiter.
+
+    Parameters
+    -----------
+    requests_per_hour : int (optional: 5000)
+        The number of requests allowed per token in a rolling hour.
+    token_concurrency : int (optional: 20)
+        The number of requests allowed in flight per token.
+    bucket_concurrency : int (optional: 5)
+        The number of requests allowed in flight per token and bucket.
+    pace_below : float (optional: 0.2)
+        The fraction of the budget below which requests are spaced out.
+    store : object (optional: MemoryStore())
+        Where the budgets are kept, see :class:`MemoryStore`.
+    """
+
+    def __init__(self, *, requests_per_hour=5000, token_concurrency=20,
+                 bucket_concurrency=5, pace_below=0.2, store=None):
+        self.requests_per_hour = requests_per_hour
+        self.token_concurrency = token_concurrency
+        self.bucket_concurrency = bucket_concurrency
+        self.pace_below = pace_below
+        self.store = MemoryStore() if store is None else store
+        self._states = {}
+        self._buckets = {}
+
+    def _state(self, token):
+        state = self._states.get(token)
+        if state is None:
+            state = self._states[token] = _TokenState(self)
+        return state
+
+    def _bucket(self, token, bucket):
+        key = (token, bucket)
+        semaphore = self._buckets.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.bucket_concurrency)
+            self._buckets[key] = semaphore
+        return semaphore
+
+    def acquire(self, token, bucket=None):
+        """Return an async context manager holding a concurrency slot for
+        ``token`` and ``bucket``::
+
+            async with limiter.acquire(token, bucket):
+                ...
+        """
+        return _Slot(self, token, bucket)
+
+    async def throttle(self, token):
+        """Wait until ``token`` has budget left and draw one request from it.
+
+        Waiters are served in the order they arrive.
+        """
+        state = self._state(token)
+        async with state.lock:
+            while True:
+                wait, state.budget = await _resolve(self.store.draw(
+                        token, self.requests_per_hour, self.pace_below))
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    async def pause(self, token, delay):
+        """Hold back every request for ``token`` for ``delay`` seconds.
+
+        This is used when the API reports that the token is being rate
+        limited.
+        """
+        state = self._state(token)
+        state.budget = await _resolve(self.store.pause(
+                token, self.requests_per_hour, time.time() + delay))
+
+    def paused(self, token):
+        """Return the seconds left before requests for ``token`` resume."""
+        budget = self._state(token).budget
+        return max(0.0, budget['paused_until'] - time.time())
+
+    async def update(self, token, bucket, limit, remaining):
+        """Correct the budget of ``token`` with the limit and remaining
+        requests reported by the API for a request made under ``bucket``.
+        """
+        state = self._state(token)
+        state.budget = await _resolve(self.store.update(
+                token, self.requests_per_hour, limit, remaining))
+        state.reported[bucket] = {'limit': limit, 'remaining': remaining}
+
+    def remaining(self, token):
+        """Return the budget currently left for ``token``, as last seen in
+        the store.
+        """
+        budget = dict(self._state(token).budget)
+        refill(budget, time.time())
+        return int(budget['tokens'])
+
+    def status(self, token):
+        """Return the budget of ``token`` along with the limits last
+        reported by the API for each bucket.
+        """
+        state = self._state(token)
+        return {
+            'limit': int(state.budget['capacity']),
+            'remaining': self.remaining(token),
+            'paused': self.paused(token),
+            'buckets': dict(state.reported),
+        }
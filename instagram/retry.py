@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import random
+import time
+
+import aiohttp
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+class RetryBudget:
+    """Limits retries to a fraction of the requests sent.
+
+    Every request deposits ``ratio`` into the budget and every retry
+    withdraws one from it. ``per_second`` is deposited over time as well, so
+    a few retries are always possible. When an upstream degrades, retries
+    stop once the budget runs out instead of multiplying the load.
+
+    Parameters
+    -----------
+    ratio : float (optional: 0.2)
+        Retries allowed per request sent.
+    per_second : float (optional: 1.0)
+        Retries allowed per second regardless of traffic.
+    max_balance : float (optional: 100)
+        The most retries which can be saved up.
+    """
+
+    def __init__(self, *, ratio=0.2, per_second=1.0, max_balance=100):
+        self.ratio = ratio
+        self.per_second = per_second
+        self.max_balance = max_balance
+        self.balance = float(max_balance)
+        self._updated = time.monotonic()
+
+    def _refill(self, amount):
+        self.balance = min(self.max_balance, self.balance + amount)
+
+    def deposit(self):
+        self._refill(self.ratio)
+
+    def withdraw(self):
+        """Take one retry from the budget, returning whether it was there."""
+        now = time.monotonic()
+        self._refill((now - self._updated) * self.per_second)
+        self._updated = now
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class RetryPolicy:
+    """Decides whether and when a failed request is retried.
+
+    Delays grow exponentially from ``base_delay`` up to ``max_delay``. With
+    ``jitter`` the delay is drawn uniformly between zero and that value.
+
+    Parameters
+    -----------
+    max_attempts : int (optional: 5)
+        The most times a request is sent, including the first.
+    base_delay : float (optional: 0.5)
+        The delay before the first retry, in seconds.
+    max_delay : float (optional: 30)
+        The longest delay between two attempts, in seconds.
+    multiplier : float (optional: 2)
+        The factor the delay grows by with each attempt.
+    jitter : bool (optional: True)
+        Whether to randomize delays.
+    deadline : float (optional: None)
+        Seconds after the first attempt past which no retry is started.
+    statuses : iterable (optional: 429, 500, 502, 503, 504)
+        Status codes which are retried.
+    exceptions : tuple (optional: aiohttp.ClientError, asyncio.TimeoutError)
+        Exceptions which are retried.
+    respect_retry_after : bool (optional: True)
+        Whether to wait as long as the server asks to before retrying.
+    idempotent_only : bool (optional: True)
+        Whether only 429 responses are retried for requests which are not
+        idempotent, e.g. ``POST``.
+    budget : RetryBudget (optional: RetryBudget())
+        The budget retries are drawn from. ``None`` allows unlimited retries.
+    """
+
+    def __init__(self, *, max_attempts=5, base_delay=0.5, max_delay=30.0,
+                 multiplier=2.0, jitter=True, deadline=None,
+                 statuses=(429, 500, 502, 503, 504),
+                 exceptions=(aiohttp.ClientError, asyncio.TimeoutError),
+                 respect_retry_after=True, idempotent_only=True,
+                 budget=RetryBudget):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.statuses = frozenset(statuses)
+        self.exceptions = tuple(exceptions)
+        self.respect_retry_after = respect_retry_after
+        self.idempotent_only = idempotent_only
+        self.budget = budget() if budget is RetryBudget else budget
+
+    def backoff(self, attempt):
+        """Return the delay before retrying after ``attempt`` failed
+        attempts.
+        """
+        delay = min(self.max_delay,
+                    self.base_delay * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def retries_status(self, method, status):
+        if status not in self.statuses:
+            return False
+        return (status == 429 or not self.idempotent_only
+                or method in IDEMPOTENT_METHODS)
+
+    def retries_exception(self, method, exc):
+        if not isinstance(exc, self.exceptions):
+            return False
+        return not self.idempotent_only or method in IDEMPOTENT_METHODS
+
+    def sent(self):
+        """Record that a request has been sent."""
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def delay(self, attempt, elapsed, retry_after=None):
+        """Return the seconds to wait before the next attempt, or ``None`` if
+        the request should not be retried.
+
+        Parameters
+        -----------
+        attempt : int
+            The number of attempts made so far.
+        elapsed : float
+            Seconds since the first attempt was sent.
+        retry_after : float (optional: None)
+            The delay asked for by the server.
+        """
+        if attempt >= self.max_attempts:
+            return None
+
+        if retry_after is not None and self.respect_retry_after:
+            delay = retry_after
+        else:
+            delay = self.backoff(attempt)
+
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        if self.budget is not None and not self.budget.withdraw():
+            return None
+        return delay
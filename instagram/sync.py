@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import threading
+
+from .client import Client
+from .user import User
+
+
+class _LoopThread:
+    """An event loop running forever in a daemon thread."""
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run,
+                                        name='instagram-loop', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError('Blocking calls cannot be made from the event '
+                               'loop thread')
+
+        future = self.submit(coro)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+
+
+class _Blocking:
+    """Exposes the methods of ``target`` as blocking calls made on the event
+    loop of ``runner``.
+    """
+
+    def __init__(self, target, runner):
+        self._target = target
+        self._runner = runner
+
+    def __getattr__(self, name):
+        if name in ('_target', '_runner'):
+            raise AttributeError(name)
+
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self._runner.run(self._call(attr, args, kwargs))
+
+        return call
+
+    async def _call(self, func, args, kwargs):
+        # called on the loop, so objects created by 'func' belong to it
+        result = func(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return self._wrap(result)
+
+    def _wrap(self, result):
+        if isinstance(result, User):
+            return SyncUser(result, self._runner)
+        if hasattr(result, '__anext__'):
+            return SyncIterator(result, self._runner)
+        return result
+
+    def submit(self, name, *args, **kwargs):
+        """Start calling the method ``name`` and return a
+        :class:`concurrent.futures.Future` of its result.
+
+        Many calls can be submitted before waiting on any of them, so they
+        are made concurrently.
+        """
+        func = getattr(self._target, name)
+        return self._runner.submit(self._call(func, args, kwargs))
+
+
+class SyncIterator(_Blocking):
+    """Blocking iterator over a :class:`PageIterator` or
+    :class:`BulkIterator`.
+    """
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self._runner.run(self._target.__anext__())
+        except StopAsyncIteration:
+            raise StopIteration from None
+
+
+class SyncUser(_Blocking):
+    """Blocking counterpart of :class:`User`.
+
+    Every method of :class:`User` is available and blocks until the API has
+    replied. ``iter_`` methods return a :class:`SyncIterator`.
+    """
+
+    @property
+    def user(self):
+        """The wrapped :class:`User`."""
+        return self._target
+
+
+class SyncClient(_Blocking):
+    """Blocking counterpart of :class:`Client`, for code which does not run
+    an event loop, e.g. WSGI views or task queue workers.
+
+    One event loop runs in a background thread for the lifetime of the
+    client, so every call shares its connection pool, rate limiter and
+    cache. Calls are thread-safe and may be made from any thread::
+
+        with SyncClient(client_id=..., client_secret=...,
+                        redirect_uri=...) as client:
+            user = client.add_user(token=token)
+            media = user.get_self_recent_media()
+
+            # fan out without waiting on each request
+            futures = [user.submit('get_user', user_id)
+                       for user_id in user_ids]
+            profiles = [f.result() for f in futures]
+
+    Parameters
+    -----------
+    timeout : float (optional: None)
+        Seconds a blocking call waits for its result before raising
+        :exc:`concurrent.futures.TimeoutError`. ``None`` waits forever.
+
+    Other keyword arguments are passed to :class:`Client`.
+    """
+
+    def __init__(self, *, timeout=None, **kwargs):
+        runner = _LoopThread(timeout)
+        try:
+            client = runner.run(self._create(kwargs))
+        except BaseException:
+            runner.stop()
+            raise
+        super().__init__(client, runner)
+        self.pool = _Blocking(client.pool, runner)
+
+    @staticmethod
+    async def _create(kwargs):
+        return Client(**kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def client(self):
+        """The wrapped :class:`Client`."""
+        return self._target
+
+    @property
+    def users(self):
+        """The users added to the client, keyed by user id."""
+        return {user_id: SyncUser(user, self._runner)
+                for user_id, user in self._target.users.items()}
+
+    def close(self):
+        """Close the session and stop the event loop thread."""
+        if self._runner.loop.is_closed():
+            return
+        try:
+            self._runner.run(self._target.close())
+        finally:
+            self._runner.stop()
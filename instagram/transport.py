@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import base64
+import gzip
+import json
+import re
+import time
+
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from .errors import ClientException
+from .http import create_client_session
+
+# headers the client reads; the others are not recorded
+_RECORDED_HEADERS = ('Content-Type', 'ETag', 'Retry-After',
+                     'X-Ratelimit-Limit', 'X-Ratelimit-Remaining')
+
+
+def request_signature(method, url, params=None):
+    """Return what identifies a request in a cassette: its method, path and
+    query, without the host or access token.
+    """
+    url = URL(url)
+    query = dict(url.query)
+    query.update((key, str(value)) for key, value in (params or {}).items())
+    query.pop('access_token', None)
+    return '{} {}?{}'.format(method, url.path,
+                             '&'.join('{}={}'.format(key, query[key])
+                                      for key in sorted(query)))
+
+
+# an 'access_token' query parameter inside a URL in a response body
+_TOKEN_PARAM = re.compile(r'([?&])access_token=[^&"#\s]*(&?)')
+
+
+def _without_token_param(match):
+    if match.group(2):
+        return match.group(1)
+    # the last parameter; a lone '?' is dropped with it
+    return ''
+
+
+def _scrub_body(text, token=None):
+    """Return ``text`` without access tokens, e.g. in the ``next_url`` of
+    paginated responses.
+    """
+    text = _TOKEN_PARAM.sub(_without_token_param, text)
+    if token:
+        text = text.replace(token, '')
+    return text
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class RecordedResponse:
+    """A response read from, or written to, a cassette.
+
+    It offers the parts of 'aiohttp.ClientResponse' the client uses.
+    """
+
+    def __init__(self, method, url, status, reason, headers, body):
+        self.method = method
+        self.url = URL(url)
+        self.status = status
+        self.reason = reason
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    def release(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class _RequestContext:
+    def __init__(self, coro):
+        self._coro = coro
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self):
+        return await self._coro
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class RecordingTransport:
+    """Sends requests through ``session`` and appends every exchange to the
+    cassette at ``path``.
+
+    Cassettes hold one JSON object per line, gzipped if ``path`` ends in
+    ``.gz``. Access tokens, including those in URLs of response bodies,
+    and headers the client does not read are left out.
+
+    Parameters
+    -----------
+    path : str
+        The cassette to append to.
+    session : aiohttp.ClientSession (optional: None)
+        The session to send requests through. One is created on the first
+        request if not given.
+    """
+
+    def __init__(self, path, session=None):
+        self.path = path
+        self.session = session
+        self._file = None
+
+    def request(self, method, url, **kwargs):
+        return _RequestContext(self._record(method, url, kwargs))
+
+    async def _record(self, method, url, kwargs):
+        if self.session is None:
+            self.session = create_client_session()
+        started = time.monotonic()
+        async with self.session.request(method, url, **kwargs) as r:
+            body = await r.read()
+            latency = time.monotonic() - started
+            response = RecordedResponse(
+                    method, url, r.status, r.reason,
+                    [(name, r.headers[name]) for name in _RECORDED_HEADERS
+                     if name in r.headers], body)
+
+        entry = {
+            'request': request_signature(method, url,
+                                         kwargs.get('params')),
+            'status': response.status,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'latency': round(latency, 6),
+        }
+        token = (kwargs.get('params') or {}).get('access_token',
+                                                  URL(url).query.get(
+                                                      'access_token'))
+        try:
+            entry['body'] = _scrub_body(body.decode('utf-8'), token)
+        except UnicodeDecodeError:
+            entry['body64'] = base64.b64encode(body).decode('ascii')
+
+        if self._file is None:
+            self._file = _open(self.path, 'a')
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        return response
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.session is not None:
+            await self.session.close()
+
+
+class ReplayTransport:
+    """Answers requests from a cassette written by
+    :class:`RecordingTransport`, without touching the network.
+
+    Requests are matched on their method, path and query. Requests recorded
+    several times are answered with each recording in turn, starting over
+    once all were used.
+
+    Parameters
+    -----------
+    path : str
+        The cassette to replay.
+    latency : float, callable or str (optional: None)
+        The delay of every response: ``None`` for none, ``'recorded'`` for
+        the recorded one, a number of seconds, or a function called with
+        the recorded latency returning the seconds to wait.
+    """
+
+    def __init__(self, path, *, latency=None):
+        self.path = path
+        self.latency = latency
+        self.responses = {}
+        self._next = {}
+        with _open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses.setdefault(entry['request'],
+                                              []).append(entry)
+
+    def request(self, method, url, **kwargs):
+        return _RequestContext(self._replay(method, url, kwargs))
+
+    def _delay(self, entry):
+        latency = self.latency
+        if latency is None:
+            return 0
+        if latency == 'recorded':
+            return entry['latency']
+        if callable(latency):
+            return latency(entry['latency'])
+        return latency
+
+    async def _replay(self, method, url, kwargs):
+        signature = request_signature(method, url, kwargs.get('params'))
+        entries = self.responses.get(signature)
+        if not entries:
+            raise ClientException('No recorded response for {}'
+                                  .format(signature))
+
+        index = self._next.get(signature, 0)
+        self._next[signature] = (index + 1) % len(entries)
+        entry = entries[index]
+
+        delay = self._delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if 'body64' in entry:
+            body = base64.b64decode(entry['body64'])
+        else:
+            body = entry['body'].encode('utf-8')
+        return RecordedResponse(method, url, entry['status'], entry['reason'],
+                                entry['headers'], body)
+
+    async def close(self):
+        pass
@@ -24,15 +24,12 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
-import asyncio
-import inspect
+from . import endpoints as ep
+from .cache import token_scope
 from .http import HTTPClient, LoginFailure
 from .errors import HTTPException
-
-
-def _func_():
-    # emulate __func__ from C++
-    return inspect.currentframe().f_back.f_code.co_name
+from .iterators import PageIterator, BulkIterator
+from .writes import WriteQueue
 
 
 class User:
@@ -42,10 +39,13 @@ class User:
     -----------
     client : HTTPClient
         The object to communicate to the Instagram API through.
+    writes : WriteQueue
+        The queue created by :meth:`write_queue`, if any.
     """
 
     def __init__(self, *args, **kwargs):
         self.client = HTTPClient(*args, **kwargs)
+        self.writes = None
         self._id = None
         self._username = None
 
@@ -53,6 +53,15 @@ class User:
     def token(self):
         return self.client.token
 
+    @property
+    def key(self):
+        """The key of this user in 'Client.users': its id, or a digest of
+        its token while the id is not known yet.
+        """
+        if self._id is not None:
+            return self._id
+        return token_scope(self.token)
+
     def get_user_data(self):
         return {'token': self.token, 'id': self._id,
                 'username': self._username}
@@ -62,13 +71,21 @@ class User:
         self._id = response_data['id']
         self._username = response_data['username']
 
-    @asyncio.coroutine
-    def set_token(self, token):
+    async def set_token(self, token, *, validate=True):
+        """Set the token requests are sent with.
+
+        Unless ``validate`` is false, the token is checked by fetching the
+        user it belongs to, raising :exc:`LoginFailure` if it is rejected.
+        """
         old_token = self.client.token
         self.client._token(token)
+        if not validate:
+            # the identity of the new token is not known yet
+            self._id = self._username = None
+            return None
 
         try:
-            data = yield from self.client.get(self.client.ME)
+            data = await self.client.call(ep.SELF)
         except HTTPException as e:
             self.client._token(old_token)
             if e.response.status == 401:
@@ -78,9 +95,8 @@ class User:
         self.__set_user_data(data)
         return data
 
-    @asyncio.coroutine
-    def set_token_from_code(self, client_id, client_secret, redirect_uri,
-                            code):
+    async def set_token_from_code(self, client_id, client_secret,
+                                  redirect_uri, code):
         data = {
                 'client_id': client_id,
                 'client_secret': client_secret,
@@ -88,34 +104,73 @@ class User:
                 'redirect_uri': redirect_uri,
                 'code': code
         }
-        response = yield from self.client.post(self.client.OAUTH
-                                               + '/access_token',
-                                               data=data, pass_token=False,
-                                               bucket=_func_())
+        response = await self.client.call(ep.ACCESS_TOKEN, data=data,
+                                          pass_token=False)
 
         token = response['access_token']
-        yield from self.set_token(token)
+        await self.set_token(token)
         self.__set_user_data(response['user'])
 
         return token
 
-    @asyncio.coroutine
-    def update_user_info(self):
-        data = yield from self.get_self()
+    async def update_user_info(self):
+        data = await self.get_self()
         self.__set_user_data(data)
         return data
 
-    @asyncio.coroutine
-    def close(self):
-        yield from self.client.close()
+    def write_queue(self, **kwargs):
+        """Return the :class:`WriteQueue` of this user, creating it with
+        ``kwargs`` the first time.
+        """
+        if self.writes is None:
+            self.writes = WriteQueue(self, **kwargs)
+        return self.writes
+
+    async def close(self):
+        if self.writes is not None:
+            await self.writes.close()
+        await self.client.close()
+
+    def _paginate(self, endpoint, *args, **kwargs):
+        # Pages are fetched under the bucket of the matching 'get_' method
+        return PageIterator(self.client, self.client.url(endpoint, *args),
+                            bucket=endpoint.bucket, **kwargs)
+
+    def _bulk(self, func, keys, concurrency):
+        return BulkIterator(func, keys, concurrency=concurrency)
+
+    async def _get_many(self, func, keys, concurrency):
+        keys = list(keys)
+        results = await self._bulk(func, keys, concurrency).results()
+        return [results[key] for key in keys]
 
     ''' API INTERACTION: '''
 
     # User:
     def get_user(self, user_id):
         """Get a user's information."""
-        return self.client.get(self.client.USERS + '/{}'.format(user_id),
-                               bucket=_func_())
+        return self.client.call(ep.GET_USER, user_id)
+
+    def get_users_many(self, user_ids, *, concurrency=10):
+        """Get the information of many users.
+
+        Returns a list in the order of ``user_ids``. Users which could not be
+        fetched have the raised :exc:`HTTPException` in their place.
+
+        Parameters
+        -----------
+        user_ids : iterable
+            The users to get.
+        concurrency (kwarg) : int (optional: 10)
+            The maximum number of requests in flight.
+        """
+        return self._get_many(self.get_user, user_ids, concurrency)
+
+    def iter_users_many(self, user_ids, *, concurrency=10):
+        """Iterate over ``(user_id, information)`` pairs of many users as
+        they are fetched.
+        """
+        return self._bulk(self.get_user, user_ids, concurrency)
 
     def get_self(self):
         """Get this user's information."""
@@ -129,17 +184,30 @@ class User:
         user_id : str
             The message to check if you're mentioned in.
         """
-        return self.client.get(self.client.USERS +
-                               '/{}/media/recent'.format(user_id),
-                               bucket=_func_())
+        return self.client.call(ep.GET_USER_RECENT_MEDIA, user_id)
+
+    def iter_user_recent_media(self, user_id, **kwargs):
+        """Iterate over all of a user's recent media.
+
+        Keyword arguments are passed to :class:`PageIterator`.
+        """
+        return self._paginate(ep.GET_USER_RECENT_MEDIA, user_id, **kwargs)
 
     def get_self_recent_media(self):
         """Get this user's recent media."""
         return self.get_user_recent_media('self')
 
+    def iter_self_recent_media(self, **kwargs):
+        """Iterate over all of this user's recent media."""
+        return self.iter_user_recent_media('self', **kwargs)
+
     def get_self_liked_media(self):
         """Get this user's recent liked media."""
-        return self.client.get(self.client.ME + '/media/liked', bucket=_func_())
+        return self.client.call(ep.GET_SELF_LIKED_MEDIA)
+
+    def iter_self_liked_media(self, **kwargs):
+        """Iterate over all of this user's liked media."""
+        return self._paginate(ep.GET_SELF_LIKED_MEDIA, **kwargs)
 
     def search_users(self, query):
         """Search for users based on query.
@@ -152,24 +220,32 @@ class User:
         params = {
                 'q': query,
         }
-        return self.client.get(self.client.USERS + '/search', params=params,
-                               bucket=_func_())
+        return self.client.call(ep.SEARCH_USERS, params=params)
 
     # Relationships:
     def get_self_follows(self):
         """Get this user's followed users."""
-        url = self.client.ME + '/follows'
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_SELF_FOLLOWS)
+
+    def iter_self_follows(self, **kwargs):
+        """Iterate over all of this user's followed users."""
+        return self._paginate(ep.GET_SELF_FOLLOWS, **kwargs)
 
     def get_self_followed_by(self):
         """Get this user's followers."""
-        url = self.client.ME + '/followed-by'
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_SELF_FOLLOWED_BY)
+
+    def iter_self_followed_by(self, **kwargs):
+        """Iterate over all of this user's followers."""
+        return self._paginate(ep.GET_SELF_FOLLOWED_BY, **kwargs)
 
     def get_self_requested_by(self):
         """Get this user's requested followers."""
-        url = self.client.ME + '/requested-by'
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_SELF_REQUESTED_BY)
+
+    def iter_self_requested_by(self, **kwargs):
+        """Iterate over all of this user's requested followers."""
+        return self._paginate(ep.GET_SELF_REQUESTED_BY, **kwargs)
 
     def get_user_relationship(self, user_id):
         """Get a user's relationship to this user.
@@ -179,8 +255,7 @@ class User:
         user_id : str
             The user to check the relationship of.
         """
-        url = self.client.USERS + '/{}/relationship'.format(user_id)
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_USER_RELATIONSHIP, user_id)
 
     def set_user_relationship(self, user_id, action):
         """Set a user's relationship to this user.
@@ -200,8 +275,8 @@ class User:
         params = {
                 'action': action
         }
-        url = self.client.USERS + '/{}/relationship'.format(user_id)
-        return self.client.post(url, params=params, bucket=_func_())
+        return self.client.call(ep.SET_USER_RELATIONSHIP, user_id,
+                                params=params)
 
     # Other Media:
     def get_media(self, *, media_id=None, shortcode=None):
@@ -216,14 +291,32 @@ class User:
             The shortcode of the media to get.
         """
         if media_id is not None:
-            url = self.client.MEDIA + '/{}'.format(media_id)
-        else:
-            url = self.client.MEDIA + '/shortcode/{}'.format(shortcode)
+            return self.client.call(ep.GET_MEDIA, media_id)
+        return self.client.call(ep.GET_MEDIA_BY_SHORTCODE, shortcode)
+
+    def _get_media_by_id(self, media_id):
+        return self.get_media(media_id=media_id)
+
+    def get_media_many(self, media_ids, *, concurrency=10):
+        """Get many media by 'media_id'.
 
-        return self.client.get(url, bucket=_func_())
+        Returns a list in the order of ``media_ids``. Media which could not
+        be fetched have the raised :exc:`HTTPException` in their place.
+
+        Parameters
+        -----------
+        media_ids : iterable
+            The ids of the media to get.
+        concurrency (kwarg) : int (optional: 10)
+            The maximum number of requests in flight.
+        """
+        return self._get_many(self._get_media_by_id, media_ids, concurrency)
+
+    def iter_media_many(self, media_ids, *, concurrency=10):
+        """Iterate over ``(media_id, media)`` pairs as they are fetched."""
+        return self._bulk(self._get_media_by_id, media_ids, concurrency)
 
     def search_media(self, *, lat, lng, distance=None):
-        url = self.client.MEDIA + '/search'
         params = {
                 'lat': lat,
                 'lng': lng
@@ -231,66 +324,75 @@ class User:
         if distance is not None:
             params['distance'] = distance
 
-        return self.client.get(url, params=params, bucket=_func_())
+        return self.client.call(ep.SEARCH_MEDIA, params=params)
 
     # Comments:
     def get_comments(self, media_id):
-        url = self.client.MEDIA + '/{}/comments'.format(media_id)
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_COMMENTS, media_id)
+
+    def iter_comments(self, media_id, **kwargs):
+        return self._paginate(ep.GET_COMMENTS, media_id, **kwargs)
+
+    def get_comments_many(self, media_ids, *, concurrency=10):
+        """Get the comments of many media, in the order of ``media_ids``."""
+        return self._get_many(self.get_comments, media_ids, concurrency)
+
+    def iter_comments_many(self, media_ids, *, concurrency=10):
+        """Iterate over ``(media_id, comments)`` pairs as they are
+        fetched.
+        """
+        return self._bulk(self.get_comments, media_ids, concurrency)
 
     def add_comment(self, media_id, comment):
-        url = self.client.MEDIA + '/{}/comments'.format(media_id)
         params = {
                 'text': comment
         }
-        return self.client.post(url, params=params, bucket=_func_())
+        return self.client.call(ep.ADD_COMMENT, media_id, params=params)
 
     def del_comment(self, media_id, comment_id):
-        url = self.client.MEDIA + '/{}/comments/{}'.format(media_id,
-                                                           comment_id)
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.DEL_COMMENT, media_id, comment_id)
 
     # Likes:
     def get_likes(self, media_id):
-        url = self.client.MEDIA + '/{}/likes'.format(media_id)
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_LIKES, media_id)
+
+    def iter_likes(self, media_id, **kwargs):
+        return self._paginate(ep.GET_LIKES, media_id, **kwargs)
 
     def add_like(self, media_id):
-        url = self.client.MEDIA + '/{}/likes'.format(media_id)
-        return self.client.post(url, bucket=_func_())
+        return self.client.call(ep.ADD_LIKE, media_id)
 
     def del_like(self, media_id):
-        url = self.client.MEDIA + '/{}/likes'.format(media_id)
-        return self.client.delete(url, bucket=_func_())
+        return self.client.call(ep.DEL_LIKE, media_id)
 
     # Tags:
     def get_tag(self, tag_name):
-        url = self.client.TAGS + '/{}'.format(tag_name)
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_TAG, tag_name)
 
     def get_tagged_media(self, tag_name):
-        url = self.client.TAGS + '/{}/media/recent'.format(tag_name)
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_TAGGED_MEDIA, tag_name)
+
+    def iter_tagged_media(self, tag_name, **kwargs):
+        return self._paginate(ep.GET_TAGGED_MEDIA, tag_name, **kwargs)
 
     def search_tags(self, query):
-        url = self.client.TAGS + '/search'
         params = {
                 'q': query
         }
-        return self.client.get(url, params=params, bucket=_func_())
+        return self.client.call(ep.SEARCH_TAGS, params=params)
 
     # Locations:
     def get_location(self, location_id):
-        url = self.client.LOCATIONS + '/{}'.format(location_id)
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_LOCATION, location_id)
 
     def get_location_media(self, location_id):
-        url = self.client.LOCATIONS + '/{}/media/recent'.format(location_id)
-        return self.client.get(url, bucket=_func_())
+        return self.client.call(ep.GET_LOCATION_MEDIA, location_id)
+
+    def iter_location_media(self, location_id, **kwargs):
+        return self._paginate(ep.GET_LOCATION_MEDIA, location_id, **kwargs)
 
     def search_locations(self, query):
-        url = self.client.LOCATIONS + '/search'
         params = {
                 'q': query
         }
-        return self.client.get(url, params=params, bucket=_func_())
+        return self.client.call(ep.SEARCH_LOCATIONS, params=params)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016-2017 Lucien Gaitskell
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import os
+import time
+
+from .errors import ClientException, InvalidArgument
+
+log = logging.getLogger(__name__)
+
+# kind: (User method, extra arguments, opposite kind, dedupe group, number
+#   of arguments identifying the target)
+_ACTIONS = {
+    'like': ('add_like', (), 'unlike', 'like', 1),
+    'unlike': ('del_like', (), 'like', 'like', 1),
+    'comment': ('add_comment', (), None, 'comment', 2),
+    'delete_comment': ('del_comment', (), None, 'delete_comment', 2),
+    'follow': ('set_user_relationship', ('follow',), 'unfollow',
+               'relationship', 1),
+    'unfollow': ('set_user_relationship', ('unfollow',), 'follow',
+                 'relationship', 1),
+    'approve': ('set_user_relationship', ('approve',), 'ignore',
+                'relationship', 1),
+    'ignore': ('set_user_relationship', ('ignore',), 'approve',
+               'relationship', 1),
+}
+
+
+class _Action:
+    __slots__ = ('id', 'kind', 'args', 'future')
+
+    def __init__(self, action_id, kind, args, future):
+        self.id = action_id
+        self.kind = kind
+        self.args = args
+        self.future = future
+
+    @property
+    def key(self):
+        return _key(self.kind, self.args)
+
+
+def _key(kind, args):
+    # actions on the same target replace or cancel out each other
+    _, _, _, group, size = _ACTIONS[kind]
+    return (group,) + tuple(args[:size])
+
+
+class WriteQueue:
+    """Queues the write actions of a :class:`User` and sends them at a steady
+    rate.
+
+    Actions waiting to be sent are deduplicated: repeating one returns the
+    future of the one already queued, queuing the opposite of one (e.g.
+    ``unlike`` after ``like``, or ``unfollow`` after ``follow``) cancels
+    both out, and a different relationship action replaces the one queued
+    for the same user. Actions cancelled out or replaced complete with
+    ``None``.
+
+    Each method returns an 'asyncio.Future' of the API's response. With
+    ``path``, queued actions are journaled to disk and sent after a
+    restart; their results are then only logged.
+
+    The queue starts sending when created, so it has to be created from a
+    coroutine::
+
+        writes = user.write_queue(writes_per_hour=60, path='writes.journal')
+        writes.like(media_id)
+        await writes.follow(user_id)
+
+    Parameters
+    -----------
+    user : User
+        The user to act as.
+    writes_per_hour : float (optional: 60)
+        The rate actions are sent at.
+    path : str (optional: None)
+        The journal of queued actions. Without it they are lost on exit.
+    """
+
+    def __init__(self, user, *, writes_per_hour=60, path=None):
+        if writes_per_hour <= 0:
+            raise InvalidArgument("'writes_per_hour' must be positive")
+
+        self.user = user
+        self.interval = 3600.0 / writes_per_hour
+        self.path = path
+        self._loop = asyncio.get_running_loop()
+        self._pending = collections.OrderedDict()
+        self._ids = itertools.count()
+        self._journal = None
+        self._changed = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._sending = False
+        self._closed = False
+        self._next_send = 0.0
+
+        if path is not None:
+            self._restore()
+        self._task = asyncio.ensure_future(self._send_all())
+
+    def __len__(self):
+        return len(self._pending)
+
+    # journal:
+
+    def _restore(self):
+        actions = collections.OrderedDict()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line may have been cut short
+                        continue
+                    if 'done' in record:
+                        actions.pop(record['done'], None)
+                    else:
+                        actions[record['id']] = record
+
+        # start the journal afresh with the actions still queued
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            for record in actions.values():
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmp, self.path)
+        self._journal = open(self.path, 'a')
+
+        self._ids = itertools.count(max(actions, default=-1) + 1)
+        for record in actions.values():
+            action = _Action(record['id'], record['kind'],
+                             tuple(record['args']), self._loop.create_future())
+            action.future.add_done_callback(self._log_result)
+            self._pending[action.key] = action
+        if self._pending:
+            self._idle.clear()
+            self._changed.set()
+
+    def _write(self, record):
+        if self._journal is not None:
+            self._journal.write(json.dumps(record) + '\n')
+            self._journal.flush()
+
+    @staticmethod
+    def _log_result(future):
+        if not future.cancelled() and future.exception() is not None:
+            log.warning('Queued write failed: %r', future.exception())
+
+    # queueing:
+
+    def _finish(self, action, result=None):
+        self._write({'done': action.id})
+        if not action.future.done():
+            action.future.set_result(result)
+
+    def _queue(self, kind, *args):
+        if self._closed:
+            raise ClientException('The write queue is closed.')
+
+        key = _key(kind, args)
+        queued = self._pending.get(key)
+        if queued is not None:
+            if queued.kind == kind:
+                return queued.future
+
+            del self._pending[key]
+            self._finish(queued)
+            if _ACTIONS[kind][2] == queued.kind:
+                future = self._loop.create_future()
+                future.set_result(None)
+                self._update_idle()
+                return future
+
+        action = _Action(next(self._ids), kind, args,
+                         self._loop.create_future())
+        self._write({'id': action.id, 'kind': kind, 'args': list(args)})
+        self._pending[key] = action
+        self._idle.clear()
+        self._changed.set()
+        return action.future
+
+    def like(self, media_id):
+        return self._queue('like', media_id)
+
+    def unlike(self, media_id):
+        return self._queue('unlike', media_id)
+
+    def comment(self, media_id, text):
+        return self._queue('comment', media_id, text)
+
+    def delete_comment(self, media_id, comment_id):
+        return self._queue('delete_comment', media_id, comment_id)
+
+    def follow(self, user_id):
+        return self._queue('follow', user_id)
+
+    def unfollow(self, user_id):
+        return self._queue('unfollow', user_id)
+
+    def approve(self, user_id):
+        return self._queue('approve', user_id)
+
+    def ignore(self, user_id):
+        return self._queue('ignore', user_id)
+
+    # sending:
+
+    def _update_idle(self):
+        if not self._pending and not self._sending:
+            self._idle.set()
+
+    async def _send_all(self):
+        while True:
+            if not self._pending:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+
+            # actions queued meanwhile may still cancel out the next one
+            delay = self._next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, action = self._pending.popitem(last=False)
+            method, extra, _, _, _ = _ACTIONS[action.kind]
+            self._next_send = time.monotonic() + self.interval
+            self._sending = True
+            try:
+                result = await getattr(self.user, method)(
+                        *(action.args + extra))
+            except asyncio.CancelledError:
+                # sent again after a restart
+                self._pending[action.key] = action
+                self._pending.move_to_end(action.key, last=False)
+                raise
+            except Exception as e:
+                self._write({'done': action.id})
+                if not action.future.done():
+                    action.future.set_exception(e)
+            else:
+                self._finish(action, result)
+            finally:
+                self._sending = False
+                self._update_idle()
+
+    async def join(self):
+        """Wait until every queued action has been sent."""
+        await self._idle.wait()
+
+    async def close(self):
+        """Stop sending and cancel the futures of the actions still queued.
+
+        Those actions stay in the journal, so they are sent after a
+        restart.
+        """
+        self._closed = True
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        for action in self._pending.values():
+            action.future.cancel()
+        self._pending.clear()
+        self._idle.set()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
@@ -0,0 +1,66 @@
+import json
+
+from yarl import URL
+
+from instagram.transport import RecordedResponse
+
+
+class _Context:
+    def __init__(self, coro):
+        self._coro = coro
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self):
+        return await self._coro
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class StubSession:
+    """Answers requests with ``handler(method, url, params, headers)``,
+    where ``params`` includes the query of ``url``.
+
+    The handler returns ``(status, body, headers)``, where a dict body is
+    sent as JSON, or raises to simulate a connection failure. Every request
+    is recorded in ``requests``.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        return _Context(self._respond(method, url, kwargs))
+
+    async def _respond(self, method, url, kwargs):
+        url = str(url)
+        params = dict(URL(url).query)
+        params.update(kwargs.get('params') or {})
+        url = url.split('?', 1)[0]
+        headers = dict(kwargs.get('headers') or {})
+        self.requests.append((method, url, params, headers))
+        status, body, response_headers = self.handler(method, url, params,
+                                                      headers)
+        response_headers = dict(response_headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+            response_headers.setdefault('Content-Type', 'application/json')
+        return RecordedResponse(method, url, status, 'Reason',
+                                list(response_headers.items()),
+                                (body or '').encode('utf-8'))
+
+    async def close(self):
+        self.closed = True
+
+
+def ok(data, **extra):
+    return dict(meta={'code': 200}, data=data, **extra)
+
+
+def error(status, error_type='APIError', message='failed'):
+    return {'meta': {'code': status, 'error_type': error_type,
+                     'error_message': message}}
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from instagram import CircuitBreaker, RateLimiter, RetryPolicy
+from instagram.breaker import CLOSED, HALF_OPEN, OPEN
+from instagram.errors import CircuitOpen, HTTPException
+from instagram.http import HTTPClient
+
+from conftest import StubSession, error
+
+KEY = ('get_user', 'api.instagram.com')
+
+
+def _breaker(**kwargs):
+    kwargs.setdefault('min_requests', 4)
+    kwargs.setdefault('reset_timeout', 60)
+    return CircuitBreaker(**kwargs)
+
+
+def test_opens_once_enough_requests_failed():
+    breaker = _breaker()
+    for failed in (True, False, True):
+        breaker.before(KEY)
+        breaker.record(KEY, failed)
+    assert breaker.state(KEY) == CLOSED
+
+    breaker.before(KEY)
+    breaker.record(KEY, True)
+    assert breaker.state(KEY) == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before(KEY)
+
+
+def test_unknown_outcomes_are_ignored():
+    breaker = _breaker(min_requests=1)
+    breaker.before(KEY)
+    breaker.record(KEY, None)
+    assert breaker.state(KEY) == CLOSED
+
+
+def test_half_open_probe_closes_or_reopens(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('instagram.breaker.time.monotonic', lambda: now[0])
+    breaker = _breaker(min_requests=1, probes=1)
+    breaker.record(KEY, True)
+    assert breaker.state(KEY) == OPEN
+
+    now[0] += 61
+    assert breaker.state(KEY) == HALF_OPEN
+    # checking does not take the probe
+    breaker.check(KEY)
+    breaker.before(KEY)
+    # only one probe at a time
+    with pytest.raises(CircuitOpen):
+        breaker.check(KEY)
+    with pytest.raises(CircuitOpen):
+        breaker.before(KEY)
+    breaker.record(KEY, True)
+    assert breaker.state(KEY) == OPEN
+
+    now[0] += 61
+    breaker.before(KEY)
+    breaker.record(KEY, False)
+    assert breaker.state(KEY) == CLOSED
+
+
+def test_circuits_are_per_bucket_and_host():
+    assert (CircuitBreaker.key('get_user', 'https://a/v1/users/1')
+            != CircuitBreaker.key('get_user', 'https://b/v1/users/1'))
+
+
+def test_retried_request_counts_once():
+    def handler(method, url, params, headers):
+        return 503, error(503), None
+
+    async def run():
+        breaker = _breaker(min_requests=2)
+        policy = RetryPolicy(max_attempts=5, base_delay=0, budget=None)
+        client = HTTPClient(StubSession(handler), retry_policy=policy,
+                            circuit_breaker=breaker)
+        url = 'https://api.instagram.com/v1/users/1'
+
+        # the request is not cut short by its own failures
+        with pytest.raises(HTTPException) as info:
+            await client.get(url, bucket='get_user')
+        assert info.value.response.status == 503
+        assert len(client.session.requests) == 5
+        assert breaker.state(KEY) == CLOSED
+
+        with pytest.raises(HTTPException):
+            await client.get(url, bucket='get_user')
+        assert breaker.state(KEY) == OPEN
+        with pytest.raises(CircuitOpen):
+            await client.get(url, bucket='get_user')
+        assert len(client.session.requests) == 10
+
+    asyncio.run(run())
+
+
+def test_open_circuit_fails_without_waiting_for_a_slot():
+    def handler(method, url, params, headers):
+        return 200, {}, None
+
+    async def run():
+        breaker = _breaker(min_requests=1)
+        breaker.record(KEY, True)
+        limiter = RateLimiter(bucket_concurrency=1)
+        client = HTTPClient(StubSession(handler), rate_limiter=limiter,
+                            circuit_breaker=breaker)
+        client._token('token')
+
+        # the only slot of the bucket is taken by a request in flight
+        async with limiter.acquire('token', 'get_user'):
+            with pytest.raises(CircuitOpen):
+                await asyncio.wait_for(client.get(
+                        'https://api.instagram.com/v1/users/1',
+                        bucket='get_user'), 1)
+
+    asyncio.run(run())
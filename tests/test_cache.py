@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from instagram import MemoryBackend, ResponseCache, RetryPolicy, SQLiteBackend
+from instagram.cache import CacheEntry
+from instagram.http import HTTPClient
+
+from conftest import StubSession, ok
+
+
+def _client(handler, **kwargs):
+    session = StubSession(handler)
+    client = HTTPClient(session, **kwargs)
+    client._token('token')
+    return client, session
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    for key in 'abc':
+        backend.set(key, CacheEntry({'key': key}, None, 0))
+        if key == 'b':
+            backend.get('a')
+    assert backend.get('b') is None
+    assert backend.get('a').body == {'key': 'a'}
+    assert backend.get('c').body == {'key': 'c'}
+
+
+def test_memory_backend_limits_size():
+    backend = MemoryBackend(max_bytes=30)
+    backend.set('a', CacheEntry({'text': 'x' * 10}, None, 0))
+    backend.set('b', CacheEntry({'text': 'y' * 10}, None, 0))
+    assert backend.get('a') is None
+    assert backend.size <= 30
+
+
+def test_memory_backend_returns_copies():
+    backend = MemoryBackend()
+    backend.set('a', CacheEntry({'id': 1}, None, 0))
+    backend.get('a').body['mutated'] = True
+    assert backend.get('a').body == {'id': 1}
+
+
+def test_sqlite_backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    backend.set('a', CacheEntry({'id': 1}, 'etag', 5.0))
+    assert backend.get('a') == CacheEntry({'id': 1}, 'etag', 5.0)
+    backend.delete('a')
+    assert backend.get('a') is None
+    backend.close()
+
+
+def test_hits_are_served_from_the_cache():
+    def handler(method, url, params, headers):
+        return 200, ok({'id': 1}), None
+
+    async def run():
+        cache = ResponseCache()
+        client, session = _client(handler, cache=cache)
+        first = await client.get('http://x/v1/users/1', bucket='get_user')
+        first['mutated'] = True
+        second = await client.get('http://x/v1/users/1', bucket='get_user')
+        assert second == {'id': 1}
+        assert len(session.requests) == 1
+        assert cache.stats == {'hits': 1, 'misses': 1, 'revalidations': 0}
+
+    asyncio.run(run())
+
+
+def test_uncached_buckets_are_always_sent():
+    def handler(method, url, params, headers):
+        return 200, ok([]), None
+
+    async def run():
+        client, session = _client(handler, cache=ResponseCache())
+        for _ in range(2):
+            await client.get('http://x/v1/users/search', bucket='search')
+        assert len(session.requests) == 2
+
+    asyncio.run(run())
+
+
+def test_expired_entries_are_revalidated():
+    def handler(method, url, params, headers):
+        if headers.get('If-None-Match') == '"v1"':
+            return 304, '', {'ETag': '"v1"'}
+        return 200, ok({'id': 1}), {'ETag': '"v1"'}
+
+    async def run():
+        cache = ResponseCache(ttls={'get_user': 0})
+        client, session = _client(handler, cache=cache)
+        assert await client.get('http://x/v1/users/1',
+                                bucket='get_user') == {'id': 1}
+        assert await client.get('http://x/v1/users/1',
+                                bucket='get_user') == {'id': 1}
+        assert session.requests[1][3]['If-None-Match'] == '"v1"'
+        assert cache.revalidations == 1
+
+    asyncio.run(run())
+
+
+def test_concurrent_identical_requests_are_coalesced():
+    def handler(method, url, params, headers):
+        return 200, ok({'id': 1}), None
+
+    async def run():
+        client, session = _client(handler)
+        results = await asyncio.gather(*[
+                client.get('http://x/v1/users/1', bucket='get_user')
+                for _ in range(5)])
+        assert results == [{'id': 1}] * 5
+        assert len(session.requests) == 1
+
+        client.coalesce = False
+        await asyncio.gather(*[
+                client.get('http://x/v1/users/1', bucket='get_user')
+                for _ in range(2)])
+        assert len(session.requests) == 3
+
+    asyncio.run(run())
+
+
+def test_coalesced_request_is_cancelled_with_its_last_waiter():
+    statuses = [503, 200, 503, 200]
+
+    def handler(method, url, params, headers):
+        status = statuses.pop(0)
+        return status, ok({'id': 1}) if status == 200 else {}, None
+
+    async def run():
+        # the retry delay keeps the request in flight
+        client, session = _client(handler, retry_policy=RetryPolicy(
+                base_delay=0.2, jitter=False, budget=None))
+        first = client.get('http://x/v1/users/1')
+        second = asyncio.ensure_future(client.get('http://x/v1/users/1'))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(first, 0.05)
+        assert await second == {'id': 1}
+        assert len(session.requests) == 2
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.get('http://x/v1/users/1'), 0.05)
+        await asyncio.sleep(0.3)
+        assert len(session.requests) == 3
+        assert not client._inflight and not client._waiters
+
+    asyncio.run(run())
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from instagram import Client, IdentityCache, RetryPolicy
+from instagram.cache import token_scope
+from instagram.errors import HTTPException, LoginFailure
+
+from conftest import StubSession, error, ok
+
+USERS = {'token-a': '1', 'token-b': '2'}
+
+
+def _users(method, url, params, headers):
+    token = params['access_token']
+    if token in USERS:
+        if url.endswith('/users/self'):
+            user_id = USERS[token]
+            return 200, ok({'id': user_id,
+                            'username': 'user' + user_id}), None
+        return 200, ok({'id': url.rsplit('/', 1)[1]}), None
+    return 400, error(400, 'OAuthAccessTokenException',
+                      'The access_token provided is invalid.'), None
+
+
+def _client(handler=_users, **kwargs):
+    session = StubSession(handler)
+    return Client(transport=session, **kwargs), session
+
+
+def test_add_users_reports_each_token():
+    async def run():
+        client, session = _client(lambda *request: (
+                (401, error(401), None) if request[2]['access_token'] == 'bad'
+                else _users(*request)))
+        results = await client.add_users(['token-a', 'bad', 'token-b'])
+        assert isinstance(results['bad'], LoginFailure)
+        assert results['token-a']._username == 'user1'
+        assert sorted(client.users) == ['1', '2']
+        assert len(session.requests) == 3
+
+    asyncio.run(run())
+
+
+def test_identity_cache_skips_validation(tmp_path):
+    path = str(tmp_path / 'identities.json')
+
+    async def run():
+        client, session = _client(identity_cache=IdentityCache(path))
+        await client.add_users(['token-a', 'token-b'])
+        assert len(session.requests) == 2
+
+        client, session = _client(identity_cache=IdentityCache(path))
+        results = await client.add_users(['token-a', 'token-b'])
+        assert session.requests == []
+        assert sorted(client.users) == ['1', '2']
+        assert results['token-b']._username == 'user2'
+
+    asyncio.run(run())
+    # tokens are not written to disk
+    with open(path) as f:
+        assert 'token-a' not in f.read()
+
+
+def test_lazy_users_are_resolved_on_first_use(tmp_path):
+    async def run():
+        cache = IdentityCache(str(tmp_path / 'identities.json'))
+        client, session = _client(identity_cache=cache)
+        await client.add_users(['token-a'], lazy=True)
+        assert session.requests == []
+        assert list(client.users) == [token_scope('token-a')]
+
+        assert await client.pool.get_media(media_id='5') == {'id': '5'}
+        assert list(client.users) == ['1']
+        assert client.users['1']._username == 'user1'
+        assert cache.get('token-a') == ('1', 'user1')
+        assert [url for _, url, _, _ in session.requests] == [
+                'https://api.instagram.com/v1/users/self',
+                'https://api.instagram.com/v1/media/5']
+
+    asyncio.run(run())
+
+
+def test_revoked_tokens_are_forgotten(tmp_path):
+    async def run():
+        cache = IdentityCache(str(tmp_path / 'identities.json'))
+        cache.set('revoked', '3', 'user3')
+        client, session = _client(identity_cache=cache)
+        await client.add_user(token='revoked')
+        assert list(client.users) == ['3']
+
+        with pytest.raises(HTTPException):
+            await client.pool.get_media(media_id='5')
+        assert len(client.pool) == 0
+        assert cache.get('revoked') is None
+        assert IdentityCache(cache.path).get('revoked') is None
+
+    asyncio.run(run())
+
+
+def test_concurrent_resolutions_share_one_validation():
+    statuses = [503]
+
+    def handler(*request):
+        if statuses:
+            return statuses.pop(), error(503), None
+        return _users(*request)
+
+    async def run():
+        # the retry delay keeps the validation in flight
+        client, session = _client(handler, retry_policy=RetryPolicy(
+                base_delay=0.1, jitter=False, budget=None))
+        user = await client.add_user(token='token-a', lazy=True)
+        validations = []
+        set_token = user.set_token
+
+        async def validate(token):
+            validations.append(token)
+            return await set_token(token)
+        user.set_token = validate
+
+        first = asyncio.ensure_future(client.resolve_user(user))
+        second = asyncio.ensure_future(client.resolve_user(user))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        third = asyncio.ensure_future(client.resolve_user(user))
+        assert await second is user and await third is user
+        assert user._id == '1'
+        assert validations == ['token-a']
+        assert list(client.users) == ['1']
+
+    asyncio.run(run())
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from instagram import Crawler, CrawlError
+from instagram.errors import InvalidArgument
+from instagram.transport import ReplayTransport, request_signature
+
+from conftest import ok
+
+MEDIA = ['1', '2', '3', '4', '5', '6']
+
+
+def _cassette(tmp_path):
+    path = str(tmp_path / 'crawl.jsonl')
+    bodies = {'/v1/users/self': ok({'id': '10', 'username': 'crawler'})}
+    for media_id in MEDIA:
+        bodies['/v1/media/' + media_id] = ok({'id': media_id})
+    with open(path, 'w') as f:
+        for path_, body in bodies.items():
+            f.write(json.dumps({
+                'request': request_signature(
+                        'GET', 'https://api.instagram.com' + path_),
+                'status': 200, 'reason': 'OK',
+                'headers': {'Content-Type': 'application/json'},
+                'latency': 0, 'body': json.dumps(body)}) + '\n')
+    return path
+
+
+def _broken_store():
+    raise RuntimeError('no store')
+
+
+def test_keyword_only_methods_are_crawled(tmp_path):
+    transport = ReplayTransport(_cassette(tmp_path))
+    with Crawler(['token'], processes=2, transport=transport) as crawler:
+        results = dict(crawler.crawl('get_media', MEDIA))
+    assert sorted(results) == MEDIA
+    for media_id, media in results.items():
+        assert not isinstance(media, CrawlError), media
+        assert media['id'] == media_id
+
+
+def test_failed_workers_report_every_key():
+    with Crawler(['token'], processes=2,
+                 store_factory=_broken_store) as crawler:
+        results = dict(crawler.crawl('get_media', MEDIA))
+    assert sorted(results) == MEDIA
+    for error in results.values():
+        assert isinstance(error, CrawlError)
+        assert 'no store' in str(error)
+
+
+def test_unknown_methods_cannot_be_crawled():
+    with pytest.raises(InvalidArgument):
+        next(Crawler(['token']).crawl('add_like', MEDIA))
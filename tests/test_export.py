@@ -0,0 +1,68 @@
+import asyncio
+import gzip
+import json
+
+import aiohttp
+import pytest
+
+from instagram import RetryPolicy
+from instagram.errors import ClientException
+from instagram.export import Exporter
+from instagram.http import HTTPClient
+from instagram.iterators import PageIterator
+
+from conftest import StubSession, ok
+
+PAGES = 6
+
+
+def _handler(fail_at=None):
+    def handler(method, url, params, headers):
+        page = int(params.get('cursor', 0))
+        if page == fail_at:
+            raise aiohttp.ClientConnectionError()
+        pagination = {'next_cursor': str(page + 1)} if page + 1 < PAGES else {}
+        return 200, ok([{'id': page * 2}, {'id': page * 2 + 1}],
+                       pagination=pagination), None
+    return handler
+
+
+def _exporter(handler, tmp_path):
+    client = HTTPClient(StubSession(handler), retry_policy=RetryPolicy(
+            max_attempts=1))
+    client._token('token')
+
+    def paginate(**kwargs):
+        return PageIterator(client, 'http://x/v1/feed', **kwargs)
+
+    return Exporter(paginate, str(tmp_path / 'feed.ndjson.gz'),
+                    checkpoint=str(tmp_path / 'feed.checkpoint'),
+                    checkpoint_every=2)
+
+
+def _read(tmp_path):
+    with gzip.open(str(tmp_path / 'feed.ndjson.gz')) as f:
+        return [json.loads(line)['id'] for line in f]
+
+
+def test_interrupted_export_is_resumed(tmp_path):
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(_exporter(_handler(fail_at=3), tmp_path).run())
+    exporter = _exporter(_handler(), tmp_path)
+    assert exporter.load_checkpoint()['items'] == 4
+
+    assert asyncio.run(exporter.run()) == PAGES * 2
+    assert _read(tmp_path) == list(range(PAGES * 2))
+    assert exporter.load_checkpoint()['done']
+    # a finished export is not run again
+    assert asyncio.run(exporter.run()) == PAGES * 2
+
+
+def test_export_is_not_resumed_into_a_shorter_file(tmp_path):
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(_exporter(_handler(fail_at=3), tmp_path).run())
+    (tmp_path / 'feed.ndjson.gz').unlink()
+
+    with pytest.raises(ClientException):
+        asyncio.run(_exporter(_handler(), tmp_path).run())
+    assert not (tmp_path / 'feed.ndjson.gz').exists()
@@ -0,0 +1,139 @@
+import array
+import asyncio
+
+import pytest
+
+from instagram.errors import InvalidArgument
+from instagram.graph import GraphCollector, GraphSnapshot, UsernameTable
+from instagram.http import HTTPClient
+from instagram.iterators import PageIterator
+
+from conftest import StubSession, ok
+
+
+def _ids(values=()):
+    return array.array('q', values)
+
+
+def test_usernames():
+    table = UsernameTable()
+    table.add([(3, 'c'), ('1', 'a')])
+    table.add([(2, 'b'), (3, 'c2')])
+    assert len(table) == 3
+    assert [table.get(i) for i in (1, 2, 3)] == ['a', 'b', 'c2']
+    assert table.get(4, 'missing') == 'missing'
+    with pytest.raises(InvalidArgument):
+        table.add([('name', 'x')])
+
+
+def test_added_pages_are_folded():
+    table = UsernameTable()
+    for page in range(1000):
+        table.add((page * 10 + i, str(page * 10 + i)) for i in range(10))
+    assert len(table._runs) < 2 * table.FANOUT
+    assert len(table) == 10000
+    assert len(table._runs) == 1
+    assert table.get(9999) == '9999'
+
+
+def test_usernames_round_trip(tmp_path):
+    path = str(tmp_path / 'names')
+    table = UsernameTable()
+    table.add([(i, 'user{}'.format(i)) for i in range(100)])
+    table.save(path)
+
+    loaded = UsernameTable.load(path)
+    assert len(loaded) == 100
+    assert loaded.get(42) == 'user42'
+    # adding merges the mapped table into memory
+    loaded.add([(42, 'renamed'), (100, 'new')])
+    assert loaded.get(42) == 'renamed'
+    assert loaded.get(7) == 'user7'
+    assert len(loaded) == 101
+    loaded.close()
+
+    loaded = UsernameTable.load(path)
+    loaded.close()
+    assert len(loaded) == 0
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'names'
+    path.write_bytes(b'x' * 64)
+    with pytest.raises(InvalidArgument):
+        UsernameTable.load(str(path))
+    with pytest.raises(InvalidArgument):
+        GraphSnapshot.load(str(path))
+
+
+def _snapshot(rows):
+    indptr, indices = _ids([0]), _ids()
+    for row in sorted(rows):
+        indices.extend(sorted(rows[row]))
+        indptr.append(len(indices))
+    return GraphSnapshot('followed_by', _ids(sorted(rows)), indptr, indices,
+                         created_at=100.0)
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'graph')
+    _snapshot({1: [5, 6, 7], 2: [], 3: [1]}).save(path)
+
+    with GraphSnapshot.load(path) as snapshot:
+        assert (snapshot.kind, snapshot.created_at) == ('followed_by', 100.0)
+        assert (len(snapshot), snapshot.edges) == (3, 4)
+        assert list(snapshot.neighbours(1)) == [5, 6, 7]
+        assert list(snapshot.neighbours('3')) == [1]
+        neighbours = snapshot.neighbours(1)
+        with pytest.raises(KeyError):
+            snapshot.neighbours(4)
+    # rows copied out stay valid once the file is unmapped
+    assert list(neighbours) == [5, 6, 7]
+    assert len(snapshot) == 0
+
+
+def test_diff(tmp_path):
+    old = _snapshot({1: [2, 3, 5, 8], 2: [1]})
+    new = _snapshot({1: [1, 3, 8, 9], 3: [4]})
+    path = str(tmp_path / 'graph')
+    new.save(path)
+
+    with GraphSnapshot.load(path) as loaded:
+        gained, lost = old.diff(loaded, 1)
+        assert (list(gained), list(lost)) == ([1, 9], [2, 5])
+        assert [list(ids) for ids in old.diff(loaded, 2)] == [[], [1]]
+        assert [list(ids) for ids in old.diff(loaded, 3)] == [[4], []]
+
+
+class FakeUser:
+    def __init__(self, user_id, client):
+        self._id = user_id
+        self.client = client
+
+    def iter_self_followed_by(self, **kwargs):
+        return PageIterator(self.client, 'http://x/v1/users/self/followed-by',
+                            **kwargs)
+
+
+def test_collect():
+    followers = [{'id': str(i), 'username': 'user{}'.format(i)}
+                 for i in (9, 4, 7, 4, 1)]
+
+    def handler(method, url, params, headers):
+        page = int(params.get('cursor', 0))
+        pagination = {'next_cursor': str(page + 1)} if page < 2 else {}
+        return 200, ok(followers[page * 2:page * 2 + 2],
+                       pagination=pagination), None
+
+    async def run():
+        client = HTTPClient(StubSession(handler))
+        client._token('token')
+        names = UsernameTable()
+        collector = GraphCollector(usernames=names)
+        assert await collector.collect(FakeUser('10', client)) == 4
+        snapshot = collector.snapshot()
+        assert list(snapshot.rows) == [10]
+        assert list(snapshot.neighbours(10)) == [1, 4, 7, 9]
+        assert names.get(7) == 'user7'
+
+    asyncio.run(run())
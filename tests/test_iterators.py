@@ -0,0 +1,121 @@
+import asyncio
+import gc
+
+import pytest
+
+from instagram.errors import NotFound
+from instagram.http import HTTPClient
+from instagram.iterators import BulkIterator, PageIterator
+
+from conftest import StubSession, error, ok
+
+
+def _pages(count, size=2):
+    def handler(method, url, params, headers):
+        page = int(params.get('cursor', 0))
+        data = [{'id': str(page * size + i)} for i in range(size)]
+        pagination = {}
+        if page + 1 < count:
+            pagination['next_cursor'] = str(page + 1)
+        return 200, ok(data, pagination=pagination), None
+    return handler
+
+
+def _client(handler):
+    session = StubSession(handler)
+    client = HTTPClient(session)
+    client._token('token')
+    return client, session
+
+
+def test_pages_are_followed():
+    async def run():
+        client, session = _client(_pages(3))
+        items = await PageIterator(client, 'http://x/v1/feed').flatten()
+        assert [item['id'] for item in items] == [str(i) for i in range(6)]
+        assert len(session.requests) == 3
+
+    asyncio.run(run())
+
+
+def test_limits():
+    async def run():
+        client, session = _client(_pages(5))
+        items = await PageIterator(client, 'http://x/v1/feed',
+                                   limit=3).flatten()
+        assert len(items) == 3
+
+        pages = PageIterator(client, 'http://x/v1/feed', page_limit=2)
+        assert len(await pages.flatten()) == 4
+
+    asyncio.run(run())
+
+
+def test_resume_from_cursor():
+    async def run():
+        client, _ = _client(_pages(3))
+        pages = PageIterator(client, 'http://x/v1/feed')
+        await pages.next_page()
+        cursor = pages.cursor
+        pages.close()
+
+        resumed = PageIterator(client, 'http://x/v1/feed', cursor=cursor)
+        items = await resumed.flatten()
+        assert [item['id'] for item in items] == ['2', '3', '4', '5']
+
+    asyncio.run(run())
+
+
+def _pending_fills():
+    return [task for task in asyncio.all_tasks()
+            if task.get_coro().__name__ == '_fill' and not task.done()]
+
+
+def test_context_manager_stops_fetching():
+    async def run():
+        client, _ = _client(_pages(100))
+        async with PageIterator(client, 'http://x/v1/feed') as pages:
+            async for _ in pages:
+                break
+        await asyncio.sleep(0)
+        assert not _pending_fills()
+
+    asyncio.run(run())
+
+
+def test_abandoned_iterator_stops_fetching():
+    async def run():
+        client, _ = _client(_pages(100))
+        async for _ in PageIterator(client, 'http://x/v1/feed'):
+            break
+        gc.collect()
+        await asyncio.sleep(0)
+        assert not _pending_fills()
+
+    asyncio.run(run())
+
+
+def test_bulk_iterator_keeps_http_errors_as_results():
+    def handler(method, url, params, headers):
+        if url.endswith('/2'):
+            return 404, error(404, 'APINotFoundError'), None
+        return 200, ok({'id': url.rsplit('/', 1)[1]}), None
+
+    async def run():
+        client, session = _client(handler)
+
+        def get(key):
+            return client.get('http://x/v1/users/{}'.format(key))
+
+        results = await BulkIterator(get, [1, 2, 3, 1],
+                                     concurrency=2).results()
+        assert results[1] == {'id': '1'}
+        assert isinstance(results[2], NotFound)
+        assert len(session.requests) == 3
+
+    asyncio.run(run())
+
+
+def test_bulk_iterator_validates_concurrency():
+    with pytest.raises(Exception):
+        BulkIterator(None, [], concurrency=0)
@@ -0,0 +1,90 @@
+import gc
+import json
+import tracemalloc
+
+from instagram import Comment, Media, UserProfile
+from instagram.models import Counts, Image
+
+
+def _user(user_id):
+    return {'id': str(user_id), 'username': 'user{}'.format(user_id),
+            'full_name': 'User {}'.format(user_id),
+            'profile_picture': 'https://example.com/{}.jpg'.format(user_id),
+            'bio': 'A bio', 'website': 'https://example.com'}
+
+
+def _image(size):
+    return {'url': 'https://example.com/{0}x{0}.jpg'.format(size),
+            'width': size, 'height': size}
+
+
+def _media(media_id):
+    return {
+        'id': str(media_id),
+        'type': 'image',
+        'created_time': '1500000000',
+        'link': 'https://example.com/p/{}/'.format(media_id),
+        'filter': 'Normal',
+        'tags': ['tests', 'models'],
+        'comments': {'count': 5},
+        'likes': {'count': 50},
+        'user_has_liked': False,
+        'images': {'thumbnail': _image(150), 'low_resolution': _image(320),
+                   'standard_resolution': _image(640)},
+        'caption': {'id': 'c{}'.format(media_id), 'text': 'A caption',
+                    'created_time': '1500000000', 'from': _user(1)},
+        'user': _user(1),
+        'location': {'id': '1', 'name': 'Somewhere', 'latitude': 1.0,
+                     'longitude': 2.0},
+    }
+
+
+def test_media_fields():
+    media = Media(_media(7))
+    assert media.id == '7'
+    assert media.created_time == 1500000000
+    assert media.tags == ('tests', 'models')
+    assert (media.comment_count, media.like_count) == (5, 50)
+    assert media.images['thumbnail'] == Image(
+            'https://example.com/150x150.jpg', 150, 150)
+    assert media.videos is None
+    assert isinstance(media.caption, Comment)
+    assert media.caption.author.username == 'user1'
+    assert media.user == UserProfile(_user(1))
+    assert media.location.name == 'Somewhere'
+    assert media.raw is None
+
+
+def test_keep_raw():
+    data = _media(7)
+    assert Media(data, keep_raw=True).raw is data
+
+
+def test_user_profile_counts():
+    data = dict(_user(1), counts={'media': 1, 'follows': 2,
+                                  'followed_by': 3})
+    assert UserProfile(data).counts == Counts(1, 2, 3)
+    assert UserProfile(_user(1)).counts is None
+
+
+def _retained(build, payload, count):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        data = json.loads(payload)
+        kept = build(data)
+        del data
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(kept) == count
+    return size
+
+
+def test_media_is_several_times_smaller_than_payload():
+    count = 1000
+    payload = json.dumps([_media(i) for i in range(count)])
+    raw = _retained(lambda data: data, payload, count)
+    media = _retained(Media.from_list, payload, count)
+    assert raw / media >= 3
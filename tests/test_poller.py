@@ -0,0 +1,77 @@
+import asyncio
+
+from instagram.http import HTTPClient
+from instagram.poller import Feed, FeedPoller
+
+from conftest import StubSession, ok
+
+URL = 'http://x/v1/users/1/media/recent'
+
+
+class FakeUser:
+    def __init__(self, client):
+        self.client = client
+
+
+def _feed(media, size=2):
+    """Serve ``media``, newest first, ``size`` at a time."""
+    def handler(method, url, params, headers):
+        ids = sorted(media, reverse=True)
+        if 'min_id' in params:
+            ids = [i for i in ids if i > int(params['min_id'])]
+        if 'max_id' in params:
+            ids = [i for i in ids if i < int(params['max_id'])]
+        page = ids[:size]
+        pagination = {}
+        if len(ids) > size:
+            pagination['next_max_id'] = str(page[-1])
+        return 200, ok([{'id': str(i)} for i in page],
+                       pagination=pagination), None
+    return handler
+
+
+def _poller(media, **kwargs):
+    session = StubSession(_feed(media))
+    client = HTTPClient(session)
+    client._token('token')
+    poller = FeedPoller(FakeUser(client), None, **kwargs)
+    feed = Feed('user', '1', URL, 'get_user_recent_media', 'min_id', 30, 100)
+    return poller, feed, session
+
+
+def _ids(items):
+    return [int(item['id']) for item in items]
+
+
+def test_older_pages_are_followed_back_to_seen_media():
+    async def run():
+        media = [1, 2, 3]
+        poller, feed, session = _poller(media)
+        # the first poll only fetches the newest page
+        assert _ids(await poller.poll(feed)) == [3, 2]
+        assert feed.min_id == '3'
+
+        media.extend(range(4, 9))
+        assert _ids(await poller.poll(feed)) == [8, 7, 6, 5, 4]
+        assert feed.min_id == '8'
+        assert len(session.requests) == 4
+
+        media.append(9)
+        assert _ids(await poller.poll(feed)) == [9]
+        assert await poller.poll(feed) == []
+        assert len(session.requests) == 6
+
+    asyncio.run(run())
+
+
+def test_older_pages_are_limited():
+    async def run():
+        media = [1]
+        poller, feed, session = _poller(media, max_pages=2)
+        await poller.poll(feed)
+
+        media.extend(range(2, 12))
+        assert _ids(await poller.poll(feed)) == [11, 10, 9, 8]
+        assert feed.min_id == '11'
+
+    asyncio.run(run())
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+from instagram import RateLimiter
+from instagram.http import HTTPClient
+from instagram.ratelimit import draw_request, new_budget, report_limits
+
+from conftest import StubSession, ok
+
+
+def test_draw_request_spends_and_refills():
+    now = 1000.0
+    budget = new_budget(3600, now)
+    assert draw_request(budget, now, 0.0) == 0
+    assert budget['tokens'] == 3599
+    # one request per second comes back
+    assert draw_request(budget, now + 1, 0.0) == 0
+    assert budget['tokens'] == 3599
+
+
+def test_draw_request_paces_near_the_limit():
+    now = 1000.0
+    budget = new_budget(3600, now)
+    budget['tokens'] = 10
+    assert draw_request(budget, now, 0.5) == 0
+    wait = draw_request(budget, now, 0.5)
+    assert 0.9 < wait <= 1.0
+
+
+def test_report_limits():
+    budget = new_budget(5000, 1000.0)
+    report_limits(budget, 1000.0, 200, 20)
+    assert (budget['capacity'], budget['tokens']) == (200, 20)
+
+
+def test_concurrency_is_limited_per_token_and_bucket():
+    async def run():
+        limiter = RateLimiter(token_concurrency=3, bucket_concurrency=2)
+        active = {'a': 0, 'b': 0, 'peak_a': 0, 'peak': 0}
+
+        async def request(bucket):
+            async with limiter.acquire('token', bucket):
+                active[bucket] += 1
+                active['peak_a'] = max(active['peak_a'], active['a'])
+                active['peak'] = max(active['peak'],
+                                     active['a'] + active['b'])
+                await asyncio.sleep(0.01)
+                active[bucket] -= 1
+
+        await asyncio.gather(*[request(bucket)
+                               for bucket in 'ab' * 5])
+        assert active['peak_a'] == 2
+        assert active['peak'] == 3
+
+    asyncio.run(run())
+
+
+def test_throttle_waits_for_budget():
+    async def run():
+        limiter = RateLimiter(requests_per_hour=3600)
+        await limiter.update('token', None, 3600, 0)
+        started = time.monotonic()
+        await limiter.throttle('token')
+        assert time.monotonic() - started > 0.5
+        assert limiter.remaining('token') == 0
+
+    asyncio.run(run())
+
+
+def test_pause():
+    async def run():
+        limiter = RateLimiter()
+        await limiter.pause('token', 30)
+        assert 29 < limiter.paused('token') <= 30
+        assert limiter.paused('other') == 0
+
+    asyncio.run(run())
+
+
+def test_responses_correct_the_budget():
+    def handler(method, url, params, headers):
+        return 200, ok({'id': 1}), {'X-Ratelimit-Limit': '500',
+                                    'X-Ratelimit-Remaining': '123'}
+
+    async def run():
+        limiter = RateLimiter()
+        client = HTTPClient(StubSession(handler), rate_limiter=limiter)
+        client._token('token')
+        await client.get('http://x/v1/users/1', bucket='get_user')
+        status = limiter.status('token')
+        assert status['limit'] == 500
+        assert status['remaining'] == 123
+        assert status['buckets'] == {'get_user': {'limit': 500,
+                                                  'remaining': 123}}
+
+    asyncio.run(run())
+
+
+def test_zero_limit_does_not_break_requests():
+    def handler(method, url, params, headers):
+        return 200, ok({'id': 1}), {'X-Ratelimit-Limit': '0',
+                                    'X-Ratelimit-Remaining': '100'}
+
+    async def run():
+        client = HTTPClient(StubSession(handler))
+        client._token('token')
+        for _ in range(2):
+            assert await client.get('http://x/v1/users/1') == {'id': 1}
+        assert client.rate_limit_status()['limit'] == 5000
+
+    asyncio.run(run())
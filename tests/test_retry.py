@@ -0,0 +1,152 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from instagram import RetryBudget, RetryPolicy
+from instagram.errors import HTTPException
+from instagram.http import HTTPClient
+
+from conftest import StubSession, error, ok
+
+
+def test_backoff_grows_up_to_max_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=False)
+    assert [policy.backoff(attempt) for attempt in range(1, 5)] == [1, 2, 4,
+                                                                    5]
+
+
+def test_delay_gives_up():
+    policy = RetryPolicy(max_attempts=3, base_delay=1, jitter=False,
+                         deadline=10, budget=None)
+    assert policy.delay(1, 0) == 1
+    assert policy.delay(3, 0) is None
+    assert policy.delay(1, 9.5) is None
+    assert policy.delay(1, 0, retry_after=7) == 7
+
+
+def test_only_idempotent_requests_are_retried():
+    policy = RetryPolicy()
+    assert policy.retries_status('GET', 503)
+    assert not policy.retries_status('POST', 503)
+    assert policy.retries_status('POST', 429)
+    assert not policy.retries_status('GET', 404)
+    assert policy.retries_exception('GET', aiohttp.ClientError())
+    assert not policy.retries_exception('POST', aiohttp.ClientError())
+
+
+def test_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, per_second=0, max_balance=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def _client(handler, **kwargs):
+    kwargs.setdefault('retry_policy', RetryPolicy(base_delay=0,
+                                                  budget=None))
+    client = HTTPClient(StubSession(handler), **kwargs)
+    client._token('token')
+    return client
+
+
+def test_server_errors_are_retried():
+    statuses = [502, 503, 200]
+
+    def handler(method, url, params, headers):
+        status = statuses.pop(0)
+        if status == 200:
+            return 200, ok({'id': 1}), None
+        return status, error(status), None
+
+    async def run():
+        client = _client(handler)
+        assert await client.get('http://x/v1/users/1') == {'id': 1}
+        assert len(client.session.requests) == 3
+
+    asyncio.run(run())
+
+
+def test_connection_errors_are_retried():
+    failures = [aiohttp.ClientConnectionError()]
+
+    def handler(method, url, params, headers):
+        if failures:
+            raise failures.pop()
+        return 200, ok({'id': 1}), None
+
+    async def run():
+        client = _client(handler)
+        assert await client.get('http://x/v1/users/1') == {'id': 1}
+
+    asyncio.run(run())
+
+
+def test_last_error_is_raised():
+    def handler(method, url, params, headers):
+        return 500, error(500), None
+
+    async def run():
+        client = _client(handler, retry_policy=RetryPolicy(
+                max_attempts=2, base_delay=0, budget=None))
+        with pytest.raises(HTTPException) as info:
+            await client.get('http://x/v1/users/1')
+        assert info.value.response.status == 500
+        assert len(client.session.requests) == 2
+
+    asyncio.run(run())
+
+
+def test_posts_are_not_retried():
+    def handler(method, url, params, headers):
+        return 503, error(503), None
+
+    async def run():
+        client = _client(handler)
+        with pytest.raises(HTTPException):
+            await client.post('http://x/v1/media/1/likes')
+        assert len(client.session.requests) == 1
+
+    asyncio.run(run())
+
+
+def test_rate_limited_requests_wait_for_retry_after():
+    statuses = [429, 200]
+
+    def handler(method, url, params, headers):
+        if statuses.pop(0) == 429:
+            return 429, error(429, 'OAuthRateLimitException'), {
+                    'Retry-After': '0.05'}
+        return 200, ok({'id': 1}), None
+
+    async def run():
+        client = _client(handler)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await client.get('http://x/v1/users/1') == {'id': 1}
+        assert loop.time() - started >= 0.05
+
+    asyncio.run(run())
+
+
+def test_text_error_pages_are_retried():
+    statuses = [502, 502, 200]
+
+    def handler(method, url, params, headers):
+        if statuses.pop(0) == 502:
+            return 502, '<html>Bad gateway, no data</html>', {
+                    'Content-Type': 'text/html'}
+        return 200, ok({'id': 1}), None
+
+    async def run():
+        client = _client(handler)
+        assert await client.get('http://x/v1/users/1') == {'id': 1}
+
+        statuses.extend([502] * 5)
+        with pytest.raises(HTTPException) as info:
+            await client.get('http://x/v1/users/1')
+        assert info.value.response.status == 502
+
+    asyncio.run(run())
@@ -0,0 +1,152 @@
+import asyncio
+import inspect
+import time
+
+import pytest
+
+from instagram import FileStore, MemoryStore, RedisStore
+
+try:
+    import fakeredis
+    # fakeredis only runs scripts with 'lupa' installed
+    import lupa  # noqa: F401
+except ImportError:
+    fakeredis = None
+
+
+async def _resolve(value):
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+def _file_store(tmp_path):
+    return FileStore(str(tmp_path / 'budgets.json'))
+
+
+def _redis_store(tmp_path):
+    return RedisStore(fakeredis.FakeRedis())
+
+
+def _async_redis_store(tmp_path):
+    return RedisStore(fakeredis.FakeAsyncRedis())
+
+
+needs_redis = pytest.mark.skipif(fakeredis is None,
+                                 reason="requires 'fakeredis[lua]'")
+
+STORES = [
+    pytest.param(lambda tmp_path: MemoryStore(), id='memory'),
+    pytest.param(_file_store, id='file'),
+    pytest.param(_redis_store, id='redis', marks=needs_redis),
+    pytest.param(_async_redis_store, id='async-redis', marks=needs_redis),
+]
+
+
+@pytest.fixture(params=STORES)
+def store(request, tmp_path):
+    return request.param(tmp_path)
+
+
+def test_draw(store):
+    async def run():
+        wait, budget = await _resolve(store.draw('token', 10, 0.0))
+        assert wait == 0
+        assert budget['capacity'] == 10
+        assert 8.9 < budget['tokens'] <= 9.1
+
+    asyncio.run(run())
+
+
+def test_draw_waits_once_exhausted(store):
+    async def run():
+        for _ in range(3):
+            wait, _ = await _resolve(store.draw('token', 3, 0.0))
+            assert wait == 0
+        wait, budget = await _resolve(store.draw('token', 3, 0.0))
+        # one request refills every 1200 seconds
+        assert 1000 < wait <= 1200
+        assert budget['tokens'] < 1
+
+    asyncio.run(run())
+
+
+def test_budgets_are_per_token(store):
+    async def run():
+        await _resolve(store.draw('a', 1, 0.0))
+        wait, _ = await _resolve(store.draw('b', 1, 0.0))
+        assert wait == 0
+
+    asyncio.run(run())
+
+
+def test_pause(store):
+    async def run():
+        until = time.time() + 60
+        budget = await _resolve(store.pause('token', 10, until))
+        assert budget['paused_until'] == pytest.approx(until)
+        wait, _ = await _resolve(store.draw('token', 10, 0.0))
+        assert 59 < wait <= 60
+
+    asyncio.run(run())
+
+
+def test_update(store):
+    async def run():
+        budget = await _resolve(store.update('token', 10, 100, 40))
+        assert budget['capacity'] == 100
+        assert budget['tokens'] == pytest.approx(40, abs=0.1)
+        budget = await _resolve(store.update('token', 10, None, 5))
+        assert budget['capacity'] == 100
+        assert budget['tokens'] == pytest.approx(5, abs=0.1)
+
+    asyncio.run(run())
+
+
+def test_update_ignores_limits_which_are_not_positive(store):
+    async def run():
+        budget = await _resolve(store.update('token', 10, 0, 0))
+        assert budget['capacity'] == 10
+        budget = await _resolve(store.update('token', 10, -5, -1))
+        assert budget['capacity'] == 10
+        assert budget['tokens'] == pytest.approx(0, abs=0.1)
+        wait, _ = await _resolve(store.draw('token', 10, 0.2))
+        assert 0 < wait <= 360
+
+    asyncio.run(run())
+
+
+def test_file_stores_share_budgets(tmp_path):
+    first, second = _file_store(tmp_path), _file_store(tmp_path)
+    first.draw('token', 2, 0.0)
+    first.draw('token', 2, 0.0)
+    wait, _ = second.draw('token', 2, 0.0)
+    assert wait > 0
+
+
+def test_file_store_recovers_from_unreadable_file(tmp_path):
+    store = _file_store(tmp_path)
+    store.draw('token', 2, 0.0)
+    with open(store.path, 'w') as f:
+        f.write('{"partial')
+    wait, budget = store.draw('token', 2, 0.0)
+    assert wait == 0
+    assert budget['tokens'] == pytest.approx(1)
+
+
+def test_file_store_does_not_store_tokens(tmp_path):
+    store = _file_store(tmp_path)
+    store.draw('secret-token', 2, 0.0)
+    with open(store.path) as f:
+        assert 'secret-token' not in f.read()
+
+
+@needs_redis
+def test_redis_stores_share_budgets():
+    server = fakeredis.FakeServer()
+    first = RedisStore(fakeredis.FakeRedis(server=server))
+    second = RedisStore(fakeredis.FakeRedis(server=server))
+    first.draw('token', 2, 0.0)
+    first.draw('token', 2, 0.0)
+    wait, _ = second.draw('token', 2, 0.0)
+    assert wait > 0
@@ -0,0 +1,66 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from instagram.http import HTTPClient
+from instagram.iterators import PageIterator
+from instagram.transport import (RecordingTransport, ReplayTransport,
+                                 _scrub_body)
+
+from conftest import StubSession, ok
+
+TOKEN = '123.abc.456'
+
+
+@pytest.mark.parametrize('url, scrubbed', [
+    ('https://x/v1/feed?access_token=123.abc.456&cursor=2',
+     'https://x/v1/feed?cursor=2'),
+    ('https://x/v1/feed?count=5&access_token=123.abc.456&cursor=2',
+     'https://x/v1/feed?count=5&cursor=2'),
+    ('https://x/v1/feed?cursor=2&access_token=123.abc.456',
+     'https://x/v1/feed?cursor=2'),
+    ('https://x/v1/feed?access_token=123.abc.456',
+     'https://x/v1/feed'),
+])
+def test_tokens_are_scrubbed_from_urls(url, scrubbed):
+    body = json.dumps({'pagination': {'next_url': url}})
+    assert _scrub_body(body) == json.dumps(
+            {'pagination': {'next_url': scrubbed}})
+
+
+def test_token_is_scrubbed_anywhere():
+    assert _scrub_body('{"token": "123.abc.456"}', TOKEN) == '{"token": ""}'
+
+
+def _pages(method, url, params, headers):
+    page = int(params.get('cursor', 0))
+    pagination = {}
+    if page < 2:
+        pagination = {
+            'next_cursor': str(page + 1),
+            'next_url': 'https://x/v1/feed?access_token={}&cursor={}'
+                        .format(params['access_token'], page + 1),
+        }
+    return 200, ok([{'id': str(page)}], pagination=pagination), None
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / 'feed.jsonl.gz')
+
+    async def export(session):
+        client = HTTPClient(session)
+        client._token(TOKEN)
+        items = await PageIterator(client, 'https://x/v1/feed').flatten()
+        await session.close()
+        return [item['id'] for item in items]
+
+    recorder = RecordingTransport(path, StubSession(_pages))
+    assert asyncio.run(export(recorder)) == ['0', '1', '2']
+    with gzip.open(path, 'rt') as f:
+        cassette = f.read()
+    assert cassette.count('\n') == 3
+    assert 'access_token' not in cassette and TOKEN not in cassette
+
+    assert asyncio.run(export(ReplayTransport(path))) == ['0', '1', '2']
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from instagram import WriteQueue
+from instagram.errors import ClientException
+
+RATE = 360000
+
+
+class FakeUser:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    async def _call(self, *call):
+        self.calls.append(call)
+        await asyncio.sleep(0)
+        if call in self.fail:
+            raise ClientException('failed')
+        return {'call': list(call)}
+
+    def add_like(self, media_id):
+        return self._call('add_like', media_id)
+
+    def del_like(self, media_id):
+        return self._call('del_like', media_id)
+
+    def add_comment(self, media_id, text):
+        return self._call('add_comment', media_id, text)
+
+    def del_comment(self, media_id, comment_id):
+        return self._call('del_comment', media_id, comment_id)
+
+    def set_user_relationship(self, user_id, action):
+        return self._call('relationship', user_id, action)
+
+
+def test_opposite_actions_cancel_out():
+    async def run():
+        user = FakeUser()
+        queue = WriteQueue(user, writes_per_hour=RATE)
+        like, unlike = queue.like('m'), queue.unlike('m')
+        assert len(queue) == 0
+        assert await like is None and await unlike is None
+        await queue.join()
+        assert user.calls == []
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_repeated_actions_collapse():
+    async def run():
+        user = FakeUser()
+        queue = WriteQueue(user, writes_per_hour=RATE)
+        first, second = queue.follow('u'), queue.follow('u')
+        assert first is second
+        assert await first == {'call': ['relationship', 'u', 'follow']}
+        assert user.calls == [('relationship', 'u', 'follow')]
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_newer_relationship_action_replaces_older():
+    async def run():
+        user = FakeUser()
+        queue = WriteQueue(user, writes_per_hour=RATE)
+        follow, ignore = queue.follow('u'), queue.ignore('u')
+        assert await follow is None
+        await ignore
+        assert user.calls == [('relationship', 'u', 'ignore')]
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_failures_are_reported_through_futures():
+    async def run():
+        user = FakeUser(fail={('add_like', 'm')})
+        queue = WriteQueue(user, writes_per_hour=RATE)
+        with pytest.raises(ClientException):
+            await queue.like('m')
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_actions_are_paced():
+    async def run():
+        user = FakeUser()
+        queue = WriteQueue(user, writes_per_hour=36000)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(queue.like('a'), queue.like('b'),
+                             queue.like('c'))
+        # 0.1 seconds between writes
+        assert loop.time() - started >= 0.19
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_journal_is_replayed_after_restart(tmp_path):
+    path = str(tmp_path / 'writes.journal')
+
+    async def queue_and_stop():
+        user = FakeUser()
+        # slow enough that only the first action is sent
+        queue = WriteQueue(user, writes_per_hour=1, path=path)
+        queue.like('a')
+        queue.comment('b', 'hi')
+        queue.like('c')
+        queue.unlike('c')
+        await asyncio.sleep(0.05)
+        await queue.close()
+        return user.calls
+
+    async def restart():
+        user = FakeUser()
+        queue = WriteQueue(user, writes_per_hour=RATE, path=path)
+        await queue.join()
+        await queue.close()
+        return user.calls
+
+    assert asyncio.run(queue_and_stop()) == [('add_like', 'a')]
+    assert asyncio.run(restart()) == [('add_comment', 'b', 'hi')]
+    assert asyncio.run(restart()) == []
+
+
+def test_closed_queue_cancels_and_refuses_actions():
+    async def run():
+        queue = WriteQueue(FakeUser(), writes_per_hour=1)
+        queue.like('a')
+        pending = queue.like('b')
+        await asyncio.sleep(0.01)
+        await queue.close()
+        assert pending.cancelled()
+        with pytest.raises(ClientException):
+            queue.like('c')
+
+    asyncio.run(run())